@@ -2,19 +2,71 @@
 import os
 import sys
 import time
+
+# Module import is the first phase of every command's trace
+IMPORT_STARTED = time.time()
+
 import string
 import socket
 import shutil
 import subprocess
 import traceback
 import plistlib
+import json
+import re
+import errno
+import select
+import bisect
+import atexit
+import hashlib
+import marshal
+import collections
+import functools
 
 MATHEMATICA_PATH = '/Applications/Mathematica.app'
-JLINK_JAR_PATH = subprocess.check_output(['find', MATHEMATICA_PATH, '-name', 'JLink.jar']).strip()
-MATHKERNEL_PATH = subprocess.check_output(['find', MATHEMATICA_PATH, '-name', 'MathKernel']).strip()
-
+CACHE_FOLDER = '/tmp/tmjlink'
+MATHEMATICA_PATHS_CACHE = '/tmp/tmjlink-paths.json'
+PREFERENCES_DOMAIN = 'com.wolfram.mathmate'
+PREFERENCES_PATH = os.path.expanduser('~/Library/Preferences/com.wolfram.mathmate.plist')
+
+SYSTEM_SYMBOLS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "symbols.json")
+DEFAULT_TAB_SIZE = 4
+FORMAT_CACHE = '/tmp/tmjlink-format.json'
+FORMAT_CACHE_SIZE = 100000
 VALID_SYMBOL_CHARS = string.ascii_letters + string.digits + "$"
 
+# Parse results of recent documents are kept until they take up this many 
+# bytes, least recently used first out. Bump the version when parse() changes.
+PARSE_CACHE_BYTES = 16 * 1024 * 1024
+PARSE_CACHE_VERSION = 3
+# Bytes tokenized at a time when reparsing or streaming a document
+PARSE_CHUNK = 4096
+# Results of Execute Statements To Image are kept until they take up this 
+# many bytes, least recently used first out
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+IMAGE_CACHE_VERSION = 2
+IMAGE_SRC_RE = re.compile(r"src='file://([^']+)'")
+RESOURCE_ID_RE = re.compile(r"id='resource_(\d+)'")
+RESOURCE_TOGGLE_RE = re.compile(r"onclick='toggle\((\d+)\)'")
+
+TRACE_BYTES = 1024 * 1024
+
+# Set to 1 (or the profile preference to YES) to profile every command
+PROFILE_ENV = 'MATHMATE_PROFILE'
+PROFILE_COUNT = 20
+
+# Idle kernels the server keeps launched for new sessions and resets. Each
+# one uses a kernel license, so the pool is off unless the preference asks
+KERNEL_POOL_SIZE = 0
+
+# Limits on the statements sent ahead of their replies in a batch. Requests
+# are sent while the replies to earlier ones are read (see send_draining), 
+# so these only bound how far ahead the client gets.
+PIPELINE_WINDOW = 32
+PIPELINE_BYTES = 65536
+
+_mathematica_paths = None
+
 def exit_discard():
     sys.exit(200)
 
@@ -62,6 +114,277 @@ def return_focus_to_textmate():
     """
     # subprocess.call(["osascript", "-e", osascript])
 
+def read_json(path, default = None):
+    try:
+        fp = open(path, 'r')
+        try:
+            return json.load(fp)
+        finally:
+            fp.close()
+    except (IOError, OSError, ValueError):
+        return default
+
+def write_file(path, data):
+    # Write to a temporary file first so readers never see a partial file
+    folder = os.path.dirname(path)
+    if folder != "" and not os.path.exists(folder):
+        os.makedirs(folder, 0777)
+    tmp_file = "%s.%d" % (path, os.getpid())
+    fp = open(tmp_file, 'w')
+    try:
+        fp.write(data)
+    finally:
+        fp.close()
+    os.rename(tmp_file, path)
+
+def write_json(path, value):
+    write_file(path, json.dumps(value))
+
+def evict_lru(folder, max_bytes):
+    """Removes the least recently used files of folder until the rest fit in 
+    max_bytes. Files are used when their mtime is touched."""
+    entries = []
+    total = 0
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def read_marshal(path):
+    """Returns the value marshal'd to path, or None if it can't be read."""
+    try:
+        fp = open(path, 'rb')
+        try:
+            return marshal.load(fp)
+        finally:
+            fp.close()
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+
+def relabel_resources(html, label):
+    """Gives the cell groups in html new ids, so that output replayed from
+    the image cache doesn't clash with the cells the server rendered for 
+    the original evaluation, which the page header shows again."""
+    html = RESOURCE_ID_RE.sub(lambda match: "id='resource_%s_%s'" % (label, match.group(1)), html)
+    return RESOURCE_TOGGLE_RE.sub(lambda match: "onclick='toggle(\"%s_%s\")'" % (label, match.group(1)), html)
+
+def read_symbols(path):
+    """Reads a sorted, newline delimited symbol list. Returns None if there 
+    is no such list."""
+    try:
+        fp = open(path, 'r')
+        try:
+            data = fp.read()
+        finally:
+            fp.close()
+    except IOError:
+        return None
+    
+    if data == "":
+        return []
+    return data.split("\n")
+
+def write_symbols(path, symbols):
+    write_file(path, "\n".join(symbols))
+
+def complete_symbol(symbols, prefix):
+    """Returns the symbols of a sorted symbol list that start with prefix."""
+    start = bisect.bisect_left(symbols, prefix)
+    # No symbol contains "\xff" (it never occurs in UTF-8), so this sorts 
+    # after every symbol starting with prefix
+    end = bisect.bisect_left(symbols, prefix + "\xff", start)
+    return symbols[start:end]
+
+def get_mathematica_install_key(install_path = MATHEMATICA_PATH):
+    # Identifies an installation so that cached paths are dropped when it is
+    # replaced or upgraded.
+    version = None
+    try:
+        info = plistlib.readPlist(os.path.join(install_path, "Contents", "Info.plist"))
+        version = info.get("CFBundleVersion")
+    except Exception:
+        pass
+    
+    return {"path": install_path,
+            "mtime": os.stat(install_path).st_mtime,
+            "version": version}
+
+def find_mathematica_paths(install_path = MATHEMATICA_PATH):
+    jlink_jar_path = None
+    mathkernel_path = None
+    
+    out = subprocess.check_output(['find', install_path, 
+        '(', '-name', 'JLink.jar', '-o', '-name', 'MathKernel', ')'])
+    for path in out.splitlines():
+        name = os.path.basename(path)
+        if name == "JLink.jar" and jlink_jar_path is None:
+            jlink_jar_path = path
+        if name == "MathKernel" and mathkernel_path is None:
+            mathkernel_path = path
+    
+    if jlink_jar_path is None or mathkernel_path is None:
+        raise Exception("Could not find JLink.jar and MathKernel in %s" % install_path)
+    return (jlink_jar_path, mathkernel_path)
+
+def get_mathematica_paths(install_path = MATHEMATICA_PATH, cache_file = MATHEMATICA_PATHS_CACHE):
+    """Returns (JLink.jar path, MathKernel path) for the Mathematica install.
+    
+    The install is only searched the first time, or after it changed. The 
+    result is kept in cache_file keyed by the install's mtime and version."""
+    global _mathematica_paths
+    if _mathematica_paths is not None:
+        return _mathematica_paths
+    
+    key = get_mathematica_install_key(install_path)
+    
+    try:
+        fp = open(cache_file, 'r')
+        cached = json.load(fp)
+        fp.close()
+        
+        paths = (str(cached["jlink_jar_path"]), str(cached["mathkernel_path"]))
+        if cached["key"] == key and os.path.exists(paths[0]) and os.path.exists(paths[1]):
+            _mathematica_paths = paths
+            return paths
+    except Exception:
+        pass
+    
+    paths = find_mathematica_paths(install_path)
+    
+    try:
+        write_json(cache_file, {"key": key, "jlink_jar_path": paths[0], "mathkernel_path": paths[1]})
+    except (IOError, OSError):
+        pass
+    
+    _mathematica_paths = paths
+    return paths
+
+def export_preferences(domain = PREFERENCES_DOMAIN):
+    """Reads every setting in the defaults domain with a single defaults call."""
+    try:
+        proc = subprocess.Popen(["defaults", "export", domain, "-"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return {}
+    out = proc.communicate()[0]
+    if proc.returncode != 0:
+        return {}
+    
+    try:
+        settings = plistlib.readPlistFromString(out)
+    except Exception:
+        return {}
+    
+    preferences = {}
+    for key, value in settings.items():
+        # As printed by defaults read
+        if isinstance(value, bool):
+            value = "1" if value else "0"
+        if isinstance(value, (basestring, int, long, float)):
+            preferences[key] = value
+    return preferences
+
+def read_preferences(cache_file, path = PREFERENCES_PATH, domain = PREFERENCES_DOMAIN):
+    """Returns the settings in the defaults domain stored at path.
+    
+    They are kept in cache_file keyed by the mtime and size of path, so 
+    defaults only runs again after a setting was written."""
+    try:
+        stat = os.stat(path)
+        key = [stat.st_mtime, stat.st_size]
+    except OSError:
+        key = None
+    
+    cached = read_json(cache_file)
+    if isinstance(cached, dict) and cached.get("key") == key:
+        return cached["preferences"]
+    
+    # Nothing was ever written to the domain when there's no file
+    preferences = export_preferences(domain) if key is not None else {}
+    
+    try:
+        write_json(cache_file, {"key": key, "preferences": preferences})
+    except (IOError, OSError):
+        pass
+    return preferences
+
+class ProcfsProcessTable(object):
+    """Looks processes up in /proc, as on Linux."""
+    
+    def __init__(self, root = "/proc"):
+        self.root = root
+    
+    def get_process(self, pid):
+        """Returns (parent pid, command line) for pid, or None if there is no 
+        such process."""
+        try:
+            fp = open(os.path.join(self.root, str(pid), "stat"), 'r')
+            stat = fp.read()
+            fp.close()
+            fp = open(os.path.join(self.root, str(pid), "cmdline"), 'r')
+            command = fp.read().replace("\0", " ").strip()
+            fp.close()
+        except (IOError, OSError):
+            return None
+        
+        # The executable name is in parentheses and may contain either, the
+        # state and parent pid follow the last one
+        fields = stat[stat.rfind(")") + 2:].split(" ")
+        if command == "":
+            command = stat[stat.find("(") + 1:stat.rfind(")")]
+        return (int(fields[1]), command)
+
+class PsProcessTable(object):
+    """Looks processes up in a single ps listing of all of them, for 
+    platforms without /proc such as OS X."""
+    
+    def __init__(self):
+        self.processes = None
+    
+    def get_process(self, pid):
+        if self.processes is None:
+            out = subprocess.check_output(["ps", "-A", "-ww", "-o", "pid=,ppid=,command="])
+            self.processes = {}
+            for line in out.splitlines():
+                fields = line.split(None, 2)
+                if len(fields) < 2:
+                    continue
+                self.processes[int(fields[0])] = (int(fields[1]), fields[2] if len(fields) > 2 else "")
+        return self.processes.get(pid)
+
+def get_process_table():
+    if os.path.exists("/proc/self/stat"):
+        return ProcfsProcessTable()
+    return PsProcessTable()
+
+def find_ancestor(pid, predicate, table):
+    """Returns the first of pid and its ancestors whose command line satisfies
+    predicate, or None."""
+    seen = set()
+    while pid > 1 and pid not in seen:
+        seen.add(pid)
+        process = table.get_process(pid)
+        if process is None:
+            return None
+        ppid, command = process
+        if predicate(command):
+            return pid
+        pid = ppid
+    return None
+
 def is_valid_mathematica_symbol(symbol):
     if len(symbol) == 0:
         return False
@@ -71,46 +394,960 @@ def is_valid_mathematica_symbol(symbol):
             return False
     return True
 
+# Operators are listed longest first so that the alternation picks the same
+# operator the character-by-character parser used to.
+TOKEN_RE = re.compile(r"""
+    (?P<space>[ \t]+)
+  | (?P<newline>\n)
+  | (?P<string>"(?:[^"\\]+|\\"|\\)*"?)
+  | (?P<comment>\(\*)
+  | (?P<operator>===|=!=|>>>|\^:=|//@|//\.|@@@|\.\.\.|
+                 \*\^|&&|\|\||==|!=|>=|<=|;;|/\.|->|:>|<>|>>|/@|/;|/:|//|~~|:=|\^=|\+=|-=|\*=|/=|
+                 @@|\+\+|--|<<|\.\.|=\.|\[\[)
+  | (?P<symbol>[A-Za-z0-9]+)
+  | (?P<char>.)
+""", re.VERBOSE | re.DOTALL)
+
+COMMENT_DELIMITER_RE = re.compile(r"\\\*\)|\(\*|\*\)")
+NON_SPACE_RE = re.compile(r"\S")
+
+def get_line_starts(doc):
+    """Returns the offset of the first character of every line in doc."""
+    line_starts = [0]
+    pos = doc.find("\n")
+    while pos != -1:
+        line_starts.append(pos + 1)
+        pos = doc.find("\n", pos + 1)
+    return line_starts
+
+def tokenize(block, start = 0, stop = None):
+    """Splits block into (kind, start, end) tokens in a single pass.
+    
+    kind is one of space, newline, string, comment, operator, symbol or char.
+    Strings and (nested) comments are returned as a single token, unterminated
+    ones run to the end of the block. start must be a token boundary, tokens 
+    starting at or after stop are left out."""
+    tokens = []
+    pos = start
+    end = len(block)
+    if stop is None or stop > end:
+        stop = end
+    
+    while pos < stop:
+        match = TOKEN_RE.match(block, pos)
+        kind = match.lastgroup
+        token_end = match.end()
+        
+        if kind == "comment":
+            depth = 1
+            while depth > 0:
+                delimiter = COMMENT_DELIMITER_RE.search(block, token_end)
+                if delimiter is None:
+                    token_end = end
+                    break
+                token_end = delimiter.end()
+                if delimiter.group() == "(*":
+                    depth += 1
+                elif delimiter.group() == "*)":
+                    depth -= 1
+        
+        tokens.append((kind, pos, token_end))
+        pos = token_end
+    
+    return tokens
+
+def get_common_prefix_length(a, b):
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[:middle] == b[:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def get_common_suffix_length(a, b, limit):
+    low, high = 0, min(len(a), len(b), limit)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:] == b[len(b) - middle:]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+def get_line_prev_char(block, pos):
+    """Returns the last non-space character before pos on its line, or None."""
+    pos -= 1
+    while pos >= 0 and block[pos] in " \t":
+        pos -= 1
+    if pos < 0 or block[pos] == "\n":
+        return None
+    return block[pos]
+
+def get_line_next_char(block, pos):
+    """Returns the first non-space character from pos on its line, or None."""
+    while pos < len(block) and block[pos] in " \t":
+        pos += 1
+    if pos == len(block) or block[pos] == "\n":
+        return None
+    return block[pos]
+
+def get_neighbour_chars(block, tokens, prev_char = None, next_char = None):
+    """Returns the next and previous non-space character on the same line for 
+    every token, None at a line boundary. prev_char and next_char are the 
+    ones before and after the tokens, when they don't span the block."""
+    count = len(tokens)
+    next_chars = [None] * count
+    prev_chars = [None] * count
+    
+    char = next_char
+    for index in xrange(count - 1, -1, -1):
+        next_chars[index] = char
+        kind, start, end = tokens[index]
+        if kind == "newline":
+            char = None
+        elif kind != "space":
+            char = block[start]
+    
+    char = prev_char
+    for index in xrange(count):
+        prev_chars[index] = char
+        kind, start, end = tokens[index]
+        if kind == "newline":
+            char = None
+        elif kind != "space":
+            char = block[end - 1]
+    
+    return next_chars, prev_chars
+
+def get_token_scope_level(block, kind, start, end, scope, posq):
+    """Returns the scope the character parser reported at posq, which lies 
+    within the token, or None if that position was never visited."""
+    if posq == start:
+        return ".".join(scope)
+    
+    if kind in ("space", "symbol"):
+        return ".".join(scope)
+    
+    if kind == "string":
+        pos = start + 1
+        while pos < end:
+            if pos == posq:
+                return ".".join(scope + ["string"])
+            if block[pos:pos+2] == '\\"':
+                pos += 2
+            else:
+                pos += 1
+    
+    if kind == "comment":
+        depth = 1
+        pos = start + 2
+        while pos < end:
+            if pos == posq:
+                return ".".join(scope + ["comment"] * depth)
+            if block[pos:pos+3] == '\\*)':
+                pos += 3
+            elif block[pos:pos+2] == '(*':
+                depth += 1
+                pos += 2
+            elif block[pos:pos+2] == '*)':
+                depth -= 1
+                pos += 2
+            else:
+                pos += 1
+    
+    return None
+
+def parse_suggestions(size, reader):
+    """Reads the symbols of a "suggestions <size>" reply, which are sent one 
+    per line in a payload of size bytes."""
+    if size.startswith("["):
+        # Servers built before the payload format send a list literal inline
+        return [symbol[1:-1] for symbol in size[1:-1].split(",") if symbol != ""]
+    
+    return split_suggestions(reader.read(int(size)))
+
+def split_suggestions(data):
+    """Returns the symbols in a suggestions payload, including its final newline."""
+    data = data[:-1]
+    if data == "":
+        return []
+    return data.split("\n")
+
+class ProtocolReader(object):
+    """Reads lines and inline payloads sent by the TextMateJLink server.
+    
+    Data is received in large chunks into a reusable buffer, so a protocol 
+    line costs one recv for many lines rather than one per character."""
+    
+    def __init__(self, sock, buffer_size = 65536):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+    
+    def reserve(self, count):
+        """Makes room in the buffer for count bytes of unread data."""
+        if self.start + count <= len(self.buffer):
+            return
+        
+        size = self.end - self.start
+        if count > len(self.buffer):
+            buff = bytearray(max(count, len(self.buffer) * 2))
+            buff[0:size] = self.view[self.start:self.end]
+            self.buffer = buff
+            self.view = memoryview(buff)
+        else:
+            self.buffer[0:size] = self.buffer[self.start:self.end]
+        self.start = 0
+        self.end = size
+    
+    def fill(self):
+        if self.end == len(self.buffer):
+            self.reserve(2 * (self.end - self.start) + 1)
+        
+        count = self.sock.recv_into(self.view[self.end:])
+        self.end += count
+        return count
+    
+    def readline(self):
+        scanned = 0
+        while True:
+            index = self.buffer.find("\n", self.start + scanned, self.end)
+            if index != -1:
+                line = self.view[self.start:index].tobytes().replace("\r", "")
+                self.start = index + 1
+                return line
+            
+            scanned = self.end - self.start
+            if self.fill() == 0:
+                return None
+    
+    def read(self, count):
+        self.reserve(count)
+        
+        while self.end - self.start < count:
+            if self.fill() == 0:
+                raise Exception("The server quit unexpectedly.")
+        
+        data = self.view[self.start:self.start + count].tobytes()
+        self.start += count
+        return data
+    
+    def read_response(self):
+        line = self.readline()
+
+        if line is None:
+            raise Exception("The server quit unexpectedly.")
+            
+        if line.find(" -- ") != -1:
+            response = line[0:line.find(" -- ")]
+            comment = line[line.find(" -- ")+4:]
+        else:
+            response = line
+            comment = None
+            
+        words = response.split(" ")
+        return (line, response, words, comment)
+
+class TextMateJLinkClient(object):
+    """A connection to the TextMateJLink server bound to one session id.
+    
+    The sessid handshake is done once when the client is created, after which
+    any number of requests can be made over the same connection."""
+    
+    def __init__(self, sock, sessid, tracer = None):
+        self.sock = sock
+        self.reader = ProtocolReader(sock)
+        self.sessid = sessid
+        self.tracer = tracer if tracer is not None else Tracer()
+        
+        with self.tracer.phase("handshake"):
+            self.receive()
+            self.request("sessid %s" % sessid)
+    
+    def send(self, command, data = None):
+        if data is None:
+            self.sock.sendall("%s\n" % command)
+        else:
+            self.sock.sendall("%s %d\n%s" % (command, len(data), data))
+    
+    def send_draining(self, command, data = None):
+        """Sends a request while replies to earlier ones are due.
+        
+        The server reads a request only once it has written all of the 
+        previous one's output, so a blocking send could wait on a server 
+        that waits on us to read. Whenever the socket can't take more, the 
+        replies are read into the reader's buffer instead."""
+        if data is None:
+            request = "%s\n" % command
+        else:
+            request = "%s %d\n%s" % (command, len(data), data)
+        
+        view = memoryview(request)
+        sent = 0
+        timeout = self.sock.gettimeout()
+        self.sock.setblocking(0)
+        try:
+            while sent < len(request):
+                readable, writable, exceptional = select.select([self.sock], [self.sock], [])
+                if readable and self.reader.fill() == 0:
+                    raise Exception("The server quit unexpectedly.")
+                if writable:
+                    try:
+                        sent += self.sock.send(view[sent:])
+                    except socket.error, e:
+                        if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                            raise
+        finally:
+            self.sock.settimeout(timeout)
+    
+    def receive(self, on_inline = None):
+        """Reads replies until the server completes the current request.
+        
+        Inline payloads that arrive before then are passed to on_inline, as 
+        are the chunks of a long payload, each as soon as it arrives. 
+        Returns the completing (line, response, words, comment)."""
+        while True:
+            line, response, words, comment = self.reader.read_response()
+            
+            if words[0] == "inline" or words[0] == "chunk":
+                # Timed by hand, this runs for every payload
+                start = time.time()
+                content = self.reader.read(int(words[1]))
+                read = time.time()
+                self.tracer.add("transfer", read - start)
+                if on_inline is not None:
+                    on_inline(content)
+                    self.tracer.add("output", time.time() - read)
+                continue
+            
+            if response == "okay" or words[0] == "suggestions":
+                return (line, response, words, comment)
+            
+            if response == "exception":
+                raise Exception("TextMateJLink Exception: " + comment)
+            
+            raise Exception("Unexpected message from JLink server: " + line)
+    
+    def request(self, command, data = None, on_inline = None):
+        self.send(command, data)
+        return self.receive(on_inline)
+    
+    def header(self, on_inline):
+        self.request("header", on_inline=on_inline)
+    
+    def execute(self, statement, on_inline):
+        self.request("execute", statement, on_inline)
+    
+    def image(self, statement, on_inline):
+        self.request("image", statement, on_inline)
+    
+    def execute_batch(self, statements, on_inline, force_image = False, window = PIPELINE_WINDOW):
+        """Executes statements in order with up to window of them in flight.
+        
+        Replies arrive in the order the statements were sent, so output order
+        is preserved. If a statement fails, the ones already sent after it 
+        still run; their output is read before the failure is raised."""
+        command = "image" if force_image else "execute"
+        sent = 0
+        completed = 0
+        in_flight_bytes = 0
+        error = None
+        
+        while completed < sent or (sent < len(statements) and error is None):
+            while error is None and sent < len(statements) and sent - completed < window:
+                size = len(statements[sent])
+                if sent > completed and in_flight_bytes + size > PIPELINE_BYTES:
+                    break
+                if sent > completed:
+                    self.send_draining(command, statements[sent])
+                else:
+                    self.send(command, statements[sent])
+                in_flight_bytes += size
+                sent += 1
+            
+            try:
+                self.receive(on_inline)
+            except Exception:
+                # Later failures are read past so the connection stays in step
+                if error is None:
+                    error = sys.exc_info()
+            
+            in_flight_bytes -= len(statements[completed])
+            completed += 1
+        
+        if error is not None:
+            raise error[0], error[1], error[2]
+    
+    def intexec(self, command):
+        # A long result arrives in chunk frames before the final inline one
+        result = []
+        self.request("intexec", command, result.append)
+        if len(result) == 0:
+            return None
+        return "".join(result)
+    
+    def clear(self):
+        self.request("clear")
+    
+    def reset(self):
+        self.request("reset")
+    
+    def suggest(self):
+        line, response, words, comment = self.request("suggest")
+        return parse_suggestions(words[1], self.reader)
+    
+    def close(self):
+        try:
+            self.request("quit")
+        finally:
+            self.sock.close()
+
+class PendingRequest(object):
+    """A request submitted through a MultiSessionClient.
+    
+    done is set once the server has completed it. Inline payloads go to 
+    on_inline, or are collected in output when there is none."""
+    
+    def __init__(self, command, data = None, on_inline = None):
+        self.command = command
+        self.data = data
+        self.on_inline = on_inline
+        self.output = []
+        self.reply = None
+        self.suggestions = None
+        self.error = None
+        self.done = False
+    
+    def encode(self):
+        if self.data is None:
+            return "%s\n" % self.command
+        return "%s %d\n%s" % (self.command, len(self.data), self.data)
+    
+    def add_output(self, content):
+        if self.on_inline is not None:
+            self.on_inline(content)
+        else:
+            self.output.append(content)
+    
+    def complete(self, reply = None, error = None):
+        self.reply = reply
+        self.error = error
+        self.done = True
+    
+    def result(self):
+        """Returns the completing (line, response, words, comment), or raises
+        the exception the server replied with."""
+        if not self.done:
+            raise Exception("The request has not completed.")
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+class MultiplexedSession(object):
+    """The non-blocking connection behind one session of a MultiSessionClient."""
+    
+    def __init__(self, sock, sessid):
+        sock.setblocking(0)
+        self.sock = sock
+        self.sessid = sessid
+        self.incoming = bytearray()
+        self.outgoing = bytearray()
+        self.queued = collections.deque()
+        self.in_flight = collections.deque()
+        self.in_flight_bytes = 0
+        # Size of the inline or suggestions payload that follows the last line
+        self.payload = None
+        self.greeted = False
+        self.closed = False
+        self.error = None
+    
+    def fileno(self):
+        return self.sock.fileno()
+    
+    def fill(self, window):
+        """Moves queued requests into the send buffer while the session has
+        room for them in flight."""
+        while self.queued and len(self.in_flight) < window:
+            size = len(self.queued[0].data or "")
+            if self.in_flight and self.in_flight_bytes + size > PIPELINE_BYTES:
+                break
+            request = self.queued.popleft()
+            self.outgoing += request.encode()
+            self.in_flight.append(request)
+            self.in_flight_bytes += size
+    
+    def send(self):
+        try:
+            count = self.sock.send(self.outgoing)
+        except socket.error, e:
+            if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return
+            self.fail(Exception("The server quit unexpectedly."))
+            return
+        del self.outgoing[:count]
+    
+    def receive(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except socket.error, e:
+                if e.args[0] in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    break
+                self.fail(Exception("The server quit unexpectedly."))
+                return
+            if data == "":
+                if self.in_flight or self.queued:
+                    self.fail(Exception("The server quit unexpectedly."))
+                else:
+                    self.close()
+                return
+            self.incoming += data
+            if len(data) < 65536:
+                break
+        
+        try:
+            self.process()
+        except Exception, e:
+            # The connection is in an unknown state after a malformed reply
+            self.fail(e)
+    
+    def process(self):
+        start = 0
+        while not self.closed:
+            if self.payload is not None:
+                if len(self.incoming) - start < self.payload:
+                    break
+                content = str(self.incoming[start:start + self.payload])
+                start += self.payload
+                self.payload = None
+                
+                request = self.in_flight[0]
+                if request.command == "suggest":
+                    request.suggestions = split_suggestions(content)
+                    self.complete(request.reply)
+                else:
+                    request.add_output(content)
+                continue
+            
+            index = self.incoming.find("\n", start)
+            if index == -1:
+                break
+            line = str(self.incoming[start:index]).replace("\r", "")
+            start = index + 1
+            self.handle_line(line)
+        
+        del self.incoming[:start]
+    
+    def handle_line(self, line):
+        if line.find(" -- ") != -1:
+            response = line[0:line.find(" -- ")]
+            comment = line[line.find(" -- ")+4:]
+        else:
+            response = line
+            comment = None
+        words = response.split(" ")
+        
+        if not self.greeted:
+            if response != "okay":
+                raise Exception("Unexpected message from JLink server: " + line)
+            self.greeted = True
+            return
+        
+        if not self.in_flight:
+            raise Exception("Unexpected message from JLink server: " + line)
+        
+        if words[0] == "inline" or words[0] == "chunk":
+            self.payload = int(words[1])
+            return
+        
+        if words[0] == "suggestions":
+            request = self.in_flight[0]
+            request.reply = (line, response, words, comment)
+            if words[1].startswith("["):
+                request.suggestions = parse_suggestions(words[1], None)
+                self.complete(request.reply)
+            else:
+                self.payload = int(words[1])
+            return
+        
+        if response == "okay":
+            self.complete((line, response, words, comment))
+            return
+        
+        if response == "exception":
+            self.complete(error=Exception("TextMateJLink Exception: " + comment))
+            return
+        
+        raise Exception("Unexpected message from JLink server: " + line)
+    
+    def complete(self, reply = None, error = None):
+        request = self.in_flight.popleft()
+        self.in_flight_bytes -= len(request.data or "")
+        request.complete(reply, error)
+        if request.command == "quit" and error is None:
+            self.close()
+    
+    def fail(self, error):
+        """Fails every outstanding request and closes the connection."""
+        self.error = error
+        while self.in_flight:
+            self.in_flight.popleft().complete(error=error)
+        while self.queued:
+            self.queued.popleft().complete(error=error)
+        self.close()
+    
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+class MultiSessionClient(object):
+    """Drives any number of TextMateJLink sessions from one thread.
+    
+    Every session id gets its own connection, and so its own kernel on the 
+    server, and select() multiplexes the replies. Requests are pipelined up
+    to window per session and complete in the order they were submitted on
+    that session. submit() runs the loop while a session already has 
+    max_queued requests waiting, so a producer cannot get unboundedly ahead
+    of the server.
+    
+    connect is called to open each connection, e.g. MathMate.connect.
+    
+        client = MultiSessionClient(mm.connect)
+        requests = [client.execute("sweep%d" % i, statement) for i, statement in enumerate(statements)]
+        client.wait(requests)
+    """
+    
+    def __init__(self, connect, window = PIPELINE_WINDOW, max_queued = 256):
+        self.connect = connect
+        self.window = window
+        self.max_queued = max_queued
+        self.sessions = {}
+    
+    def open(self, sessid):
+        session = self.sessions.get(sessid)
+        if session is None or session.closed:
+            session = MultiplexedSession(self.connect(), sessid)
+            session.queued.append(PendingRequest("sessid %s" % sessid))
+            self.sessions[sessid] = session
+        return session
+    
+    def submit(self, sessid, command, data = None, on_inline = None):
+        session = self.open(sessid)
+        request = PendingRequest(command, data, on_inline)
+        
+        while len(session.queued) >= self.max_queued and not session.closed:
+            self.poll()
+        
+        if session.closed:
+            request.complete(error=session.error or Exception("The session is closed."))
+        else:
+            session.queued.append(request)
+        return request
+    
+    def header(self, sessid, on_inline = None):
+        return self.submit(sessid, "header", on_inline=on_inline)
+    
+    def execute(self, sessid, statement, on_inline = None):
+        return self.submit(sessid, "execute", statement, on_inline)
+    
+    def image(self, sessid, statement, on_inline = None):
+        return self.submit(sessid, "image", statement, on_inline)
+    
+    def intexec(self, sessid, command):
+        return self.submit(sessid, "intexec", command)
+    
+    def clear(self, sessid):
+        return self.submit(sessid, "clear")
+    
+    def reset(self, sessid):
+        return self.submit(sessid, "reset")
+    
+    def suggest(self, sessid):
+        return self.submit(sessid, "suggest")
+    
+    def poll(self, timeout = None):
+        """Sends and receives whatever the connections are ready for, waiting
+        up to timeout for one of them. Returns False when no request is 
+        outstanding."""
+        readers = []
+        writers = []
+        for session in self.sessions.values():
+            if session.closed:
+                continue
+            session.fill(self.window)
+            if session.outgoing:
+                writers.append(session)
+            if session.in_flight:
+                readers.append(session)
+        
+        if not readers and not writers:
+            return False
+        
+        readable, writable, _ = select.select(readers, writers, [], timeout)
+        for session in writable:
+            session.send()
+        for session in readable:
+            if not session.closed:
+                session.receive()
+        return True
+    
+    def wait(self, requests = None):
+        """Runs until the given requests, or every outstanding one, complete."""
+        if requests is None:
+            while self.poll():
+                pass
+            return
+        
+        for request in requests:
+            while not request.done:
+                if not self.poll():
+                    break
+    
+    def close(self):
+        for sessid, session in self.sessions.items():
+            if not session.closed:
+                self.submit(sessid, "quit")
+        self.wait()
+        for session in self.sessions.values():
+            session.close()
+        self.sessions = {}
+
+def format_ms(seconds):
+    return "%.1fms" % (seconds * 1000)
+
+class Tracer(object):
+    """Times the phases of a bundle command.
+    
+    Phases are exclusive: time spent in a phase nested inside another one
+    is only counted for the inner phase, so the phases of a command add up
+    to (at most) its total. Repeated phases accumulate."""
+    
+    def __init__(self, started = None):
+        self.started = time.time() if started is None else started
+        self.phases = collections.OrderedDict()
+        self.nested = []
+        self.depth = 0
+    
+    def add(self, name, seconds):
+        """Counts seconds timed by the caller as the named phase, nested in 
+        the phase running now, if any."""
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+        if self.nested:
+            self.nested[-1] += seconds
+    
+    def phase(self, name):
+        """Returns a context manager timing its block as the named phase."""
+        return TracerPhase(self, name)
+    
+    def get_total(self):
+        return time.time() - self.started
+    
+    def format(self):
+        phases = ["%s %s" % (name, format_ms(seconds)) for name, seconds in self.phases.items()]
+        phases.append("total %s" % format_ms(self.get_total()))
+        return ", ".join(phases)
+    
+    def record(self, path, command, sessid, success):
+        """Appends the command's phases to the trace file as a JSON line and 
+        starts over. Once the file outgrows TRACE_BYTES it is moved to 
+        path.1, replacing the previous one."""
+        entry = json.dumps({
+            "command": command,
+            "sessid": sessid,
+            "time": self.started,
+            "total": self.get_total(),
+            "success": success,
+            "phases": self.phases,
+        })
+        self.started = time.time()
+        self.phases = collections.OrderedDict()
+        
+        # A trace that can't be written is not worth failing the command for
+        try:
+            folder = os.path.dirname(path)
+            if folder != "" and not os.path.exists(folder):
+                os.makedirs(folder, 0777)
+            fp = open(path, 'a')
+            try:
+                fp.write(entry + "\n")
+                size = fp.tell()
+            finally:
+                fp.close()
+            if size > TRACE_BYTES:
+                os.rename(path, path + ".1")
+        except (IOError, OSError):
+            pass
+
+class TracerPhase(object):
+    # Cheaper than a contextlib.contextmanager generator
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.time()
+        self.tracer.nested.append(0.0)
+    
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        nested = self.tracer.nested
+        inner = nested.pop()
+        self.tracer.add(self.name, time.time() - self.start - inner)
+        if nested:
+            nested[-1] += inner
+
+def traced(command):
+    """Records the phases of each call of a MathMate command in its trace 
+    file, and profiles it when profiling is on. Commands called by other 
+    commands are part of the outer trace and profile."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            tracer = self.tracer
+            if tracer.depth == 0 and self.profiler is None and self.is_profiling():
+                self.start_profile()
+            tracer.depth += 1
+            success = False
+            try:
+                result = method(self, *args, **kwargs)
+                success = True
+                return result
+            except SystemExit:
+                # The exit_* functions end successful commands too
+                success = True
+                raise
+            finally:
+                tracer.depth -= 1
+                if tracer.depth == 0:
+                    if self.profiler is not None:
+                        self.stop_profile(command)
+                    tracer.record(self.get_trace_path(), command, self.sessid, success)
+        return wrapper
+    return decorate
+
+def is_enabled(value):
+    return value is not None and value.lower() in ("1", "yes", "true")
+
+def get_profile_paths(folder, command = None):
+    """Returns the stats files in folder, oldest first."""
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    paths = [os.path.join(folder, name) for name in names 
+        if name.endswith(".prof") and (command is None or name.split("-")[2] == command)]
+    paths.sort(key=os.path.getmtime)
+    return paths
+
+def read_traces(paths):
+    traces = []
+    for path in paths:
+        try:
+            fp = open(path, 'r')
+        except IOError:
+            continue
+        try:
+            for line in fp:
+                try:
+                    traces.append(json.loads(line))
+                except ValueError:
+                    # A line cut short by a full disk or a concurrent rotation
+                    continue
+        finally:
+            fp.close()
+    return traces
+
+def summarize_traces(traces):
+    """Returns (command, phase, count, p50, p95) for every phase of every 
+    command in traces, plus a "total" phase per command."""
+    samples = collections.defaultdict(list)
+    for trace in traces:
+        for phase, seconds in trace["phases"].items():
+            samples[trace["command"], phase].append(seconds)
+        samples[trace["command"], "total"].append(trace["total"])
+    
+    rows = []
+    for (command, phase), values in sorted(samples.items()):
+        values.sort()
+        rows.append((command, phase, len(values), values[len(values) // 2], 
+            values[min(int(len(values) * 0.95), len(values) - 1)]))
+    return rows
+
 class MathMate(object):
-    def __init__(self, input_file = None, process_entire_document = False, process_up_to_cursor = False):
-        self.cacheFolder = '/tmp/tmjlink'
-        self.mlargs = ["-linkmode", "launch", "-linkname", MATHKERNEL_PATH, "-mathlink"]
+    def __init__(self, input_file = None, process_entire_document = False, process_up_to_cursor = False, 
+                 indent_size = None, soft_tabs = None, doc = None):
+        self.cacheFolder = CACHE_FOLDER
+        # Client side state, wiped together with the server's cache folder
+        self.stateFolder = os.path.join(self.cacheFolder, "tmjlink.client")
+        self.preferences_path = PREFERENCES_PATH
+        self.preferences = None
+        # The first command's trace starts with the import of this module
+        self.tracer = Tracer(time.time() - IMPORT_SECONDS)
+        self.tracer.add("import", IMPORT_SECONDS)
+        init_started = time.time()
+        
+        # With the environment variable, profiling starts before the document 
+        # is read and parsed, which bundle commands do before calling a command
+        # method. The preference is only checked by commands that load the 
+        # preferences anyway, from then on (see get_preferences).
+        self.profiler = None
+        if is_enabled(os.environ.get(PROFILE_ENV)):
+            self.start_profile()
         
         self.parse_tree_level = None
+        self._statements = None
+        self.client = None
         
         self.tmjlink_pid = None
+        self.tmjlink_proc = None
+        self.textmate_pid = None
         pidfile = os.path.join(self.cacheFolder, "tmjlink.pid")
         if os.path.exists(pidfile):
             pidfp = open(pidfile, 'r')
             self.tmjlink_pid = int(pidfp.read())
             pidfp.close()
         
-        if input_file is None:
+        if doc is not None:
+            self.doc = doc
+        elif input_file is None:
             self.doc = sys.stdin.read()
         else:
             fp = open(input_file, 'r')
             self.doc = fp.read()
             fp.close()
         
-        self.indent_size = int(os.environ['TM_TAB_SIZE'])
-        if os.environ.get('TM_SOFT_TABS') == "YES":
+        self.line_starts = get_line_starts(self.doc)
+        
+        # Outside of TextMate (see main) the settings are passed in instead
+        if indent_size is None:
+            indent_size = int(os.environ.get('TM_TAB_SIZE', DEFAULT_TAB_SIZE))
+        if soft_tabs is None:
+            soft_tabs = os.environ.get('TM_SOFT_TABS', "YES") == "YES"
+        
+        self.indent_size = indent_size
+        if soft_tabs:
             self.indent = " " * self.indent_size
-        elif os.environ.get('TM_SOFT_TABS') == "NO":
+        else:
             self.indent = "\t"
         
-        self.tmln = int(os.environ.get('TM_LINE_NUMBER'))
-        self.tmli = int(os.environ.get('TM_LINE_INDEX'))
+        self.tmln = int(os.environ.get('TM_LINE_NUMBER', 1))
+        self.tmli = int(os.environ.get('TM_LINE_INDEX', 0))
         self.tmcursor = self.get_pos(self.tmln, self.tmli)
         self.selected_text = os.environ.get('TM_SELECTED_TEXT')
         self.process_entire_document = process_entire_document
         self.process_up_to_cursor = process_up_to_cursor
-        self.statements = self.parse(self.doc)
             
         sessid = os.path.split(os.environ.get('TM_FILEPATH', 'mathmate-default'))[-1]
         if sessid.endswith(".m"):
             self.sessid = sessid[:-2]
         else:
             self.sessid = sessid
+        
+        self.tracer.add("init", time.time() - init_started)
     
     def signal_tmjlink(self, signal = 1):
         try:
@@ -123,23 +1360,32 @@ class MathMate(object):
     def is_tmjlink_alive(self):
         return self.signal_tmjlink(0)
     
-    def get_textmate_pid(self):
-        current_pid = os.getpid()
-        while current_pid != 1:
-            shell = subprocess.Popen(["ps", "-p", str(current_pid), "-o", "pid,ppid,command"], stdout=subprocess.PIPE)
-            process = map(lambda x: x[:11].split() + [x[12:]], shell.stdout.read().rstrip().split("\n"))[1]
-            if "TextMate.app/Contents/MacOS/TextMate" in process[2]:
-                return current_pid
-            current_pid = int(process[1])
-        raise Exception("Could not determine TextMate.app pid.")
+    def get_textmate_pid(self, table = None):
+        if self.textmate_pid is None:
+            if table is None:
+                table = get_process_table()
+            self.textmate_pid = find_ancestor(os.getpid(), 
+                lambda command: "TextMate.app/Contents/MacOS/TextMate" in command, table)
+            if self.textmate_pid is None:
+                raise Exception("Could not determine TextMate.app pid.")
+        return self.textmate_pid
 
     def launch_tmjlink(self):
         if self.is_tmjlink_alive():
             return
         
+        jlink_jar_path, mathkernel_path = get_mathematica_paths()
+        mlargs = ["-linkmode", "launch", "-linkname", mathkernel_path, "-mathlink"]
+        
         classpath = []
         classpath.append(os.path.join(os.environ.get('TM_BUNDLE_SUPPORT'), "tmjlink/dist/tmjlink.jar"))
-        classpath.append(JLINK_JAR_PATH)
+        classpath.append(jlink_jar_path)
+        
+        # Read before the cache folder, which holds the preferences cache, is wiped
+        try:
+            kernel_pool_size = max(int(self.read_default("kernel_pool", KERNEL_POOL_SIZE)), 0)
+        except ValueError:
+            kernel_pool_size = KERNEL_POOL_SIZE
         
         if os.path.exists(self.cacheFolder):
             shutil.rmtree(self.cacheFolder) 
@@ -149,9 +1395,10 @@ class MathMate(object):
         textmate_pid = self.get_textmate_pid()
         logfp = open(os.path.join(self.cacheFolder, "tmjlink.log"), 'w')
         proc = subprocess.Popen(['/usr/bin/java', 
+                '-Dtmjlink.kernelPool=%d' % kernel_pool_size,
                 '-cp', ":".join(classpath), 
                 'com.shadanan.textmatejlink.TextMateJLink', 
-                self.cacheFolder, str(textmate_pid)] + self.mlargs,
+                self.cacheFolder, str(textmate_pid)] + mlargs,
             stdout=logfp, stderr=subprocess.STDOUT)
         logfp.close()
         
@@ -159,83 +1406,148 @@ class MathMate(object):
         pidfp = open(os.path.join(self.cacheFolder, "tmjlink.pid"), 'w')
         pidfp.write(str(proc.pid))
         pidfp.close()
+        
+        self.tmjlink_pid = proc.pid
+        self.tmjlink_proc = proc
     
-    def readtotal(self, sock, count):
-        result = []
-        total_read = 0
+    def read_tmjlink_port(self):
+        # The server writes its port file atomically once it is listening
+        try:
+            portfp = open(os.path.join(self.cacheFolder, "tmjlink.port"), 'r')
+            try:
+                return int(portfp.read())
+            finally:
+                portfp.close()
+        except (IOError, ValueError):
+            pass
         
-        while total_read != count:
-            buff = sock.recv(count - total_read)
-            
-            if buff == "":
-                raise Exception("The server quit unexpectedly.")
-                
-            result.append(buff)
-            total_read += len(buff)
+        # Servers built without the port file only report the port in the log
+        try:
+            logfp = open(os.path.join(self.cacheFolder, "tmjlink.log"), 'r')
+            try:
+                for line in logfp:
+                    if line.strip().startswith("Server started on port: "):
+                        return int(line.strip()[24:])
+            finally:
+                logfp.close()
+        except IOError:
+            pass
         
-        return "".join(result)
+        return None
     
-    def readline(self, sock):
-        result = []
+    def wait_for_tmjlink_port(self, poll_interval = 0.01):
         while True:
-            char = sock.recv(1)
+            port = self.read_tmjlink_port()
+            if port is not None:
+                return port
             
-            if char == "\r":
-                continue
-                
-            if char == "\n":
-                break
-                
-            if char == "":
-                return None
-                
-            result.append(char)
-            
-        return "".join(result)
+            # Only a server that is still booting is worth waiting for
+            if self.tmjlink_proc is not None and self.tmjlink_proc.poll() is not None:
+                raise Exception("The TextMateJLink server quit while starting up.")
+            if not self.is_tmjlink_alive():
+                raise Exception("The TextMateJLink server is not running.")
+            time.sleep(poll_interval)
     
     def connect(self):
-        self.launch_tmjlink()
+        with self.tracer.phase("launch"):
+            self.launch_tmjlink()
+        with self.tracer.phase("port"):
+            port = self.wait_for_tmjlink_port()
         
-        # Wait for server to be ready and get listen port
-        logfp = open(os.path.join(self.cacheFolder, "tmjlink.log"), 'r')
-        while True:
-            line = logfp.readline()
-            if line == "":
-                time.sleep(0.1)
-                continue
-            if line.strip().startswith("Server started on port: "):
-                port = int(line.strip()[24:])
-                break
-        logfp.close()
+        with self.tracer.phase("connect"):
+            # Prefer the Unix domain socket when the server offers one
+            socket_path = os.path.join(self.cacheFolder, "tmjlink.sock")
+            if hasattr(socket, "AF_UNIX") and os.path.exists(socket_path):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    sock.connect(socket_path)
+                    return sock
+                except socket.error:
+                    sock.close()
+            
+            sock = socket.socket()
+            sock.connect(("localhost", port))
+            return sock
     
-        sock = socket.socket()
-        sock.connect(("localhost", port))
-        return sock
+    def get_client(self):
+        """Returns the connection to this document's session, opening it on 
+        first use. It stays open for later calls until close_client()."""
+        if self.client is None:
+            self.client = TextMateJLinkClient(self.connect(), self.sessid, self.tracer)
+            atexit.register(self.close_client)
+        return self.client
     
-    def read(self, sock):
-        line = self.readline(sock)
-
-        if line is None:
-            raise Exception("The server quit unexpectedly.")
-            
-        if line.find(" -- ") != -1:
-            response = line[0:line.find(" -- ")]
-            comment = line[line.find(" -- ")+4:]
-        else:
-            response = line
-            comment = None
-            
-        words = response.split(" ")
-        return (line, response, words, comment)
+    def close_client(self):
+        if self.client is not None:
+            client = self.client
+            self.client = None
+            try:
+                client.close()
+            except Exception:
+                # Nothing is left to do with a connection that fails to quit
+                pass
+    
+    def drop_client(self):
+        # The connection is in an unknown state after a failed request
+        if self.client is not None:
+            self.client.sock.close()
+            self.client = None
+    
+    def get_preferences(self):
+        if self.preferences is None:
+            with self.tracer.phase("preferences"):
+                self.preferences = read_preferences(os.path.join(self.stateFolder, "preferences.json"), 
+                    self.preferences_path)
+            if self.tracer.depth > 0 and self.profiler is None and is_enabled(self.read_default("profile")):
+                self.start_profile()
+        return self.preferences
+    
+    def get_trace_path(self):
+        return os.path.join(self.cacheFolder, "tmjlink.trace")
+    
+    def is_profiling(self):
+        # Reading the preference here would load the preferences, which may 
+        # run defaults, for every command
+        return is_enabled(os.environ.get(PROFILE_ENV))
+    
+    def get_profile_folder(self):
+        return os.path.join(self.cacheFolder, "profiles")
+    
+    def start_profile(self):
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+    
+    def stop_profile(self, command):
+        """Writes the profile of command to the profile folder, keeping the 
+        newest PROFILE_COUNT of them."""
+        profiler = self.profiler
+        self.profiler = None
+        profiler.disable()
+        
+        # As with traces, a profile that can't be written is not an error
+        try:
+            folder = self.get_profile_folder()
+            if not os.path.exists(folder):
+                os.makedirs(folder, 0777)
+            now = time.time()
+            profiler.dump_stats(os.path.join(folder, "%s.%03d-%s-%d.prof" % (
+                time.strftime("%Y%m%d-%H%M%S", time.localtime(now)), now * 1000 % 1000, command, os.getpid())))
+            for path in get_profile_paths(folder)[:-PROFILE_COUNT]:
+                os.remove(path)
+        except (IOError, OSError):
+            pass
     
     def read_default(self, key, default = None):
-        proc = subprocess.Popen(["defaults", "read", "com.wolfram.mathmate", key], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        exit_code = proc.wait()
-        if exit_code != 0:
+        value = self.get_preferences().get(key)
+        if value is None:
             return default
-        return proc.stdout.read().strip()
+        if isinstance(value, unicode):
+            return value.encode("utf-8")
+        return str(value)
     
-    def inline(self, statements, force_image = False):
+    @traced("inline")
+    def inline(self, statements, force_image = False, window = PIPELINE_WINDOW):
         white_space = self.read_default("white_space", "Normal")
         white_space_mode = "pre" if white_space == "Pre" else "normal"
         
@@ -355,362 +1667,334 @@ class MathMate(object):
                "white_space_mode": white_space_mode})
         sys.stdout.flush()
         
+        def write(content):
+            sys.stdout.write(content)
+            sys.stdout.flush()
+        
         try:
-            sock = self.connect()
-
-            state = 0
-            readsize = None
-            while True:
-                if readsize is not None:
-                    content = self.readtotal(sock, readsize)
-                else:
-                    line, response, words, comment = self.read(sock)
-
-                if state == 0:
-                    if response == "okay":
-                        sock.send("sessid %s\n" % self.sessid)
-                        state = 1
-                        continue
-
-                    if response == "exception":
-                        raise Exception("TextMateJLink Exception: " + comment)
-
-                    raise Exception("Unexpected message from JLink server: " + line)
-            
-                if state == 1:
-                    if response == "okay":
-                        sock.send("header\n")
-                        state = 2
-                        continue
-                    
-                    if response == "exception":
-                        raise Exception("TextMateJLink Exception: " + comment)
-
-                    raise Exception("Unexpected message from JLink server: " + line)
+            client = self.get_client()
+            with self.tracer.phase("header"):
+                client.header(write)
             
-                if state == 2:
-                    if response == "okay":
-                        statement = None
-                        
-                        while len(statements) > 0:
-                            statement = statements.pop(0).rstrip()
-                            if statement != "":
-                                break
-                            statement = None
-                        
-                        if statement is None:
-                            sock.send("quit\n")
-                            state = 4
-                            continue
-                            
-                        if force_image:
-                            sock.send("image %d\n" % len(statement))
-                        else:
-                            sock.send("execute %d\n" % len(statement))
-                        sock.send(statement)
-                        continue
-
-                    if words[0] == "inline":
-                        readsize = int(words[1])
-                        state = 3
-                        continue
-
-                    if response == "exception":
-                        raise Exception("TextMateJLink Exception: " + comment)
-
-                    raise Exception("Unexpected message from JLink server: " + line)
-            
-                if state == 3:
-                    sys.stdout.write(content)
-                    sys.stdout.flush()
-                    readsize = None
-                    state = 2
-                    continue
+            statements = [statement.rstrip() for statement in statements]
+            statements = [statement for statement in statements if statement != ""]
+            # Images served from the cache evaluate nothing, see execute_images
+            if len(statements) > 0 and not force_image:
+                self.invalidate_symbols()
+                self.advance_epoch()
             
-                if state == 4:
-                    if response == "okay":
-                        sock.close()
-                        break
-
-                    if response == "exception":
-                        raise Exception("TextMateJLink Exception: " + comment)
-
-                    raise Exception("Unexpected message from JLink server: " + line)
-
-                raise Exception("Invalid state: " + state)
+            with self.tracer.phase("evaluate"):
+                if force_image:
+                    self.execute_images(client, statements, write)
+                else:
+                    client.execute_batch(statements, write, force_image, window)
+            success = True
             
         except Exception:
+            self.drop_client()
             sys.stdout.write('<div class="exception">%s</div>' % traceback.format_exc())
             sys.stdout.flush()
-            
+            success = False
+        
+        # Where the time went, shown with the cells' own times
+        sys.stdout.write('<div class="time">%s</div>' % self.tracer.format())
+        
         # Footer (closing tags, etc)
         sys.stdout.write("""
             </body>
           </html>
         """)
         sys.stdout.flush()
+        return success
     
-    def execute(self, command):
-        result = None
-        sock = self.connect()
-        
-        state = 0
-        readsize = None
-        while True:
-            if readsize is not None:
-                content = self.readtotal(sock, readsize)
-            else:
-                line, response, words, comment = self.read(sock)
-            
-            if state == 0:
-                if response == "okay":
-                    sock.send("sessid %s\n" % self.sessid)
-                    state = 1
-                    continue
-            
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-                
-            if state == 1:
-                if response == "okay":
-                    sock.send("intexec %d\n" % len(command))
-                    sock.send(command)
-                    state = 2
-                    continue
-                        
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-            
-            if state == 2:
-                if response == "okay":
-                    sock.send("quit\n")
-                    state = 4
-                    continue
-
-                if words[0] == "inline":
-                    readsize = int(words[1])
-                    state = 3
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-                
-            if state == 3:
-                result = content
-                readsize = None
-                state = 2
+    def get_executed_path(self):
+        return os.path.join(self.stateFolder, "%s.executed" % self.sessid)
+    
+    def get_statement_fingerprints(self):
+        """Returns (fingerprint, statement) for each non-empty statement of the 
+        document. Fingerprints are taken from the reformatted statement so that 
+        changes to whitespace alone don't count as a change."""
+        fingerprints = []
+        for ssp, esp, reformatted_statement, current_statement in self.statements:
+            if current_statement.rstrip() == "":
                 continue
-            
-            if state == 4:
-                if response == "okay":
-                    sock.close()
-                    break
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-                
-            raise Exception("Invalid state: " + state)
+            fingerprint = hashlib.sha1(reformatted_statement.strip()).hexdigest()
+            fingerprints.append((fingerprint, current_statement))
+        return fingerprints
+    
+    def inline_changed(self, force_image = False, window = PIPELINE_WINDOW):
+        """Executes the document from the first statement that changed since 
+        the last incremental run in this session. Statements before it are 
+        assumed to still be evaluated in the kernel."""
+        fingerprints = self.get_statement_fingerprints()
+        
+        # A server that isn't running is launched with a new cache folder, 
+        # and a new kernel that has evaluated nothing: connect before the 
+        # record is read, so it is gone too
+        try:
+            self.get_client()
+        except Exception:
+            # inline() fails the same way and reports it
+            pass
+        executed = read_json(self.get_executed_path(), [])
+        
+        start = 0
+        while start < len(fingerprints) and start < len(executed) and fingerprints[start][0] == executed[start]:
+            start += 1
+        
+        # Forget everything from the first change on until the run completes, 
+        # a failed run is then re-executed from the same point next time
+        executed = [fingerprint for fingerprint, statement in fingerprints]
+        write_json(self.get_executed_path(), executed[:start])
         
-        return result
+        statements = [statement for fingerprint, statement in fingerprints[start:]]
+        if self.inline(statements, force_image, window):
+            write_json(self.get_executed_path(), executed)
     
-    def clear(self):
-        sock = self.connect()
+    def forget_executed(self):
+        try:
+            os.remove(self.get_executed_path())
+        except OSError:
+            pass
+    
+    def get_symbols_path(self):
+        return os.path.join(self.stateFolder, "%s.symbols" % self.sessid)
+    
+    def get_symbols_changed_path(self):
+        return os.path.join(self.stateFolder, "%s.changed" % self.sessid)
+    
+    def invalidate_symbols(self):
+        """Marks the session's symbols as changed, they are fetched from the 
+        kernel again on the next completion."""
+        write_file(self.get_symbols_changed_path(), "")
+        try:
+            os.remove(self.get_symbols_path())
+        except OSError:
+            pass
+    
+    def forget_symbols(self):
+        for path in (self.get_symbols_path(), self.get_symbols_changed_path()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    
+    def get_system_symbols(self):
+        path = os.path.join(self.stateFolder, "System`.symbols")
+        symbols = read_symbols(path)
+        if symbols is None:
+            fp = open(SYSTEM_SYMBOLS_PATH, 'r')
+            functions, variables = json.load(fp)
+            fp.close()
+            symbols = sorted(set(symbol.encode("utf-8") for symbol in functions + variables))
+            write_symbols(path, symbols)
+        return symbols
+    
+    def get_cached_symbols(self):
+        """Returns the sorted symbols known to the session.
         
-        state = 0
-        while True:
-            line, response, words, comment = self.read(sock)
-            
-            if state == 0:
-                if response == "okay":
-                    sock.send("sessid %s\n" % self.sessid)
-                    state = 1
-                    continue
-            
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-                
-            if state == 1:
-                if response == "okay":
-                    sock.send("clear\n")
-                    state = 2
-                    continue
-                        
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-            
-            if state == 2:
-                if response == "okay":
-                    sock.send("quit\n")
-                    state = 3
-                    continue
-            
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-                
-            if state == 3:
-                if response == "okay":
-                    sock.close()
-                    break
-            
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
+        A session that didn't execute anything since the server started only 
+        knows the System` symbols, which are read from symbols.json without 
+        starting a kernel. Otherwise the kernel is asked once after each 
+        change and the answer is kept until the next one."""
+        symbols = read_symbols(self.get_symbols_path())
+        if symbols is not None:
+            return symbols
+        
+        if not os.path.exists(self.get_symbols_changed_path()):
+            return self.get_system_symbols()
+        
+        # Clear the mark first so that a change during the request marks again,
+        # and put it back if the request fails so the next completion retries
+        os.remove(self.get_symbols_changed_path())
+        try:
+            symbols = sorted(set(symbol for symbol in self.get_symbols() if symbol != "?"))
+        except Exception:
+            write_file(self.get_symbols_changed_path(), "")
+            raise
+        if not os.path.exists(self.get_symbols_changed_path()):
+            write_symbols(self.get_symbols_path(), symbols)
+        return symbols
+    
+    def get_epoch_path(self):
+        return os.path.join(self.stateFolder, "%s.epoch" % self.sessid)
+    
+    def get_epoch(self):
+        """Returns a token for the session's evaluation epoch, which changes 
+        whenever something other than an image request is evaluated in it. 
+        Image results are only reused within an epoch."""
+        try:
+            fp = open(self.get_epoch_path(), 'r')
+            try:
+                return fp.read()
+            finally:
+                fp.close()
+        except (IOError, OSError):
+            return self.advance_epoch()
+    
+    def advance_epoch(self):
+        epoch = hashlib.sha1(os.urandom(20)).hexdigest()
+        write_file(self.get_epoch_path(), epoch)
+        return epoch
+    
+    def forget_epoch(self):
+        try:
+            os.remove(self.get_epoch_path())
+        except OSError:
+            pass
+    
+    def get_image_cache_path(self, epoch, statement):
+        # Statements are compared as reformatted, so whitespace doesn't matter
+        normalized = "".join(parsed[2] for parsed in self.parse(statement)).strip()
+        key = hashlib.sha1("%d\0%s\0%s\0%s" % (IMAGE_CACHE_VERSION, self.sessid, epoch, normalized)).hexdigest()
+        return os.path.join(self.stateFolder, "images", key)
+    
+    def get_image_files_folder(self):
+        return os.path.join(self.stateFolder, "image-files")
+    
+    def count_image_cache(self, outcome):
+        path = os.path.join(self.stateFolder, "images.stats")
+        stats = read_json(path, {})
+        stats[outcome] = stats.get(outcome, 0) + 1
+        write_json(path, stats)
+    
+    def get_image_cache_stats(self):
+        """Returns the image cache's {"hits": n, "misses": n} since the server 
+        started."""
+        stats = read_json(os.path.join(self.stateFolder, "images.stats"), {})
+        return {"hits": stats.get("hits", 0), "misses": stats.get("misses", 0)}
+    
+    def read_cached_image_result(self, path):
+        """Returns the HTML cached at path, or None. A result whose image 
+        files were evicted is gone too."""
+        cached = read_marshal(path)
+        if cached is None:
+            return None
+        
+        html, names = cached
+        folder = self.get_image_files_folder()
+        try:
+            for name in names:
+                os.utime(os.path.join(folder, name), None)
+            os.utime(path, None)
+        except OSError:
+            return None
+        return html
+    
+    def write_cached_image_result(self, path, html):
+        """Caches html with copies of the image files it refers to, which the
+        server deletes when the session is cleared. Copies are named by their
+        content and only kept in the image files folder."""
+        folder = self.get_image_files_folder()
+        names = []
+        for source in set(IMAGE_SRC_RE.findall(html)):
+            try:
+                fp = open(source, 'rb')
+                data = fp.read()
+                fp.close()
+            except (IOError, OSError):
+                return
             
-            raise Exception("Invalid state: " + state)
+            name = hashlib.sha1(data).hexdigest() + os.path.splitext(source)[1]
+            html = html.replace("src='file://%s'" % source, "src='file://%s'" % os.path.join(folder, name))
+            if not os.path.exists(os.path.join(folder, name)):
+                write_file(os.path.join(folder, name), data)
+            names.append(name)
         
+        write_file(path, marshal.dumps((html, names)))
+        evict_lru(os.path.dirname(path), IMAGE_CACHE_BYTES)
+        if names:
+            evict_lru(folder, IMAGE_CACHE_BYTES)
+    
+    def execute_images(self, client, statements, write):
+        """Executes statements to images, one at a time. A statement whose
+        result was cached in the current epoch is not sent to the kernel."""
+        epoch = self.get_epoch()
+        invalidated = False
+        for statement in statements:
+            path = self.get_image_cache_path(epoch, statement)
+            html = self.read_cached_image_result(path)
+            if html is not None:
+                self.count_image_cache("hits")
+                write(relabel_resources(html, os.urandom(4).encode("hex")))
+                continue
+            
+            self.count_image_cache("misses")
+            if not invalidated:
+                self.invalidate_symbols()
+                invalidated = True
+            output = []
+            def collect(content):
+                output.append(content)
+                write(content)
+            client.image(statement, collect)
+            self.write_cached_image_result(path, "".join(output))
+    
+    @traced("execute")
+    def execute(self, command):
+        try:
+            client = self.get_client()
+            self.invalidate_symbols()
+            self.advance_epoch()
+            with self.tracer.phase("evaluate"):
+                return client.intexec(command)
+        except Exception:
+            self.drop_client()
+            raise
+    
+    @traced("clear")
+    def clear(self):
+        try:
+            client = self.get_client()
+            with self.tracer.phase("evaluate"):
+                client.clear()
+        except Exception:
+            self.drop_client()
+            raise
         return "Session Cleared"
-            
+    
+    @traced("reset")
     def reset(self):
-        sock = self.connect()
-
-        state = 0
-        while True:
-            line, response, words, comment = self.read(sock)
-
-            if state == 0:
-                if response == "okay":
-                    sock.send("sessid %s\n" % self.sessid)
-                    state = 1
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            if state == 1:
-                if response == "okay":
-                    sock.send("reset\n")
-                    state = 2
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            if state == 2:
-                if response == "okay":
-                    sock.send("quit\n")
-                    state = 3
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            if state == 3:
-                if response == "okay":
-                    sock.close()
-                    break
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            raise Exception("Invalid state: " + state)
-
+        try:
+            client = self.get_client()
+            with self.tracer.phase("evaluate"):
+                client.reset()
+        except Exception:
+            self.drop_client()
+            raise
+        finally:
+            self.forget_executed()
+            self.forget_symbols()
+            self.forget_epoch()
         return "Session Reset"
 
+    @traced("get_symbols")
     def get_symbols(self):
-        sock = self.connect()
-
-        state = 0
-        while True:
-            line, response, words, comment = self.read(sock)
-
-            if state == 0:
-                if response == "okay":
-                    sock.send("sessid %s\n" % self.sessid)
-                    state = 1
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            if state == 1:
-                if response == "okay":
-                    sock.send("suggest\n")
-                    state = 2
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            if state == 2:
-                if words[0] == "suggestions":
-                    result = eval(words[1])
-                    sock.send("quit\n")
-                    state = 3
-                    continue
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            if state == 3:
-                if response == "okay":
-                    sock.close()
-                    break
-
-                if response == "exception":
-                    raise Exception("TextMateJLink Exception: " + comment)
-
-                raise Exception("Unexpected message from JLink server: " + line)
-
-            raise Exception("Invalid state: " + state)
-
-        return result
+        try:
+            client = self.get_client()
+            with self.tracer.phase("evaluate"):
+                return client.suggest()
+        except Exception:
+            self.drop_client()
+            raise
 
     def get_pos(self, line, column):
-        line_index = 1
-        line_pos = 0
-    
-        for pos, char in enumerate(self.doc):
-            if line == line_index and column == pos - line_pos:
-                return pos
-        
-            if char == "\n":
-                line_index += 1
-                line_pos = pos + 1
+        if line < 1 or line > len(self.line_starts) or column < 0:
+            return len(self.doc)
         
-        return len(self.doc)
+        # The column may reach the new line character but not the next line
+        pos = self.line_starts[line - 1] + column
+        if line < len(self.line_starts) and pos >= self.line_starts[line]:
+            return len(self.doc)
+        return min(pos, len(self.doc))
         
     def get_line_col(self, posq):
-        line_index = 1
-        line_pos = 0
-        
-        for pos, char in enumerate(self.doc):
-            if posq == pos:
-                return (line_index, pos - line_pos)
-        
-            if char == "\n":
-                line_index += 1
-                line_pos = pos + 1
+        if posq < 0 or posq >= len(self.doc):
+            # Positions outside the document report the end of the last line
+            return (len(self.line_starts), len(self.doc) - 1 - self.line_starts[-1])
         
-        return (line_index, pos - line_pos)
+        line_index = bisect.bisect_right(self.line_starts, posq)
+        return (line_index, posq - self.line_starts[line_index - 1])
 
     def count_indents(self, line):
         count = 0
@@ -748,279 +2032,224 @@ class MathMate(object):
     def is_end_of_line(self, pos):
         return self.get_next_non_space_char(pos) == None
     
-    def parse(self, block, initial_indent_level = None):
-        statements = []
+    def parse(self, block, initial_indent_level = None, start = 0, do_indent = True, resync = None, chunk = None, 
+              new_lines = None):
+        """Splits block into (start, end, reformatted, original) statements, 
+        see iter_parse."""
+        return list(self.iter_parse(block, initial_indent_level, start, do_indent, resync, chunk, new_lines))
+    
+    def iter_parse(self, block, initial_indent_level = None, start = 0, do_indent = True, resync = None, chunk = None, 
+                   new_lines = None):
+        """Yields the (start, end, reformatted, original) statements of block 
+        as soon as each one is complete.
         
-        pos = 0
-        ss_pos = 0
+        Parsing may resume at a statement start other than 0, given whether 
+        that statement begins on a new line. resync(pos, do_indent) is asked 
+        at every following statement start and ends the parse when it returns 
+        True. With chunk, the block is tokenized chunk bytes at a time rather 
+        than all at once, so an early stop skips the rest of it and only one 
+        chunk of tokens is held at a time.
+        
+        Whether each statement begins on a new line is appended to new_lines."""
+        if new_lines is None:
+            new_lines = []
+        new_lines.append(do_indent)
+        
+        tokens = []
+        next_chars = []
+        prev_chars = []
+        tokenized = start
+        
+        index = 0
+        ss_pos = start
         current = []
         scope = []
-        do_indent = True
         vsc = string.ascii_letters + string.digits
         
         if initial_indent_level is None:
             initial_indent_level = self.count_indents(block)
         
-        while pos < len(block):
-            c1 = block[pos]
-            c2 = block[pos:pos+2]
-            c3 = block[pos:pos+3]
-            pc = block[pos-1] if pos > 0 else None
-
-            nnsc = None
-            for i in xrange(pos + 1, len(block)):
-                if block[i] == "\n":
-                    break
-                    
-                if block[i] not in (" ", "\t"):
-                    nnsc = block[i]
+        while True:
+            if index >= len(tokens):
+                if tokenized == len(block):
                     break
-
-            if pos == self.tmcursor:
-                self.parse_tree_level = ".".join(scope)
-
+                
+                stop = None
+                if chunk is not None:
+                    stop = tokenized + chunk
+                
+                # Move on to the next chunk, index may skip into it
+                index -= len(tokens)
+                tokens = tokenize(block, tokenized, stop)
+                next_chars, prev_chars = get_neighbour_chars(block, tokens, 
+                    get_line_prev_char(block, tokenized), get_line_next_char(block, tokens[-1][2]))
+                tokenized = tokens[-1][2]
+                continue
+            
+            kind, pos, end = tokens[index]
+            token = block[pos:end]
+            pc = block[pos-1] if pos > 0 else None
+            nnsc = next_chars[index]
+            
+            if pos <= self.tmcursor < end:
+                level = get_token_scope_level(block, kind, pos, end, scope, self.tmcursor)
+                if level is not None:
+                    self.parse_tree_level = level
+            
             if len(scope) == 0:
                 # Skip white space after a statement. Set flag if we see a new line.
-                if c1 in (" ", "\t", "\n"):
+                if kind in ("space", "newline"):
                     # Preserve lines between statements
-                    if c1 == "\n":
+                    if kind == "newline":
                         do_indent = True
-                        current += c1
+                        current.append(token)
                     
-                    pos += 1
+                    index += 1
                     continue
                 
                 # New statement token encountered. Save current statement.
                 if current != []:
                     # Two statements on the same line. Add a space between them.
                     if do_indent is False:
-                        current += " "
+                        current.append(" ")
                     
                     # Save statement and reset buffer
-                    statements.append((ss_pos, pos, "".join(current), block[ss_pos:pos]))
+                    yield (ss_pos, pos, "".join(current), block[ss_pos:pos])
                     current = []
+                    
+                    if resync is not None and resync(pos, do_indent):
+                        return
+                    new_lines.append(do_indent)
                 
                 ss_pos = pos
                 scope.append("root")
                 
                 # Add indentation if current is on a new line (do_indent is True).
                 if do_indent is True:
-                    current += (self.indent * initial_indent_level)
+                    current.append(self.indent * initial_indent_level)
                 
-                # Do not advance cursor
+                # Do not advance token
                 continue
-
-            if scope[-1] == "string":
-                if c2 == '\\"':
-                    current += c2
-                    pos += 2
-                    continue
-
-                if c1 == '"':
-                    scope.pop()
-                    current += c1
-                    pos += 1
-                    continue
-
-                current += c1
-                pos += 1
+            
+            index += 1
+            
+            if kind == "string":
+                current.append(token)
                 continue
-
-            if scope[-1] == "comment":
-                if c3 == '\\*)':
-                    current += c3
-                    pos += 3
-                    continue
-                
-                if c2 == '(*':
-                    scope.append("comment")
-                    current += c2
-                    pos += 2
-                    continue
-                
-                if c2 == '*)':
-                    scope.pop()
-                    current += c2
-                    pos += 2
-                    continue
-
-                current += c1
-                pos += 1
+            
+            if kind == "comment":
+                pnsc = prev_chars[index-1]
+                if pnsc is not None and pnsc in vsc:
+                    current.append(" ")
+                current.append(token)
                 continue
-
-            if c1 in (" ", "\t"):
+            
+            if kind == "space":
                 if pc is not None and nnsc is not None and pc in (vsc + "]})") and nnsc in vsc:
-                    current += " "
-                pos += 1
-                continue
-        
-            if c3 in ("===", "=!=", ">>>", "^:=", "//@", "//."):
-                if self.is_end_of_line(pos + 3):
-                    scope += ("binop", "start")
-                current += " ", c3, " "
-                pos += 3
-                continue
-
-            if c3 == "@@@":
-                if self.is_end_of_line(pos + 3):
-                    scope += ("binop", "start")
-                current += " ", c3, " "
-                pos += 3
+                    current.append(" ")
                 continue
             
-            if c3 == "...":
-                current += " ", c3
-                pos += 3
-                continue
-
-            if c2 in ("*^", "&&", "||", "==", "!=", ">=", "<=", ";;", "/.", "->", ":>", "<>", ">>", 
-                      "/@", "/;", "/:", "//", "~~", ":=", "^=", "+=", "-=", "*=", "/="):
-                if self.is_end_of_line(pos + 2):
+            if token in ("===", "=!=", ">>>", "^:=", "//@", "//.", "@@@", 
+                         "*^", "&&", "||", "==", "!=", ">=", "<=", ";;", "/.", "->", ":>", "<>", ">>", 
+                         "/@", "/;", "/:", "//", "~~", ":=", "^=", "+=", "-=", "*=", "/=", "@@"):
+                if nnsc is None:
                     scope += ("binop", "start")
-                current += " ", c2, " "
-                pos += 2
+                current += " ", token, " "
                 continue
             
-            if c2 == "@@":
-                if self.is_end_of_line(pos + 2):
-                    scope += ("binop", "start")
-                current += " ", c2, " "
-                pos += 2
+            if token in ("...", "..", "=."):
+                current += " ", token
                 continue
             
-            if c2 in ("++", "--", "<<"):
-                current += c2
-                pos += 2
-                continue
-
-            if c2 in ("..", "=."):
-                current += " ", c2
-                pos += 2
-                continue
-
-            if c2 == "(*":
-                pnsc = self.get_prev_non_space_char(pos-1)
-                if pnsc is not None and pnsc in vsc:
-                    current += " "
-                scope.append("comment")
-                current += c2
-                pos += 2
+            if token in ("++", "--", "<<"):
+                current.append(token)
                 continue
-
-            if c2 == "[[":
+            
+            if token == "[[":
                 scope.append("part")
-                current += c2
-                pos += 2
+                current.append(token)
                 continue
-        
-            if c2 == "]]" and scope[-1] == "part":
+            
+            if token == "]" and block[end:end+1] == "]" and scope[-1] == "part":
                 while scope[-1] == "binop":
                     scope.pop()
                 scope.pop()
-                current += c2
-                pos += 2
+                current.append("]]")
+                index += 1
                 continue
-        
-            if c1 == "[":
+            
+            if token == "[":
                 scope.append("function")
-                current += c1
-                pos += 1
-                continue
-        
-            if c1 == "]":
-                while scope[-1] == "binop":
-                    scope.pop()
-                scope.pop()
-                current += c1
-                pos += 1
+                current.append(token)
                 continue
-        
-            if c1 == "{":
+            
+            if token == "{":
                 scope.append("list")
-                current += c1
-                pos += 1
-                continue
-        
-            if c1 == "}":
-                while scope[-1] == "binop":
-                    scope.pop()
-                scope.pop()
-                current += c1
-                pos += 1
+                current.append(token)
                 continue
-        
-            if c1 == "(":
+            
+            if token == "(":
                 scope.append("group")
-                current += c1
-                pos += 1
+                current.append(token)
                 continue
-        
-            if c1 == ")":
+            
+            if token in ("]", "}", ")"):
                 while scope[-1] == "binop":
                     scope.pop()
                 scope.pop()
-                current += c1
-                pos += 1
+                current.append(token)
                 continue
             
-            if c1 == "!":
-                current += c1, " "
-                pos += 1
+            if token == "!":
+                current += token, " "
                 continue
-                
-            if c1 == "?":
-                current += c1
-                pos += 1
+            
+            if token == "?":
+                current.append(token)
                 continue
             
-            if c1 in ("*", "/", "^"):
-                if self.is_end_of_line(pos + 1):
+            if token in ("*", "/", "^"):
+                if nnsc is None:
                     scope += ("binop", "start")
-                current += c1
-                pos += 1
+                current.append(token)
                 continue
             
-            if c1 in ("+", ">", "<", "|", "="):
-                if self.is_end_of_line(pos + 1):
+            if token in ("+", ">", "<", "|", "="):
+                if nnsc is None:
                     scope += ("binop", "start")
-                current += " ", c1, " "
-                pos += 1
+                current += " ", token, " "
                 continue
             
-            if c1 == "-":
-                if self.is_end_of_line(pos + 1):
+            if token == "-":
+                if nnsc is None:
                     scope += ("binop", "start")
-                    
-                if self.get_prev_non_space_char(pos-1) not in (None, ";", "{", "(", "[", ",", "="):
-                    current += " ", c1, " "
+                
+                if prev_chars[index-1] not in (None, ";", "{", "(", "[", ",", "="):
+                    current += " ", token, " "
                 else:
-                    current += c1
-                pos += 1
+                    current.append(token)
                 continue
-
-            if c1 == "&":
-                current += " ", c1
-                pos += 1
+            
+            if token == "&":
+                current += " ", token
                 continue
             
-            if c1 == ",":
+            if token == ",":
                 while scope[-1] == "binop":
                     scope.pop()
-                current += c1, " "
-                pos += 1
+                current += token, " "
                 continue
-
-            if c1 == ";":
+            
+            if token == ";":
                 while scope[-1] == "binop":
                     scope.pop()
                 if scope[-1] == "root":
                     do_indent = False
                     scope.pop()
-                current += c1
-                pos += 1
+                current.append(token)
                 continue
-
-            if c1 == "\n":
+            
+            if kind == "newline":
                 while scope[-1] == "binop":
                     scope.pop()
                 if scope[-1] == "start":
@@ -1028,34 +2257,171 @@ class MathMate(object):
                 if scope[-1] == "root":
                     do_indent = True
                     scope.pop()
-                current += c1
-                pos += 1
-
+                current.append(token)
+                
                 indent_level = len(scope) + initial_indent_level - 1
                 if nnsc in ("]", "}", ")"):
-                    current += (self.indent * (indent_level - 1))
+                    current.append(self.indent * (indent_level - 1))
                 else:
-                    current += (self.indent * indent_level)
-
-                continue
+                    current.append(self.indent * indent_level)
                 
-            if c1 == '"':
-                scope.append("string")
-                current += c1
-                pos += 1
                 continue
             
-            if pc is not None and pc in "]})" and c1 in vsc:
-                current += " "
+            if kind == "symbol" and pc is not None and pc in "]})":
+                current.append(" ")
             
-            current += c1
-            pos += 1
+            current.append(token)
             continue
-
+        
         if current != []:
-            statements.append((ss_pos, pos, "".join(current), block[ss_pos:pos]))
+            yield (ss_pos, len(block), "".join(current), block[ss_pos:])
+        else:
+            new_lines.pop()
+    
+    @property
+    def statements(self):
+        """The statements of the document, parsed on first use."""
+        if self._statements is None:
+            with self.tracer.phase("parse"):
+                self._statements = self.get_cached_parse()
+        return self._statements
+    
+    def get_parse_cache_path(self):
+        # With tabs, the indents counted in the document depend on the size too
+        key = hashlib.sha1("%d\0%s\0%d\0" % (PARSE_CACHE_VERSION, self.indent, self.indent_size))
+        key.update(self.doc)
+        return os.path.join(self.stateFolder, "parse", key.hexdigest())
+    
+    def get_cached_parse(self):
+        """Returns parse(self.doc), reusing the result of an earlier command 
+        on the same document when there is one.
+        
+        Otherwise the last document parsed in this session is reparsed, which 
+        only parses the part around the edits made since then. Only offsets 
+        and reformatted text are stored, the statements' text is sliced back 
+        out of the document."""
+        path = self.get_parse_cache_path()
+        cached = read_marshal(path)
+        if cached is not None:
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            return [(ssp, esp, reformatted_statement, self.doc[ssp:esp]) 
+                for ssp, esp, reformatted_statement, new_line in cached]
+        
+        last_path = os.path.join(self.stateFolder, "%s.parse" % self.sessid)
+        last = read_marshal(last_path)
+        new_lines = []
+        if last is not None and last[:3] == (PARSE_CACHE_VERSION, self.indent, self.indent_size):
+            statements = self.reparse(self.doc, last[3], last[4], new_lines)
+        else:
+            statements = self.parse(self.doc, new_lines=new_lines)
+        
+        cached = [(ssp, esp, reformatted_statement, new_line) for (ssp, esp, reformatted_statement, current_statement), 
+            new_line in zip(statements, new_lines)]
+        try:
+            write_file(path, marshal.dumps(cached))
+            write_file(last_path, marshal.dumps((PARSE_CACHE_VERSION, self.indent, self.indent_size, self.doc, cached)))
+            evict_lru(os.path.dirname(path), PARSE_CACHE_BYTES)
+        except (IOError, OSError):
+            pass
+        return statements
+    
+    def reparse(self, block, old_block, old_statements, new_lines = None):
+        """Returns parse(block) given the (start, end, reformatted, new line) 
+        statements of an earlier version of it, old_block.
+        
+        Statements ending well before the first change are kept. Parsing 
+        resumes at the last of them to start at root scope and stops at the 
+        first statement start past the edit where the old parse was in the 
+        same state, from which on the old statements are shifted over."""
+        if new_lines is None:
+            new_lines = []
+        
+        initial_indent_level = self.count_indents(block)
+        if len(old_statements) == 0 or initial_indent_level != self.count_indents(old_block):
+            return self.parse(block, initial_indent_level, new_lines=new_lines)
+        
+        starts = [statement[0] for statement in old_statements]
+        prefix = get_common_prefix_length(block, old_block)
+        suffix = get_common_suffix_length(block, old_block, min(len(block), len(old_block)) - prefix)
+        delta = len(block) - len(old_block)
+        
+        # The tokenizer looks up to three characters ahead, and the statement 
+        # before the checkpoint one further, so keep clear of the change
+        checkpoint = max(bisect.bisect_right(starts, prefix - 3) - 1, 0)
+        
+        resynced = []
+        def resync(pos, do_indent):
+            # Everything from the character before pos on is unchanged
+            if pos - 1 < len(block) - suffix:
+                return False
+            
+            old_pos = pos - delta
+            index = bisect.bisect_left(starts, old_pos)
+            if index == len(starts) or starts[index] != old_pos:
+                return False
+            if do_indent != old_statements[index][3]:
+                return False
+            if get_line_prev_char(block, pos) != get_line_prev_char(old_block, old_pos):
+                return False
+            
+            resynced.append(index)
+            return True
+        
+        statements = []
+        for ssp, esp, reformatted_statement, new_line in old_statements[:checkpoint]:
+            statements.append((ssp, esp, reformatted_statement, block[ssp:esp]))
+            new_lines.append(new_line)
+        
+        # The first statement starts after any leading white space
+        if checkpoint == 0:
+            start, do_indent = 0, True
+        else:
+            start, do_indent = starts[checkpoint], old_statements[checkpoint][3]
+        statements += self.parse(block, initial_indent_level, start, do_indent, resync, PARSE_CHUNK, new_lines)
+        
+        if len(resynced) != 0:
+            for ssp, esp, reformatted_statement, new_line in old_statements[resynced[0]:]:
+                statements.append((ssp + delta, esp + delta, reformatted_statement, block[ssp + delta:esp + delta]))
+                new_lines.append(new_line)
         return statements
     
+    def get_parse_tree_level(self):
+        # The tree level depends on the cursor, so it takes a parse of its own
+        self.parse_tree_level = None
+        self._statements = self.parse(self.doc)
+        return self.parse_tree_level
+    
+    def reformat_stream(self, block, out = None):
+        """Writes the reformatted block to out a statement at a time, as each 
+        one is complete. Returns whether it differs from block; without out 
+        that is known, and returned, at the first difference.
+        
+        Only a chunk of tokens and one statement are held at a time, and block 
+        may be an mmap, so memory use doesn't grow with the document."""
+        # count_indents(block) without copying block
+        match = NON_SPACE_RE.search(block)
+        if match is None:
+            initial_indent_level = 0
+        else:
+            initial_indent_level = self.count_indents(block[:match.end()])
+        
+        pos = 0
+        changed = False
+        for ssp, esp, reformatted_statement, current_statement in self.iter_parse(block, initial_indent_level, 
+                chunk=PARSE_CHUNK):
+            if not changed and block[pos:pos + len(reformatted_statement)] != reformatted_statement:
+                changed = True
+                if out is None:
+                    return True
+            pos += len(reformatted_statement)
+            if out is not None:
+                out.write(reformatted_statement)
+        
+        return changed or pos != len(block)
+    
     def get_current_statement_index(self):
         for index, (ssp, esp, reformatted_statement, current_statement) in enumerate(self.statements):
             if self.tmcursor >= ssp and self.tmcursor < esp:
@@ -1083,6 +2449,7 @@ class MathMate(object):
             
         return statements
         
+    @traced("reformat")
     def reformat(self, process_entire_document = False, process_up_to_cursor = False):
         result = []
         
@@ -1106,9 +2473,10 @@ class MathMate(object):
         else:
             exit_replace_document("".join(result))
 
+    @traced("show")
     def show(self):
         result = []
-        result.append("Cursor: (Line: %d, Index: %d, Pos: %s, Tree: %s)" % (self.tmln, self.tmli, self.tmcursor, self.parse_tree_level))
+        result.append("Cursor: (Line: %d, Index: %d, Pos: %s, Tree: %s)" % (self.tmln, self.tmli, self.tmcursor, self.get_parse_tree_level()))
 
         if self.process_up_to_cursor:
             for index, (ssp, esp, reformatted_statement, current_statement) in enumerate(self.statements):
@@ -1142,6 +2510,7 @@ class MathMate(object):
 
         return "\n".join(result)
     
+    @traced("suggest")
     def suggest(self):
         # Get currently typed function
         fnname = []
@@ -1158,7 +2527,7 @@ class MathMate(object):
         
         fnname = "".join(fnname)
         
-        suggestions = filter(lambda x: x != "?" and x.startswith(fnname), self.get_symbols())
+        suggestions = complete_symbol(self.get_cached_symbols(), fnname)
         
         if len(suggestions) == 0:
             exit_show_tool_tip("No suggestions.")
@@ -1196,3 +2565,245 @@ class MathMate(object):
             end += 1
         
         return self.doc[start:end]
+
+def find_sources(paths):
+    """Yields the given files, and the .m files below the given folders."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".m"):
+                    yield os.path.join(root, name)
+
+def get_format_hash(indent, indent_size):
+    return hashlib.sha1("%d\0%s\0%d\0" % (PARSE_CACHE_VERSION, indent, indent_size))
+
+def get_format_key(doc, indent, indent_size):
+    key = get_format_hash(indent, indent_size)
+    key.update(doc)
+    return key.hexdigest()
+
+def get_file_format_key(path, indent, indent_size):
+    """Returns get_format_key of the file at path, read a block at a time."""
+    key = get_format_hash(indent, indent_size)
+    fp = open(path, 'rb')
+    try:
+        for block in iter(lambda: fp.read(65536), ""):
+            key.update(block)
+    finally:
+        fp.close()
+    return key.hexdigest()
+
+def format_file(job):
+    """Reformats one file for main. Returns (path, size, changed, key, error), 
+    with the format cache key of the file as rewritten, if it was, and the 
+    reason as error if the file couldn't be read or written.
+    
+    The file is mapped rather than read and the result streamed to a 
+    temporary file, which replaces it if anything changed."""
+    import mmap
+    path, indent_size, soft_tabs, check = job
+    mm = MathMate(doc="", indent_size=indent_size, soft_tabs=soft_tabs)
+    
+    try:
+        fp = open(path, 'rb')
+        try:
+            size = os.fstat(fp.fileno()).st_size
+            if size == 0:
+                return (path, 0, False, None, None)
+            doc = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            
+            try:
+                if check:
+                    return (path, size, mm.reformat_stream(doc), None, None)
+                
+                tmp_file = "%s.%d" % (path, os.getpid())
+                out = open(tmp_file, 'wb')
+                key = None
+                try:
+                    try:
+                        changed = mm.reformat_stream(doc, out)
+                    finally:
+                        out.close()
+                    
+                    if changed:
+                        # So the next run knows the result is formatted
+                        key = get_file_format_key(tmp_file, mm.indent, indent_size)
+                        shutil.copymode(path, tmp_file)
+                        os.rename(tmp_file, path)
+                finally:
+                    if os.path.exists(tmp_file):
+                        os.remove(tmp_file)
+                return (path, size, changed, key, None)
+            finally:
+                doc.close()
+        finally:
+            fp.close()
+    except (IOError, OSError, mmap.error), e:
+        return (path, 0, False, None, e.strerror or str(e))
+
+def format_files(paths, indent_size = DEFAULT_TAB_SIZE, soft_tabs = True, check = False, jobs = None, 
+                 cache_file = FORMAT_CACHE):
+    """Reformats files in parallel. Files already known to be formatted, by 
+    their content hash, are skipped. Returns the changed files and stats, 
+    whose errors lists the (path, reason) of files that couldn't be 
+    reformatted; the others are still done."""
+    indent = " " * indent_size if soft_tabs else "\t"
+    started = time.time()
+    
+    cache = {}
+    if cache_file is not None:
+        cache = read_json(cache_file, {})
+    
+    pending = []
+    keys = {}
+    skipped = 0
+    skipped_bytes = 0
+    errors = []
+    for path in find_sources(paths):
+        try:
+            fp = open(path, 'r')
+            try:
+                doc = fp.read()
+            finally:
+                fp.close()
+        except (IOError, OSError), e:
+            errors.append((path, e.strerror or str(e)))
+            continue
+        
+        key = get_format_key(doc, indent, indent_size)
+        if key in cache:
+            cache[key] = started
+            skipped += 1
+            skipped_bytes += len(doc)
+            continue
+        
+        keys[path] = key
+        pending.append((path, indent_size, soft_tabs, check))
+    
+    changed = []
+    formatted_bytes = 0
+    if len(pending) != 0:
+        import multiprocessing
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for path, size, path_changed, key, error in pool.imap_unordered(format_file, pending, 4):
+                formatted_bytes += size
+                if error is not None:
+                    errors.append((path, error))
+                elif path_changed:
+                    changed.append(path)
+                    if key is not None:
+                        cache[key] = started
+                else:
+                    cache[keys[path]] = started
+        finally:
+            pool.close()
+            pool.join()
+    
+    if cache_file is not None:
+        # Forget the files that were seen the longest time ago
+        if len(cache) > FORMAT_CACHE_SIZE:
+            cache = dict(sorted(cache.items(), key=lambda item: item[1])[-FORMAT_CACHE_SIZE:])
+        try:
+            write_json(cache_file, cache)
+        except (IOError, OSError):
+            pass
+    
+    elapsed = time.time() - started
+    stats = {"files": len(pending) + skipped, "skipped": skipped, "formatted": len(pending), 
+             "bytes": formatted_bytes + skipped_bytes, "seconds": elapsed, "errors": sorted(errors)}
+    return sorted(changed), stats
+
+def report_traces(args):
+    import optparse
+    parser = optparse.OptionParser(usage="usage: %prog trace [options] [trace files...]")
+    parser.add_option("--command", help="only report this command")
+    options, args = parser.parse_args(args)
+    
+    paths = args
+    if len(paths) == 0:
+        path = os.path.join(CACHE_FOLDER, "tmjlink.trace")
+        paths = [path + ".1", path]
+    
+    traces = [trace for trace in read_traces(paths) 
+        if options.command is None or trace["command"] == options.command]
+    if len(traces) == 0:
+        sys.stderr.write("No traces found in %s\n" % ", ".join(paths))
+        return 1
+    
+    print "%-12s %-12s %6s %10s %10s" % ("command", "phase", "count", "p50", "p95")
+    for command, phase, count, p50, p95 in summarize_traces(traces):
+        print "%-12s %-12s %6d %10s %10s" % (command, phase, count, format_ms(p50), format_ms(p95))
+    return 0
+
+def report_profiles(args):
+    import optparse
+    import pstats
+    parser = optparse.OptionParser(usage="usage: %prog profile [options] [stats files...]")
+    parser.add_option("--command", help="only merge profiles of this command")
+    parser.add_option("--sort", default="cumulative", help="pstats sort key (default: %default)")
+    parser.add_option("--limit", type="int", default=25, help="functions to list (default: %default)")
+    options, args = parser.parse_args(args)
+    
+    paths = args
+    if len(paths) == 0:
+        folder = os.path.join(CACHE_FOLDER, "profiles")
+        paths = get_profile_paths(folder, options.command)
+        if len(paths) == 0:
+            sys.stderr.write("No profiles found in %s, run commands with %s=1 first\n" % (folder, PROFILE_ENV))
+            return 1
+    
+    print "%d profiles" % len(paths)
+    stats = pstats.Stats(*paths)
+    stats.strip_dirs().sort_stats(options.sort).print_stats(options.limit)
+    return 0
+
+def main(args):
+    if len(args) > 0 and args[0] == "trace":
+        return report_traces(args[1:])
+    if len(args) > 0 and args[0] == "profile":
+        return report_profiles(args[1:])
+    
+    # Only the command line needs these, so bundle commands don't import them
+    import optparse
+    usage = "usage: %prog format [--check] [options] paths...\n       %prog trace [options] [trace files...]\n       %prog profile [options] [stats files...]"
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option("--check", action="store_true", default=False, 
+        help="list files that need reformatting instead of rewriting them")
+    parser.add_option("--tab-size", type="int", default=DEFAULT_TAB_SIZE)
+    parser.add_option("--hard-tabs", action="store_true", default=False, help="indent with tabs")
+    parser.add_option("-j", "--jobs", type="int", help="worker processes (default: one per core)")
+    parser.add_option("--cache", default=FORMAT_CACHE, help="content hash cache of formatted files")
+    parser.add_option("--no-cache", action="store_const", dest="cache", const=None)
+    options, args = parser.parse_args(args)
+    
+    if len(args) < 2 or args[0] != "format":
+        parser.error("expected: format paths...")
+    
+    changed, stats = format_files(args[1:], options.tab_size, not options.hard_tabs, options.check, 
+        options.jobs, options.cache)
+    
+    for path in changed:
+        print path
+    for path, error in stats["errors"]:
+        sys.stderr.write("%s: %s\n" % (path, error))
+    
+    seconds = max(stats["seconds"], 1e-6)
+    sys.stderr.write("%d files (%d unchanged since last run), %d %s in %.2fs: %.1f files/s, %.2f MB/s\n" % (
+        stats["files"], stats["skipped"], len(changed), 
+        "need reformatting" if options.check else "reformatted", stats["seconds"], 
+        stats["files"] / seconds, stats["bytes"] / seconds / 1e6))
+    
+    if len(stats["errors"]) != 0 or (options.check and len(changed) != 0):
+        return 1
+    return 0
+
+IMPORT_SECONDS = time.time() - IMPORT_STARTED
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
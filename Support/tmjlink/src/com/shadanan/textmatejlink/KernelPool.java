@@ -0,0 +1,196 @@
+package com.shadanan.textmatejlink;
+
+import java.util.LinkedList;
+
+import com.wolfram.jlink.KernelLink;
+import com.wolfram.jlink.MathLinkException;
+import com.wolfram.jlink.MathLinkFactory;
+
+public class KernelPool extends Thread {
+	// Pause before launching again after a kernel failed to launch, unless
+	// a caller is waiting for one
+	public static final long RETRY_INTERVAL = 5000;
+	
+	private String[] mlargs = null;
+	private int size = 0;
+	private boolean running = false;
+	private LinkedList<KernelLink> idle = null;
+	private int waiting = 0;
+	private long started = 0;
+	private MathLinkException failure = null;
+	private long failedLaunch = 0;
+	
+	private long hits = 0;
+	private long misses = 0;
+	private long waitTime = 0;
+	private long launches = 0;
+	private long launchTime = 0;
+	
+	// Keeps size kernels launched and idle, launching them one at a time in
+	// the background. With a size of 0 kernels are launched when taken.
+	public KernelPool(String[] mlargs, int size) {
+		super("KernelPool");
+		setDaemon(true);
+		this.mlargs = mlargs;
+		this.size = size;
+		this.running = true;
+		this.idle = new LinkedList<KernelLink>();
+	}
+	
+	private KernelLink launch() throws MathLinkException {
+		long start = System.currentTimeMillis();
+		KernelLink kernelLink = MathLinkFactory.createKernelLink(mlargs);
+		kernelLink.discardAnswer();
+		
+		synchronized (this) {
+			launches++;
+			launchTime += System.currentTimeMillis() - start;
+		}
+		return kernelLink;
+	}
+	
+	// Returns an idle kernel, waiting for one to be launched if there are
+	// none. A kernel that is taken is the caller's to close.
+	public KernelLink take() throws MathLinkException {
+		if (size == 0) {
+			long start = System.currentTimeMillis();
+			KernelLink kernelLink = launch();
+			synchronized (this) {
+				misses++;
+				waitTime += System.currentTimeMillis() - start;
+			}
+			return kernelLink;
+		}
+		
+		synchronized (this) {
+			long start = System.currentTimeMillis();
+			boolean hit = !idle.isEmpty();
+			
+			// Each waiting caller raises the number of kernels being launched.
+			// It fails only if a launch started after it arrived fails, one in
+			// progress may have lacked the license a reset has just released.
+			long arrived = started;
+			waiting++;
+			notifyAll();
+			try {
+				while (idle.isEmpty() && running && (failure == null || failedLaunch <= arrived)) {
+					wait();
+				}
+			} catch (InterruptedException e) {
+				throw new MathLinkException(e);
+			} finally {
+				waiting--;
+			}
+			
+			if (idle.isEmpty()) {
+				if (failure != null)
+					throw failure;
+				throw new MathLinkException(MathLinkException.MLE_LINK_IS_NULL, "Kernel pool closed");
+			}
+			
+			long waited = System.currentTimeMillis() - start;
+			if (hit)
+				hits++;
+			else
+				misses++;
+			waitTime += waited;
+			
+			KernelLink kernelLink = idle.removeFirst();
+			notifyAll();
+			System.out.println("Kernel pool " + (hit ? "hit" : "miss") + ", waited " + waited + "ms: " + getStatus());
+			return kernelLink;
+		}
+	}
+	
+	public synchronized String getStatus() {
+		return idle.size() + "/" + size + " idle, " + 
+			hits + " hits, " + misses + " misses, " + 
+			waitTime + "ms waited, " + 
+			launches + " launches (" + (launches == 0 ? 0 : launchTime / launches) + "ms average)";
+	}
+	
+	public synchronized long getHits() {
+		return hits;
+	}
+	
+	public synchronized long getMisses() {
+		return misses;
+	}
+	
+	public synchronized long getWaitTime() {
+		return waitTime;
+	}
+	
+	public void close() {
+		synchronized (this) {
+			running = false;
+			notifyAll();
+		}
+		
+		try {
+			join();
+		} catch (InterruptedException e) {
+			e.printStackTrace();
+		}
+		
+		synchronized (this) {
+			for (KernelLink kernelLink : idle) {
+				kernelLink.close();
+			}
+			idle.clear();
+		}
+	}
+	
+	@Override
+  public void run() {
+		while (true) {
+			long launch;
+			synchronized (this) {
+				try {
+					while (running && idle.size() >= size + waiting) {
+						wait();
+					}
+				} catch (InterruptedException e) {
+					e.printStackTrace();
+					running = false;
+				}
+				
+				if (!running)
+					return;
+				launch = ++started;
+			}
+			
+			try {
+				KernelLink kernelLink = launch();
+				synchronized (this) {
+					if (!running) {
+						kernelLink.close();
+						return;
+					}
+					idle.addLast(kernelLink);
+					failure = null;
+					notifyAll();
+				}
+			} catch (MathLinkException e) {
+				// Waiting callers fail rather than wait for a kernel that might
+				// never launch
+				e.printStackTrace();
+				synchronized (this) {
+					failure = e;
+					failedLaunch = launch;
+					notifyAll();
+					
+					// Retry later, or right away for callers that are still waiting
+					long deadline = System.currentTimeMillis() + RETRY_INTERVAL;
+					try {
+						while (running && waiting == 0 && System.currentTimeMillis() < deadline) {
+							wait(Math.max(deadline - System.currentTimeMillis(), 1));
+						}
+					} catch (InterruptedException ie) {
+						return;
+					}
+				}
+			}
+		}
+	}
+}
@@ -28,17 +28,17 @@ public class Resources implements PacketListener {
 	private ArrayList<Resources.Resource> resources = null;
 	private Session session;
 	
-	public Resources(String sessionId, String cacheFolder, String[] mlargs) 
-			throws MathLinkException, IOException {
+	// Takes over kernelLink, an already launched kernel (see KernelPool)
+	public Resources(String sessionId, String cacheFolder, String[] mlargs, KernelLink kernelLink) 
+			throws IOException {
 		this.sessionId = sessionId;
 		this.cacheFolder = cacheFolder;
 		this.mlargs = mlargs;
 		this.resources = new ArrayList<Resources.Resource>();
 		
-		// Allocate the kernel link and register packet listener
-		kernelLink = MathLinkFactory.createKernelLink(mlargs);
+		// Register packet listener on the kernel link
+		this.kernelLink = kernelLink;
 		kernelLink.addPacketListener(this);
-		kernelLink.discardAnswer();
 		
 		// Create cache folder
 		File sessionFolderPointer = getSessionFolder();
@@ -108,7 +108,6 @@ public class Resources implements PacketListener {
 	
 	public String getSuggestions() throws MathLinkException, ExprFormatException {
 		StringBuilder result = new StringBuilder();
-		result.append("[");
 		
 		kernelLink.evaluate("$ContextPath");
 		kernelLink.waitForAnswer();
@@ -121,14 +120,12 @@ public class Resources implements PacketListener {
 			Expr symbols = kernelLink.getExpr();
 			
 			for (int i = 1; i <= symbols.length(); i++) {
-				result.append('"');
+				if (result.length() > 0)
+					result.append('\n');
 				result.append(symbols.part(i).asString());
-				result.append('"');
-				result.append(",");
 			}
 		}
 		
-		result.append("]");
 		return result.toString();
 	}
 	
@@ -1,5 +1,7 @@
 package com.shadanan.textmatejlink;
 
+import java.io.File;
+import java.io.FileWriter;
 import java.io.IOException;
 import java.net.ServerSocket;
 import java.net.Socket;
@@ -19,8 +21,9 @@ public class Server extends Thread {
 	private Object sessionsLock = null;
 	private ArrayList<Session> sessions = null;
 	private HashMap<String, Resources> resourcesMap = null;
+	private KernelPool kernelPool = null;
 	
-	public Server(String cacheFolder, int textMatePid, String[] mlargs) {
+	public Server(String cacheFolder, int textMatePid, String[] mlargs, int kernelPoolSize) {
 		this.cacheFolder = cacheFolder;
 		this.textMatePid = textMatePid;
 		this.mlargs = mlargs;
@@ -29,16 +32,29 @@ public class Server extends Thread {
 		resourcesMap = new HashMap<String, Resources>();
 		sessions = new ArrayList<Session>();
 		sessionsLock = new Object();
+		kernelPool = new KernelPool(mlargs, kernelPoolSize);
 		
 		System.out.println("TextMate PID: " + textMatePid);
+		System.out.println("Kernel pool size: " + kernelPoolSize);
 	}
 	
 	@Override
   public void run() {
+		// Kernels launch while the server starts and waits for the first session
+		kernelPool.start();
+		
 		try {
 			ServerSocket ss = new ServerSocket(0);
 			ss.setSoTimeout(1000);
+			
+			// Must be listening before the port is published, clients look for
+			// the socket file once they see the port
+			UnixListener unixListener = UnixListener.open(this, getSocketFile());
+			if (unixListener != null)
+				unixListener.start();
+			
 			System.out.println("Server started on port: " + ss.getLocalPort());
+			publishPort(ss.getLocalPort());
 			
 			while (running) {
 				try {
@@ -55,10 +71,7 @@ public class Server extends Thread {
 					System.out.println("Opening connection: " + socket.getRemoteSocketAddress());
 					Session session = new Session(this, socket);
 					session.start();
-					
-					synchronized (sessionsLock) {
-						sessions.add(session);
-					}
+					addSession(session);
 				} catch (SocketTimeoutException te) {
 					continue;
 				} catch (InterruptedException e) {
@@ -69,6 +82,9 @@ public class Server extends Thread {
 			}
 			
 			ss.close();
+			if (unixListener != null)
+				unixListener.close();
+			getPortFile().delete();
 		} catch (IOException e) {
 			e.printStackTrace();
 			running = false;
@@ -77,6 +93,10 @@ public class Server extends Thread {
 		// Wait for all connections to end
 		try {
 			synchronized (sessionsLock) {
+				for (Session session : sessions) {
+					session.disconnect();
+				}
+				
 				while (sessions.size() > 0) {
 					System.out.println("Waiting for " + sessions.size() + " sessions to end...");
 					sessionsLock.wait();
@@ -96,9 +116,31 @@ public class Server extends Thread {
 			iterator.remove();
 		}
 		
+		System.out.println("Closing kernel pool: " + kernelPool.getStatus());
+		kernelPool.close();
+		
 		System.out.println("Server shut down.");
 	}
 	
+	public File getSocketFile() {
+		return new File(cacheFolder, "tmjlink.sock");
+	}
+	
+	public File getPortFile() {
+		return new File(cacheFolder, "tmjlink.port");
+	}
+	
+	private void publishPort(int port) throws IOException {
+		// Renamed into place so clients never read a partially written port
+		File tempFile = new File(cacheFolder, "tmjlink.port.tmp");
+		FileWriter writer = new FileWriter(tempFile);
+		writer.write(port + "\n");
+		writer.close();
+		
+		if (!tempFile.renameTo(getPortFile()))
+			throw new IOException("Could not publish port file: " + getPortFile());
+	}
+	
 	public boolean isRunning() {
 		return running;
 	}
@@ -108,6 +150,12 @@ public class Server extends Thread {
 		running = false;
 	}
 	
+	public void addSession(Session session) {
+		synchronized (sessionsLock) {
+			sessions.add(session);
+		}
+	}
+	
 	public void deleteSession(Session session) {
 		synchronized (sessionsLock) {
 			sessions.remove(session);
@@ -118,7 +166,7 @@ public class Server extends Thread {
 	public Resources getResources(String sessionId) throws MathLinkException, IOException {
 		if (resourcesMap.get(sessionId) == null) {
 			System.out.println("Allocating Resources for Session ID: " + sessionId);
-			Resources resources = new Resources(sessionId, cacheFolder, mlargs);
+			Resources resources = new Resources(sessionId, cacheFolder, mlargs, kernelPool.take());
 			synchronized (sessionsLock) {
 				resourcesMap.put(sessionId, resources);
 			}
@@ -137,7 +185,7 @@ public class Server extends Thread {
 		}
 		
 		System.out.println("Allocating Resources for Session ID: " + sessionId);
-		resources = new Resources(sessionId, cacheFolder, mlargs);
+		resources = new Resources(sessionId, cacheFolder, mlargs, kernelPool.take());
 		synchronized (sessionsLock) {
 			resourcesMap.put(sessionId, resources);
 		}
@@ -150,6 +198,8 @@ public class Server extends Thread {
 		for (Session session : sessions) {
 			session.printStatus();
 		}
+		System.out.println("==== Kernel Pool ====");
+		System.out.println(kernelPool.getStatus());
 		System.out.println("==== Allocated Resources ====");
 		for (Entry<String, Resources> entry : resourcesMap.entrySet()) {
 			System.out.println("Session ID: " + entry.getKey() + ", " + 
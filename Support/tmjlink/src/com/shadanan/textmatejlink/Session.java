@@ -5,12 +5,19 @@ import java.io.InputStreamReader;
 import java.io.PrintWriter;
 import java.net.Socket;
 import java.net.SocketTimeoutException;
+import java.nio.channels.Channels;
+import java.nio.channels.SocketChannel;
 
 import com.wolfram.jlink.ExprFormatException;
 import com.wolfram.jlink.MathLinkException;
 
 public class Session extends Thread {
+	// Payloads longer than this are sent as chunk frames followed by a final
+	// inline frame, so the client can show output while the rest is sent
+	public static final int CHUNK_SIZE = 65536;
+	
 	private Socket socket = null;
+	private SocketChannel channel = null;
 	private PrintWriter out = null;
 	private InputStreamReader in = null;
 	
@@ -24,8 +31,30 @@ public class Session extends Thread {
 		this.running = true;
 	}
 	
+	public Session(Server server, SocketChannel channel) {
+		this.server = server;
+		this.channel = channel;
+		this.running = true;
+	}
+	
+	public String getRemoteName() {
+		if (channel != null)
+			return "unix:" + getId();
+		return String.valueOf(socket.getRemoteSocketAddress());
+	}
+	
+	public void disconnect() {
+		// Unblocks a pending read, which has no timeout on a channel
+		try {
+			if (channel != null)
+				channel.close();
+		} catch (IOException e) {
+			e.printStackTrace();
+		}
+	}
+	
 	public void printStatus() {
-		System.out.println("Connection: " + socket.getRemoteSocketAddress());
+		System.out.println("Connection: " + getRemoteName());
 		if (resources != null) {
 			System.out.println("  Associated with Session ID: " + resources.getSessionId());
 		}
@@ -33,7 +62,10 @@ public class Session extends Thread {
 	
 	public void close() {
 		try {
-			socket.close();
+			if (channel != null)
+				channel.close();
+			else
+				socket.close();
 		} catch (IOException e) {
 			e.printStackTrace();
 		}
@@ -43,11 +75,11 @@ public class Session extends Thread {
 	
 	private void setSessionId(String sessionId) throws MathLinkException, IOException {
 		resources = server.getResources(sessionId);
-		System.out.println("Associating connection: " + socket.getRemoteSocketAddress() + " with Session ID: " + sessionId);
+		System.out.println("Associating connection: " + getRemoteName() + " with Session ID: " + sessionId);
 	}
 	
 	private void resetResources() throws MathLinkException, IOException {
-		server.newResources(resources.getSessionId());
+		resources = server.newResources(resources.getSessionId());
 		System.out.println("Resetting Resources with Session ID: " + resources.getSessionId());
 	}
 	
@@ -113,20 +145,45 @@ public class Session extends Thread {
 	}
 	
 	public void sendInline(String data) {
-		send("inline " + (data.length() + 1));
+		int start = 0;
+		while (data.length() - start > CHUNK_SIZE) {
+			int end = start + CHUNK_SIZE;
+			if (Character.isHighSurrogate(data.charAt(end - 1)))
+				end--;
+			sendChunk(data.substring(start, end));
+			start = end;
+		}
+		
+		// Like chunk frames, the count is in bytes; clients read it as such
+		data = data.substring(start);
+		send("inline " + (data.getBytes().length + 1));
 		send(data);
 	}
 	
+	public void sendChunk(String data) {
+		// The count is in bytes as written by out, there's no trailing newline
+		String reply = "chunk " + data.getBytes().length;
+		System.out.println("To " + getRemoteName() + ": " + reply);
+		out.println(reply);
+		out.print(data);
+		out.flush();
+	}
+	
 	private void send(String reply) {
-		System.out.println("To " + socket.getRemoteSocketAddress() + ": " + reply);
+		System.out.println("To " + getRemoteName() + ": " + reply);
 		out.println(reply);
 	}
 	
 	@Override
   public void run() {
 		try {
-			in = new InputStreamReader(socket.getInputStream());
-			out = new PrintWriter(socket.getOutputStream(), true);
+			if (channel != null) {
+				in = new InputStreamReader(Channels.newInputStream(channel));
+				out = new PrintWriter(Channels.newOutputStream(channel), true);
+			} else {
+				in = new InputStreamReader(socket.getInputStream());
+				out = new PrintWriter(socket.getOutputStream(), true);
+			}
 		} catch (IOException e) {
 			System.out.println("Socket is shutdown");
 			running = false;
@@ -165,7 +222,7 @@ public class Session extends Thread {
 				}
 			}
 			
-			System.out.println("From " + socket.getRemoteSocketAddress() + ": " + data);
+			System.out.println("From " + getRemoteName() + ": " + data);
 			
 			if (state == 0) {
 				if (command.equals("quit")) {
@@ -214,9 +271,7 @@ public class Session extends Thread {
 				
 				if (command.equals("header")) {
 					try {
-						String renderedHtml = resources.render();
-						send("inline " + (renderedHtml.length() + 1));
-						send(renderedHtml);
+						sendInline(resources.render());
 						send("okay");
 					} catch (Exception e) {
 						send("exception -- " + e.getMessage());
@@ -248,8 +303,10 @@ public class Session extends Thread {
 				
 				if (command.equals("suggest")) {
 					try {
+						// One symbol per line, the count is in bytes as written by out
 						String suggestions = resources.getSuggestions();
-						send("suggestions " + suggestions);
+						send("suggestions " + (suggestions.getBytes().length + 1));
+						send(suggestions);
 					} catch (MathLinkException e) {
 						send("exception -- " + e.getMessage());
 						e.printStackTrace();
@@ -316,7 +373,7 @@ public class Session extends Thread {
 			send("exception -- Invalid command (" + state + "): " + command);
 		}
 		
-		System.out.println("Closing connection: " + socket.getRemoteSocketAddress());
+		System.out.println("Closing connection: " + getRemoteName());
 		
 		if (in != null) {
 			try {
@@ -11,7 +11,11 @@ public class TextMateJLink {
 			mlargs[i-2] = args[i];
 		}
 		
-		Server server = new Server(cacheFolder, textMatePid, mlargs);
+		// Idle kernels kept launched for new sessions and resets, each uses a 
+		// kernel license so there are none unless asked for
+		int kernelPoolSize = Integer.getInteger("tmjlink.kernelPool", 0);
+		
+		Server server = new Server(cacheFolder, textMatePid, mlargs, kernelPoolSize);
 		Runtime.getRuntime().addShutdownHook(new Shutdown(server));
 		server.start();
 		server.join();
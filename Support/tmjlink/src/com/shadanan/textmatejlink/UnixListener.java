@@ -0,0 +1,71 @@
+package com.shadanan.textmatejlink;
+
+import java.io.File;
+import java.io.IOException;
+import java.lang.reflect.Method;
+import java.net.ProtocolFamily;
+import java.net.SocketAddress;
+import java.net.StandardProtocolFamily;
+import java.nio.channels.ServerSocketChannel;
+import java.nio.channels.SocketChannel;
+
+public class UnixListener extends Thread {
+	private Server server = null;
+	private File socketFile = null;
+	private ServerSocketChannel channel = null;
+	
+	private UnixListener(Server server, File socketFile, ServerSocketChannel channel) {
+		this.server = server;
+		this.socketFile = socketFile;
+		this.channel = channel;
+	}
+	
+	// Unix domain socket channels only exist from Java 16, so they are looked 
+	// up reflectively. Returns null when the JVM does not support them, in 
+	// which case clients stay on TCP.
+	public static UnixListener open(Server server, File socketFile) {
+		try {
+			Class<?> addressClass = Class.forName("java.net.UnixDomainSocketAddress");
+			Method of = addressClass.getMethod("of", String.class);
+			SocketAddress address = (SocketAddress)of.invoke(null, socketFile.getPath());
+			
+			Method open = ServerSocketChannel.class.getMethod("open", ProtocolFamily.class);
+			ProtocolFamily unix = StandardProtocolFamily.valueOf("UNIX");
+			ServerSocketChannel channel = (ServerSocketChannel)open.invoke(null, unix);
+			
+			socketFile.delete();
+			channel.bind(address);
+			System.out.println("Server listening on socket: " + socketFile);
+			return new UnixListener(server, socketFile, channel);
+		} catch (Exception e) {
+			System.out.println("Unix domain socket unavailable: " + e);
+			return null;
+		}
+	}
+	
+	public void close() {
+		try {
+			channel.close();
+		} catch (IOException e) {
+			e.printStackTrace();
+		}
+		socketFile.delete();
+	}
+	
+	@Override
+  public void run() {
+		while (server.isRunning() && channel.isOpen()) {
+			try {
+				SocketChannel client = channel.accept();
+				Session session = new Session(server, client);
+				System.out.println("Opening connection: " + session.getRemoteName());
+				session.start();
+				server.addSession(session);
+			} catch (IOException e) {
+				if (channel.isOpen())
+					e.printStackTrace();
+				break;
+			}
+		}
+	}
+}
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import re
+import json
 
 def to_camelcase(function):
     return re.sub('(((?<=[a-z])[A-Z])|([A-Z](?![A-Z]|$)))', '_\\1', function).lower().strip('_')
@@ -19,7 +20,8 @@ def print_symbol_grammar(symbols):
 
 def main():
     fp = open('symbols.json', 'r')
-    functions, symbols = eval(fp.read())
+    functions, symbols = json.load(fp)
+    fp.close()
     
     # print_function_grammar(functions)
     print_symbol_grammar(symbols)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""Cost of finding TextMate among the ancestors of the current process, as
+done on every server launch.
+
+The walk goes all the way to init here since TextMate isn't running. The
+old lookup ran ps once per ancestor; the process tables read /proc (no
+process at all) or list every process with a single ps.
+"""
+import os
+import subprocess
+
+from common import *
+
+def is_textmate(command):
+    return "TextMate.app/Contents/MacOS/TextMate" in command
+
+def ps_per_ancestor():
+    current_pid = os.getpid()
+    while current_pid != 1:
+        shell = subprocess.Popen(["ps", "-p", str(current_pid), "-o", "pid,ppid,command"], stdout=subprocess.PIPE)
+        process = map(lambda x: x[:11].split() + [x[12:]], shell.stdout.read().rstrip().split("\n"))[1]
+        if is_textmate(process[2]):
+            return current_pid
+        current_pid = int(process[1])
+    return None
+
+def count_ancestors():
+    table = mathmate.get_process_table()
+    pid = os.getpid()
+    count = 0
+    while pid > 1:
+        pid = table.get_process(pid)[0]
+        count += 1
+    return count
+
+def bench_ancestry(repeat = 10):
+    lookups = [
+        ("ps per ancestor", ps_per_ancestor),
+        ("single ps", lambda: mathmate.find_ancestor(os.getpid(), is_textmate, mathmate.PsProcessTable())),
+    ]
+    if os.path.exists("/proc/self/stat"):
+        lookups.append(("/proc", lambda: mathmate.find_ancestor(os.getpid(), is_textmate, mathmate.ProcfsProcessTable())))
+    return count_ancestors(), [(name, best_of(function, repeat)) for name, function in lookups]
+
+def main():
+    ancestors, results = bench_ancestry()
+    for name, elapsed in results:
+        print "%-16s %8.2fms for %d ancestors" % (name, elapsed * 1000, ancestors)
+
+if __name__ == '__main__':
+    main()
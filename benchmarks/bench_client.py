@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+"""Round-trip latency of TextMateJLinkClient against a fake server.
+
+Compares opening a connection (and doing the sessid handshake) for every
+request with reusing one connection for all of them.
+"""
+import socket
+
+from common import *
+import fakeserver
+
+def connect(port):
+    sock = socket.create_connection(("localhost", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return mathmate.TextMateJLinkClient(sock, "bench")
+
+def per_request_connections(port, count):
+    for i in range(count):
+        client = connect(port)
+        client.intexec("1 + %d" % i)
+        client.close()
+
+def persistent_connection(port, count):
+    client = connect(port)
+    for i in range(count):
+        client.intexec("1 + %d" % i)
+    client.close()
+
+def bench_client(count = 500):
+    proc, port = fakeserver.spawn()
+    try:
+        return [(name, best_of(lambda: function(port, count)) / count)
+            for name, function in (("connection per request", per_request_connections), 
+                                   ("persistent connection", persistent_connection))]
+    finally:
+        proc.kill()
+        proc.wait()
+
+def main():
+    for name, latency in bench_client():
+        print "%-24s %8.1fus/request" % (name, latency * 1e6)
+
+if __name__ == '__main__':
+    main()
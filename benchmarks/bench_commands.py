@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Latency of the document handling done by bundle commands.
+
+Each command constructs a MathMate and then does its work. Times are for 
+a parse on every construction (as before the cache), a cold parse cache 
+and a warm one.
+"""
+import shutil
+import tempfile
+
+from common import *
+
+COMMANDS = [
+    ("Get Current Symbol", lambda mm: mm.get_current_symbol()),
+    ("Execute Current Statement", lambda mm: mm.get_current_statements()),
+    ("Execute Document", lambda mm: mm.get_current_statements(process_entire_document=True)),
+    ("Reformat Document", lambda mm: [statement[2] for statement in mm.statements]),
+]
+
+def run(doc, command, state_folder, eager = False):
+    mm = make_mathmate(doc)
+    mm.stateFolder = state_folder
+    if eager:
+        mm.parse(mm.doc)
+    command(mm)
+
+def bench_commands(lines = (500, 5000)):
+    results = []
+    for count in lines:
+        doc = generate_package(count)
+        for name, command in COMMANDS:
+            state_folder = tempfile.mkdtemp()
+            try:
+                eager = best_of(lambda: run(doc, command, state_folder, True))
+                
+                def cold():
+                    shutil.rmtree(state_folder, True)
+                    run(doc, command, state_folder)
+                cold_time = best_of(cold)
+                
+                run(doc, command, state_folder)
+                warm = best_of(lambda: run(doc, command, state_folder))
+                results.append((count, name, eager, cold_time, warm))
+            finally:
+                shutil.rmtree(state_folder, True)
+    return results
+
+def main():
+    for count, name, eager, cold, warm in bench_commands():
+        print "%5d lines %-26s parse %8.2fms, cold %8.2fms, warm %7.2fms" % (
+            count, name, eager * 1000, cold * 1000, warm * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""Latency of Command Completion's symbol lookup.
+
+Compares asking the kernel for every symbol on each completion (and
+filtering them linearly) with the per-session symbol cache.
+"""
+import os
+import shutil
+import socket
+import tempfile
+
+from common import *
+import fakeserver
+
+PREFIXES = ("", "Plot", "Sym", "Symbol1", "Zeta", "NoSuchSymbol")
+
+def kernel_completion(port, prefix):
+    client = mathmate.TextMateJLinkClient(socket.create_connection(("localhost", port)), "bench")
+    suggestions = filter(lambda x: x != "?" and x.startswith(prefix), client.suggest())
+    client.close()
+    return suggestions
+
+def cached_completion(mm, prefix):
+    return mathmate.complete_symbol(mm.get_cached_symbols(), prefix)
+
+def complete_system(mm, prefix):
+    return [symbol for symbol in mm.get_system_symbols() if symbol.startswith(prefix)]
+
+def bench_completion(symbol_count = 12000):
+    state_folder = tempfile.mkdtemp()
+    proc, port = fakeserver.spawn(symbol_count=symbol_count)
+    try:
+        mm = make_mathmate("")
+        mm.stateFolder = state_folder
+        symbols = mm.get_system_symbols() + ["Symbol%d" % i for i in range(symbol_count)]
+        mathmate.write_symbols(mm.get_symbols_path(), sorted(symbols))
+        
+        results = []
+        for prefix in PREFIXES:
+            expected = kernel_completion(port, prefix)
+            assert cached_completion(mm, prefix) == sorted(expected + complete_system(mm, prefix))
+            results.append((prefix, len(symbols),
+                best_of(lambda: kernel_completion(port, prefix), 10),
+                best_of(lambda: cached_completion(mm, prefix), 10)))
+        return results
+    finally:
+        proc.kill()
+        proc.wait()
+        shutil.rmtree(state_folder)
+
+def main():
+    for prefix, count, kernel, cached in bench_completion():
+        print "%-14s %6d symbols: kernel %7.2fms, cached %6.2fms" % (
+            repr(prefix), count, kernel * 1000, cached * 1000)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Measures connection latency (connect and sessid handshake) against a 
+fake server.
+
+Warm start: the server is already running and has published its port.
+Cold start: the server is launched with a simulated boot time; the figure
+reported is how long after the simulated boot the client connected, which
+includes the stand-in's own interpreter start-up.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from common import *
+import fakeserver
+
+STARTUP_DELAY = 0.5
+
+def make_client(cache_folder, proc):
+    mm = make_mathmate("1 + 1\n")
+    mm.cacheFolder = cache_folder
+    mm.tmjlink_pid = proc.pid
+    mm.tmjlink_proc = proc
+    return mm
+
+def connect(mm):
+    mm.get_client()
+    mm.close_client()
+
+def spawn(cache_folder, startup_delay = 0.0):
+    return subprocess.Popen([sys.executable, fakeserver.__file__, 
+        "--port-file", os.path.join(cache_folder, "tmjlink.port"), 
+        "--startup-delay", str(startup_delay)], stdout=subprocess.PIPE)
+
+def warm_start(cache_folder, count = 100):
+    proc = spawn(cache_folder)
+    try:
+        proc.stdout.readline()
+        mm = make_client(cache_folder, proc)
+        
+        start = time.time()
+        for i in range(count):
+            connect(mm)
+        return (time.time() - start) / count
+    finally:
+        proc.kill()
+        proc.wait()
+        os.remove(os.path.join(cache_folder, "tmjlink.port"))
+
+def cold_start(cache_folder, count = 5):
+    total = 0.0
+    for i in range(count):
+        start = time.time()
+        proc = spawn(cache_folder, STARTUP_DELAY)
+        try:
+            mm = make_client(cache_folder, proc)
+            connect(mm)
+            total += time.time() - start - STARTUP_DELAY
+        finally:
+            proc.kill()
+            proc.wait()
+            os.remove(os.path.join(cache_folder, "tmjlink.port"))
+    return total / count
+
+def bench_connect():
+    cache_folder = tempfile.mkdtemp()
+    try:
+        return warm_start(cache_folder), cold_start(cache_folder)
+    finally:
+        shutil.rmtree(cache_folder)
+
+def main():
+    warm, cold = bench_connect()
+    print "warm start connect: %8.2fms" % (warm * 1000)
+    print "cold start connect: %8.2fms after the server was ready" % (cold * 1000)
+
+if __name__ == '__main__':
+    main()
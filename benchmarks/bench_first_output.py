@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Time to the first output of a statement whose output is long and slow.
+
+The fake server produces a large payload over a fixed time, as a kernel
+printing while it evaluates would. Sent as one inline frame, nothing can
+be shown until the whole payload exists, and the client buffers all of
+it; sent in chunk frames, the first piece is written as soon as it is
+produced and the client's buffer stays at the chunk size.
+"""
+import time
+import socket
+
+from common import *
+import fakeserver
+
+def execute(port, statement):
+    client = mathmate.TextMateJLinkClient(socket.create_connection(("localhost", port)), "firstoutput")
+    times = []
+    output = []
+    def on_inline(data):
+        times.append(time.time())
+        output.append(data)
+    
+    start = time.time()
+    client.execute_batch([statement], on_inline)
+    elapsed = time.time() - start
+    buffer_size = len(client.reader.buffer)
+    client.close()
+    return times[0] - start, elapsed, buffer_size, "".join(output)
+
+def bench_first_output(payload_size = 1048576, output_time = 0.5, chunk_size = 65536):
+    results = []
+    expected = None
+    for mode, size in (("inline", 0), ("chunked", chunk_size)):
+        proc, port = fakeserver.spawn(payload_size=payload_size, output_time=output_time, chunk_size=size)
+        try:
+            first, elapsed, buffer_size, output = execute(port, "Do[Print[i], {i, 10^5}]")
+        finally:
+            proc.kill()
+            proc.wait()
+        
+        if expected is None:
+            expected = output
+        assert output == expected
+        results.append((mode, payload_size, first, elapsed, buffer_size))
+    return results
+
+def main():
+    for mode, payload_size, first, elapsed, buffer_size in bench_first_output():
+        print "%-8s %8d bytes: first output %8.2fms, done %8.2fms, reader buffer %8d bytes" % (
+            mode, payload_size, first * 1000, elapsed * 1000, buffer_size)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""Latency of Execute Statements To Image with the client side result cache.
+
+The fake server takes a fixed time to "rasterize" each statement and writes
+an image file per request, as Resources does. The first request of a
+statement misses the cache; repeating it in the same epoch is served from
+the cache; executing anything else starts a new epoch and misses again.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import StringIO
+import subprocess
+
+from common import *
+import fakeserver
+
+STATEMENT = "Plot[Sin[x] E^(-x/4), {x, 0, 20}, Filling -> Axis]"
+
+def spawn(cache_folder, eval_time, payload_size):
+    image_folder = os.path.join(cache_folder, "bench")
+    os.mkdir(image_folder)
+    proc = subprocess.Popen([sys.executable, fakeserver.__file__,
+        "--port-file", os.path.join(cache_folder, "tmjlink.port"),
+        "--eval-time", str(eval_time), "--payload-size", str(payload_size),
+        "--image-folder", image_folder], stdout=subprocess.PIPE)
+    proc.stdout.readline()
+    return proc
+
+def make_client(cache_folder, proc, statement):
+    mm = make_mathmate(statement + "\n")
+    mm.cacheFolder = cache_folder
+    mm.stateFolder = os.path.join(cache_folder, "tmjlink.client")
+    mm.tmjlink_pid = proc.pid
+    mm.tmjlink_proc = proc
+    mm.preferences = {}
+    return mm
+
+def execute_to_image(cache_folder, proc, statement):
+    mm = make_client(cache_folder, proc, statement)
+    
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        start = time.time()
+        mm.inline([statement], force_image=True)
+        elapsed = time.time() - start
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+        mm.close_client()
+    assert "class=\"exception\"" not in output, output
+    return elapsed, mm
+
+def bench_image_cache(eval_time = 0.05, payload_size = 65536, repeat = 5):
+    cache_folder = tempfile.mkdtemp()
+    proc = spawn(cache_folder, eval_time, payload_size)
+    try:
+        misses = []
+        hits = []
+        for i in range(repeat):
+            # Anything else executed in the session starts a new epoch
+            make_client(cache_folder, proc, STATEMENT).advance_epoch()
+            misses.append(execute_to_image(cache_folder, proc, STATEMENT)[0])
+            hits.append(execute_to_image(cache_folder, proc, STATEMENT)[0])
+        
+        stats = make_client(cache_folder, proc, STATEMENT).get_image_cache_stats()
+        return min(misses), min(hits), stats
+    finally:
+        proc.kill()
+        proc.wait()
+        shutil.rmtree(cache_folder)
+
+def main():
+    miss, hit, stats = bench_image_cache()
+    print "miss %8.2fms, hit %8.2fms (%d hits, %d misses)" % (miss * 1000, hit * 1000, stats["hits"], stats["misses"])
+
+if __name__ == '__main__':
+    main()
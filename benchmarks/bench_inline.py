@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+"""Time to first byte of inline(), the HTML output of Execute commands.
+
+Nothing is shown until the page header is written, and the header needs
+the white_space and show_times settings. Compares reading each setting
+with its own `defaults read` (as before) with the cached preferences,
+cold (one `defaults export`) and warm (no process at all).
+
+`defaults` is replaced by a shell script serving a plist file, so the
+figures include a fork and exec per call but not cfprefsd's own cost.
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+
+from common import *
+
+DEFAULTS_SCRIPT = """#!/bin/sh
+# Stands in for macOS defaults: read <domain> <key> | export <domain> -
+case "$1" in
+  read) sed -n "s|.*<key>$3</key><string>\\(.*\\)</string>.*|\\1|p" "%(plist)s" | grep . ;;
+  export) cat "%(plist)s" ;;
+  *) exit 1 ;;
+esac
+"""
+
+PLIST = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+<key>show_times</key><string>Visible</string>
+<key>white_space</key><string>Pre</string>
+</dict>
+</plist>
+"""
+
+class FirstByte(Exception):
+    pass
+
+class FirstByteStream(object):
+    def write(self, data):
+        raise FirstByte()
+    
+    def flush(self):
+        pass
+
+def read_default_per_key(self, key, default = None):
+    proc = subprocess.Popen(["defaults", "read", "com.wolfram.mathmate", key], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    exit_code = proc.wait()
+    if exit_code != 0:
+        return default
+    return proc.stdout.read().strip()
+
+def time_to_first_byte(mm):
+    stdout = sys.stdout
+    sys.stdout = FirstByteStream()
+    start = time.time()
+    try:
+        mm.inline(["1 + 1"])
+    except FirstByte:
+        return time.time() - start
+    finally:
+        sys.stdout = stdout
+    raise Exception("inline() wrote nothing")
+
+def bench_inline(repeat = 10):
+    folder = tempfile.mkdtemp()
+    path = os.environ["PATH"]
+    try:
+        plist = os.path.join(folder, "com.wolfram.mathmate.plist")
+        fp = open(plist, 'w')
+        fp.write(PLIST)
+        fp.close()
+        
+        script = os.path.join(folder, "defaults")
+        fp = open(script, 'w')
+        fp.write(DEFAULTS_SCRIPT % {"plist": plist})
+        fp.close()
+        os.chmod(script, 0755)
+        os.environ["PATH"] = folder + os.pathsep + path
+        
+        def make(state_folder):
+            mm = make_mathmate("1 + 1\n")
+            mm.stateFolder = state_folder
+            mm.preferences_path = plist
+            return mm
+        
+        state_folder = os.path.join(folder, "state")
+        
+        def per_key():
+            mm = make(state_folder)
+            assert read_default_per_key(mm, "white_space") == "Pre"
+            mm.read_default = lambda key, default = None: read_default_per_key(mm, key, default)
+            return time_to_first_byte(mm)
+        
+        def cold():
+            shutil.rmtree(state_folder, True)
+            mm = make(state_folder)
+            elapsed = time_to_first_byte(mm)
+            assert mm.read_default("white_space") == "Pre"
+            return elapsed
+        
+        def warm():
+            mm = make(state_folder)
+            elapsed = time_to_first_byte(mm)
+            assert mm.read_default("white_space") == "Pre"
+            return elapsed
+        
+        return [(name, min(function() for i in range(repeat)))
+            for name, function in (("defaults read per key", per_key), ("cold cache", cold), ("warm cache", warm))]
+    finally:
+        os.environ["PATH"] = path
+        shutil.rmtree(folder)
+
+def main():
+    for name, elapsed in bench_inline():
+        print "%-22s first byte after %7.2fms" % (name, elapsed * 1000)
+
+if __name__ == '__main__':
+    main()
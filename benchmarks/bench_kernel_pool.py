@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Latency of the first Execute on a new document, and of Reset.
+
+Both need a kernel of their own. Without a pool the server launches one
+while the client waits; with one, an idle kernel launched in the
+background is taken instead. The user pauses between commands for
+longer than a launch takes, so the pool has refilled each time.
+"""
+import time
+import socket
+
+from common import *
+import fakeserver
+
+def connect(port, sessid):
+    return mathmate.TextMateJLinkClient(socket.create_connection(("localhost", port)), sessid)
+
+def first_execute(port, sessid):
+    start = time.time()
+    client = connect(port, sessid)
+    client.execute("1 + 1", lambda content: None)
+    elapsed = time.time() - start
+    client.close()
+    return elapsed
+
+def reset(port, sessid):
+    client = connect(port, sessid)
+    start = time.time()
+    client.reset()
+    client.execute("1 + 1", lambda content: None)
+    elapsed = time.time() - start
+    client.close()
+    return elapsed
+
+def bench_kernel_pool(pool_sizes = (0, 1), launch_time = 0.2, think_time = 0.3, repeat = 3):
+    results = []
+    for size in pool_sizes:
+        proc, port = fakeserver.spawn(launch_time=launch_time, kernel_pool=size)
+        try:
+            new_sessions = []
+            resets = []
+            for i in range(repeat):
+                time.sleep(think_time)
+                new_sessions.append(first_execute(port, "pool%d" % i))
+                time.sleep(think_time)
+                resets.append(reset(port, "pool%d" % i))
+        finally:
+            proc.kill()
+            proc.wait()
+        results.append((size, sum(new_sessions) / repeat, sum(resets) / repeat))
+    return results
+
+def main():
+    for size, new_session, reset_time in bench_kernel_pool():
+        print "pool of %d: first execute %8.2fms, reset and execute %8.2fms" % (
+            size, new_session * 1000, reset_time * 1000)
+
+if __name__ == '__main__':
+    main()
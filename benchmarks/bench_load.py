@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Load test of the TextMateJLink client against the fake server.
+
+Every session is a separate client process, as bundle commands are. Each
+one repeatedly runs a mix of commands (Execute Document, Execute Current
+Statement as image, completion, Clear, and occasionally Reset) over its
+own connection and session id. Reports throughput, latency percentiles
+and failures as the number of concurrent sessions grows.
+
+Failures are exception replies and dropped connections injected by the
+server; a client whose connection drops reconnects for its next command.
+"""
+import time
+import socket
+import optparse
+import multiprocessing
+
+from common import *
+import fakeserver
+
+SESSIONS = (1, 4, 16, 64)
+
+def connect(port, sessid):
+    sock = socket.create_connection(("localhost", port))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return mathmate.TextMateJLinkClient(sock, sessid)
+
+def run_command(client, n, statements):
+    output = []
+    kind = n % 10
+    if kind < 5:
+        client.header(output.append)
+        client.execute_batch(statements, output.append)
+    elif kind < 8:
+        client.image(statements[n % len(statements)], output.append)
+    elif kind == 8:
+        client.suggest()
+    elif n % 50 == 49:
+        client.reset()
+    else:
+        client.clear()
+
+def session(job):
+    port, sessid, command_count, statement_count = job
+    statements = ["f%d[x_] := Plot[Sin[%d x], {x, 0, Pi}]" % (i, i) for i in range(statement_count)]
+    latencies = []
+    errors = 0
+    disconnects = 0
+    client = None
+    
+    for n in range(command_count):
+        start = time.time()
+        try:
+            if client is None:
+                client = connect(port, sessid)
+            run_command(client, n, statements)
+        except Exception, e:
+            if "quit unexpectedly" in str(e) or isinstance(e, socket.error):
+                disconnects += 1
+                if client is not None:
+                    client.sock.close()
+                    client = None
+            else:
+                errors += 1
+        latencies.append(time.time() - start)
+    
+    if client is not None:
+        client.close()
+    return latencies, errors, disconnects
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def bench_load(sessions = SESSIONS, command_count = 50, statement_count = 10, latency = 0.001,
+               eval_time = 0.002, payload_size = 16384, error_rate = 0.01, disconnect_rate = 0.002):
+    proc, port = fakeserver.spawn(latency=latency, eval_time=eval_time, payload_size=payload_size,
+        payload_jitter=0.5, error_rate=error_rate, disconnect_rate=disconnect_rate, symbol_count=5000)
+    results = []
+    try:
+        for count in sessions:
+            pool = multiprocessing.Pool(count)
+            try:
+                jobs = [(port, "load%d-%d" % (count, i), command_count, statement_count) for i in range(count)]
+                start = time.time()
+                outcomes = pool.map(session, jobs)
+                elapsed = time.time() - start
+            finally:
+                pool.terminate()
+                pool.join()
+            
+            latencies = sorted(latency for outcome in outcomes for latency in outcome[0])
+            errors = sum(outcome[1] for outcome in outcomes)
+            disconnects = sum(outcome[2] for outcome in outcomes)
+            results.append((count, len(latencies) / elapsed, percentile(latencies, 0.5),
+                percentile(latencies, 0.95), errors, disconnects))
+    finally:
+        proc.kill()
+        proc.wait()
+    return results
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--sessions", default=",".join(str(count) for count in SESSIONS),
+        help="comma separated numbers of concurrent sessions")
+    parser.add_option("--commands", type="int", default=50, help="commands run by each session")
+    parser.add_option("--latency", type="float", default=0.001)
+    parser.add_option("--eval-time", type="float", default=0.002)
+    parser.add_option("--payload-size", type="int", default=16384)
+    parser.add_option("--error-rate", type="float", default=0.01)
+    parser.add_option("--disconnect-rate", type="float", default=0.002)
+    options, args = parser.parse_args()
+    
+    results = bench_load([int(count) for count in options.sessions.split(",")], options.commands,
+        latency=options.latency, eval_time=options.eval_time, payload_size=options.payload_size,
+        error_rate=options.error_rate, disconnect_rate=options.disconnect_rate)
+    for count, throughput, p50, p95, errors, disconnects in results:
+        print "%3d sessions: %7.1f commands/s, p50 %7.2fms, p95 %7.2fms, %3d exceptions, %3d disconnects" % (
+            count, throughput, p50 * 1000, p95 * 1000, errors, disconnects)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""Peak memory of reformatting a large generated data file, parsing it into
+a list of statements and joining them (as Reformat Document does) versus
+streaming it with reformat_stream.
+
+Python 2 has no tracemalloc, so each mode runs in a child process and the 
+peak resident set size is reported instead.
+"""
+import os
+import sys
+import time
+import mmap
+import optparse
+import resource
+import tempfile
+import subprocess
+
+from common import *
+
+def generate_data_file(path, size):
+    """Writes a data file of many short assignment statements."""
+    fp = open(path, 'w')
+    written = 0
+    n = 0
+    while written < size:
+        row = ", ".join("{%d, %d.%02d}" % (i, n % 97, i) for i in range(8))
+        line = "data[%d] = {%s};\n" % (n, row)
+        if n % 50 == 0:
+            line = "(* block %d *)\nblock%d := Table[data[i], {i, %d, %d}]\n" % (n, n, n, n + 49) + line
+        fp.write(line)
+        written += len(line)
+        n += 1
+    fp.close()
+
+def get_peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+def run_parse(path):
+    mm = mathmate.MathMate(input_file=path, indent_size=4, soft_tabs=True)
+    result = "".join(reformatted_statement for ssp, esp, reformatted_statement, current_statement in mm.parse(mm.doc))
+    return result != mm.doc
+
+def run_stream(path):
+    mm = mathmate.MathMate(doc="", indent_size=4, soft_tabs=True)
+    fp = open(path, 'rb')
+    doc = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    out = open(os.devnull, 'wb')
+    changed = mm.reformat_stream(doc, out)
+    out.close()
+    doc.close()
+    fp.close()
+    return changed
+
+MODES = {"parse": run_parse, "stream": run_stream}
+
+def child(mode, path):
+    started = time.time()
+    changed = MODES[mode](path)
+    print "%d %f %d" % (get_peak_rss(), time.time() - started, changed)
+
+def bench_memory(size_mb = 50):
+    fd, path = tempfile.mkstemp(suffix=".m")
+    os.close(fd)
+    try:
+        generate_data_file(path, int(size_mb * 1024 * 1024))
+        results = []
+        for mode in ("parse", "stream"):
+            proc = subprocess.Popen([sys.executable, __file__, "--child", mode, path], stdout=subprocess.PIPE)
+            output = proc.communicate()[0].split()
+            if proc.returncode != 0:
+                # Out of memory, say; a failure rather than a measurement
+                raise Exception("the %s child exited with status %d" % (mode, proc.returncode))
+            results.append((mode, int(output[0]), float(output[1])))
+        return os.path.getsize(path), results
+    finally:
+        os.remove(path)
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--size", type="float", default=50, help="data file size in MB")
+    parser.add_option("--child", nargs=2)
+    options, args = parser.parse_args()
+    
+    if options.child is not None:
+        child(*options.child)
+        return
+    
+    size, results = bench_memory(options.size)
+    print "%.1f MB data file" % (size / 1e6)
+    for mode, peak, elapsed in results:
+        print "%-6s peak RSS %8.1f MB (%.1fx file), %6.1fs" % (mode, peak / 1e6, peak / float(size), elapsed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+"""Times MathMate.parse on synthetic packages of growing size.
+
+The time per line should stay flat as documents grow.
+"""
+from common import *
+
+SIZES = [500, 1000, 2000, 5000, 10000]
+
+def bench_parse(sizes = SIZES):
+    results = []
+    for lines in sizes:
+        doc = generate_package(lines)
+        mm = make_mathmate(doc)
+        elapsed = best_of(lambda: mm.parse(doc))
+        results.append((lines, len(doc), elapsed))
+    return results
+
+def main():
+    for lines, size, elapsed in bench_parse():
+        print "parse %6d lines (%8d bytes): %8.1fms, %6.2fus/line" % (
+            lines, size, elapsed * 1000, elapsed * 1e6 / lines)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""Executes a document of short statements with different pipeline windows
+against a fake server that delays every request by a fixed latency."""
+import socket
+
+from common import *
+import fakeserver
+
+def execute(port, statements, window):
+    client = mathmate.TextMateJLinkClient(socket.create_connection(("localhost", port)), "bench")
+    output = []
+    client.execute_batch(statements, output.append, window=window)
+    client.close()
+    return output
+
+def bench_pipeline(latency = 0.002, statement_count = 200, windows = (1, 4, 16, 64)):
+    statements = ["f%d[x_] := x^%d" % (i, i) for i in range(statement_count)]
+    proc, port = fakeserver.spawn(payload_size=256, latency=latency)
+    results = []
+    try:
+        expected = execute(port, statements, 1)
+        for window in windows:
+            output = []
+            elapsed = best_of(lambda: output.append(execute(port, statements, window)))
+            assert output[-1] == expected
+            results.append((window, elapsed))
+    finally:
+        proc.kill()
+        proc.wait()
+    return results
+
+def main():
+    results = bench_pipeline()
+    serial = results[0][1]
+    for window, elapsed in results:
+        print "window %3d: %8.1fms (%.1fx)" % (window, elapsed * 1000, serial / elapsed)
+
+if __name__ == '__main__':
+    main()
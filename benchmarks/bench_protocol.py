@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Measures reading large inline payloads from a fake TextMateJLink server.
+
+Compares ProtocolReader against reading protocol lines one byte at a time,
+counting recv calls and wall time.
+"""
+import socket
+
+from common import *
+import fakeserver
+
+class CountingSocket(object):
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+    
+    def recv(self, size):
+        self.calls += 1
+        return self.sock.recv(size)
+    
+    def recv_into(self, buff, size = 0):
+        self.calls += 1
+        return self.sock.recv_into(buff, size)
+    
+    def send(self, data):
+        return self.sock.send(data)
+    
+    def close(self):
+        self.sock.close()
+
+class BytewiseReader(object):
+    """The previous reader: one recv per line character."""
+    def __init__(self, sock):
+        self.sock = sock
+    
+    def readline(self):
+        result = []
+        while True:
+            char = self.sock.recv(1)
+            if char == "\r":
+                continue
+            if char == "\n":
+                break
+            if char == "":
+                return None
+            result.append(char)
+        return "".join(result)
+    
+    def read(self, count):
+        result = []
+        total_read = 0
+        while total_read != count:
+            buff = self.sock.recv(count - total_read)
+            if buff == "":
+                raise Exception("The server quit unexpectedly.")
+            result.append(buff)
+            total_read += len(buff)
+        return "".join(result)
+
+def execute(port, reader_class, statements):
+    sock = CountingSocket(socket.create_connection(("localhost", port)))
+    reader = reader_class(sock)
+    received = 0
+    
+    reader.readline()
+    sock.send("sessid bench\n")
+    reader.readline()
+    for statement in statements:
+        sock.send("execute %d\n%s" % (len(statement), statement))
+        while True:
+            words = reader.readline().split(" ")
+            if words[0] == "inline":
+                received += len(reader.read(int(words[1])))
+                continue
+            break
+    sock.send("quit\n")
+    reader.readline()
+    sock.close()
+    return sock.calls, received
+
+def bench_protocol(payload_sizes = (1024, 65536, 1048576), inline_count = 10, statement_count = 20):
+    results = []
+    statements = ["Plot[Sin[x], {x, 0, %d}]" % i for i in range(statement_count)]
+    for payload_size in payload_sizes:
+        proc, port = fakeserver.spawn(payload_size=payload_size, inline_count=inline_count)
+        try:
+            for name, reader_class in (("bytewise", BytewiseReader), ("buffered", mathmate.ProtocolReader)):
+                counts = []
+                elapsed = best_of(lambda: counts.append(execute(port, reader_class, statements)))
+                calls, received = counts[-1]
+                results.append((name, payload_size, calls, received, elapsed))
+        finally:
+            proc.kill()
+            proc.wait()
+    return results
+
+def main():
+    for name, payload_size, calls, received, elapsed in bench_protocol():
+        print "%-8s payload %8d bytes: %6d recv calls, %8.1fms, %7.1f MB/s" % (
+            name, payload_size, calls, elapsed * 1000, received / elapsed / 1e6)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Times Reformat Document on synthetic packages of growing size.
+
+The command joins the parsed statements and writes the result to stdout;
+reformat_stream writes each statement as it is parsed. Both should take
+time linear in the document size.
+"""
+import sys
+import shutil
+import tempfile
+import StringIO
+
+from common import *
+
+SIZES = [500, 2000, 10000]
+
+def reformat_command(mm):
+    stdout = sys.stdout
+    sys.stdout = StringIO.StringIO()
+    try:
+        mm.reformat(process_entire_document=True)
+    except SystemExit:
+        pass
+    finally:
+        sys.stdout = stdout
+
+def reformat_stream(mm):
+    mm.reformat_stream(mm.doc, StringIO.StringIO())
+
+def bench_reformat(sizes = SIZES):
+    state_folder = tempfile.mkdtemp()
+    results = []
+    try:
+        for lines in sizes:
+            doc = generate_package(lines)
+            
+            def command():
+                # Starts from an empty parse cache so the document is parsed
+                shutil.rmtree(state_folder, True)
+                mm = make_mathmate(doc)
+                mm.stateFolder = state_folder
+                reformat_command(mm)
+            
+            mm = make_mathmate(doc)
+            results.append((lines, len(doc), best_of(command), best_of(lambda: reformat_stream(mm))))
+    finally:
+        shutil.rmtree(state_folder, True)
+    return results
+
+def main():
+    for lines, size, command, stream in bench_reformat():
+        print "reformat %6d lines (%8d bytes): command %8.1fms, stream %8.1fms" % (
+            lines, size, command * 1000, stream * 1000)
+
+if __name__ == '__main__':
+    main()
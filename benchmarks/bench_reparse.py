@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""Reparsing a large document after a small edit, compared to parsing it
+from scratch. Edits are made near the start, middle and end of the file.
+
+An unclosed bracket turns the rest of the document into one statement, so
+that edit has to reparse everything after it."""
+from common import *
+
+EDITS = [
+    ("insert character", lambda doc, pos: doc[:pos] + "x" + doc[pos:]),
+    ("delete character", lambda doc, pos: doc[:pos] + doc[pos + 1:]),
+    ("unclosed bracket", lambda doc, pos: doc[:pos] + "[" + doc[pos:]),
+]
+
+def bench_reparse(lines = (5000, 20000)):
+    results = []
+    for count in lines:
+        doc = generate_package(count)
+        mm = make_mathmate(doc)
+        new_lines = []
+        old = [(ssp, esp, reformatted_statement, new_line) for (ssp, esp, reformatted_statement, current_statement), 
+            new_line in zip(mm.parse(doc, new_lines=new_lines), new_lines)]
+        
+        for where in (0.1, 0.5, 0.9):
+            pos = doc.find("Table", int(len(doc) * where))
+            for name, edit in EDITS:
+                new_doc = edit(doc, pos)
+                expected = mm.parse(new_doc)
+                assert mm.reparse(new_doc, doc, old) == expected
+                
+                full = best_of(lambda: mm.parse(new_doc))
+                incremental = best_of(lambda: mm.reparse(new_doc, doc, old), 5)
+                results.append((count, where, name, full, incremental))
+    return results
+
+def main():
+    for count, where, name, full, incremental in bench_reparse():
+        print "%5d lines, edit at %3d%% (%-16s): parse %8.2fms, reparse %7.2fms (%.0fx)" % (
+            count, where * 100, name, full * 1000, incremental * 1000, full / incremental)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Aggregate throughput of executing statements across several sessions.
+
+The fake server spends a fixed time evaluating each statement and, like
+the real server, evaluates different sessions on different kernels in
+parallel. Driving the sessions one after the other with
+TextMateJLinkClient leaves all but one kernel idle; MultiSessionClient
+keeps every session busy from one thread.
+"""
+import socket
+
+from common import *
+import fakeserver
+
+SESSIONS = (1, 2, 4, 8, 16)
+
+def make_statements(sessid, count):
+    return ["%s`f%d = %d^2" % (sessid, i, i) for i in range(count)]
+
+def sequential(port, sessids, statement_count):
+    outputs = {}
+    for sessid in sessids:
+        client = mathmate.TextMateJLinkClient(socket.create_connection(("localhost", port)), sessid)
+        output = []
+        client.execute_batch(make_statements(sessid, statement_count), output.append)
+        client.close()
+        outputs[sessid] = output
+    return outputs
+
+def multiplexed(port, sessids, statement_count):
+    client = mathmate.MultiSessionClient(lambda: socket.create_connection(("localhost", port)))
+    requests = dict((sessid, [client.execute(sessid, statement) for statement in make_statements(sessid, statement_count)])
+        for sessid in sessids)
+    client.wait()
+    client.close()
+    return dict((sessid, [output for request in requests[sessid] for output in request.output])
+        for sessid in sessids)
+
+def bench_sessions(sessions = SESSIONS, statement_count = 50, eval_time = 0.002, latency = 0.001):
+    proc, port = fakeserver.spawn(eval_time=eval_time, latency=latency, payload_size=4096)
+    results = []
+    try:
+        for count in sessions:
+            sessids = ["sweep%d" % i for i in range(count)]
+            expected = sequential(port, sessids, statement_count)
+            assert multiplexed(port, sessids, statement_count) == expected
+            
+            total = count * statement_count
+            results.append((count, total / best_of(lambda: sequential(port, sessids, statement_count)),
+                total / best_of(lambda: multiplexed(port, sessids, statement_count))))
+    finally:
+        proc.kill()
+        proc.wait()
+    return results
+
+def main():
+    for count, serial, concurrent in bench_sessions():
+        print "%3d sessions: sequential %7.1f statements/s, multiplexed %7.1f statements/s (%.1fx)" % (
+            count, serial, concurrent, concurrent / serial)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""Times Show Statement over whole documents and position lookups.
+
+show(process_entire_document=True) converts two positions per statement to
+line/column, so its cost per statement should not grow with the document.
+"""
+import random
+
+from common import *
+
+SIZES = [1000, 5000, 20000]
+
+def bench_show(sizes = SIZES):
+    results = []
+    for lines in sizes:
+        doc = generate_package(lines)
+        mm = make_mathmate(doc, process_entire_document=True)
+        elapsed = best_of(mm.show)
+        results.append((lines, len(mm.statements), elapsed))
+    return results
+
+def bench_positions(lines = 20000, lookups = 10000):
+    doc = generate_package(lines)
+    mm = make_mathmate(doc)
+    positions = [random.randint(0, len(doc)) for i in range(lookups)]
+    line_count = doc.count("\n") + 1
+    line_cols = [(random.randint(1, line_count), random.randint(0, 10)) for i in range(lookups)]
+    
+    get_line_col = best_of(lambda: [mm.get_line_col(pos) for pos in positions])
+    get_pos = best_of(lambda: [mm.get_pos(line, col) for line, col in line_cols])
+    return get_line_col / lookups, get_pos / lookups
+
+def main():
+    for lines, statements, elapsed in bench_show():
+        print "show %6d lines (%5d statements): %8.1fms, %6.2fus/statement" % (
+            lines, statements, elapsed * 1000, elapsed * 1e6 / statements)
+    
+    get_line_col, get_pos = bench_positions()
+    print "get_line_col: %.2fus/call, get_pos: %.2fus/call" % (get_line_col * 1e6, get_pos * 1e6)
+
+if __name__ == '__main__':
+    main()
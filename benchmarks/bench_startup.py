@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+"""Measures how long `from mathmate import *` takes in a fresh interpreter.
+
+Every bundle command starts with that import, so anything done at module
+level is paid on every keystroke-bound command.
+"""
+import os
+import sys
+import time
+import subprocess
+
+SUPPORT_BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Support", "bin")
+
+def time_import(repeat = 20):
+    script = "import sys, time; sys.path.append(%r); t = time.time(); from mathmate import *; sys.stdout.write(repr(time.time() - t))" % SUPPORT_BIN
+    timings = []
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", script])
+        timings.append(float(out))
+    timings.sort()
+    return timings
+
+def main():
+    timings = time_import()
+    print "import mathmate: min %.2fms, median %.2fms, max %.2fms" % (
+        timings[0] * 1000, timings[len(timings) // 2] * 1000, timings[-1] * 1000)
+
+if __name__ == '__main__':
+    main()
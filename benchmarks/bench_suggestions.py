@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+"""Cost of receiving the kernel's symbol list for completion.
+
+Compares the list literal that used to be eval'd with the newline 
+delimited payload, both decoding alone and as a full suggest request 
+against the fake server.
+"""
+import socket
+
+from common import *
+import fakeserver
+
+class PayloadReader(object):
+    def __init__(self, data):
+        self.data = data
+    
+    def read(self, count):
+        return self.data[:count]
+
+def decode_eval(symbols):
+    literal = "[%s]" % "".join('"%s",' % symbol for symbol in symbols)
+    return lambda: eval(literal)
+
+def decode_payload(symbols):
+    data = "\n".join(symbols) + "\n"
+    reader = PayloadReader(data)
+    return lambda: mathmate.parse_suggestions(str(len(data)), reader)
+
+def suggest(port):
+    client = mathmate.TextMateJLinkClient(socket.create_connection(("localhost", port)), "bench")
+    try:
+        return client.suggest()
+    finally:
+        client.close()
+
+def bench_suggestions(symbol_counts = (5000, 50000, 200000)):
+    results = []
+    for count in symbol_counts:
+        symbols = ["Symbol%d" % i for i in range(count)]
+        old, new = decode_eval(symbols), decode_payload(symbols)
+        assert old() == new() == symbols
+        results.append(("decode", count, best_of(old), best_of(new)))
+        
+        timings = []
+        for legacy in (True, False):
+            proc, port = fakeserver.spawn(symbol_count=count, legacy_suggestions=legacy)
+            try:
+                assert suggest(port) == symbols
+                timings.append(best_of(lambda: suggest(port)))
+            finally:
+                proc.kill()
+                proc.wait()
+        results.append(("suggest", count, timings[0], timings[1]))
+    return results
+
+def main():
+    for name, count, old, new in bench_suggestions():
+        print "%-8s %7d symbols: literal %8.2fms, payload %7.2fms (%.1fx)" % (
+            name, count, old * 1000, new * 1000, old / new)
+
+if __name__ == '__main__':
+    main()
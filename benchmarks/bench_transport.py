@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+"""Compares TCP and Unix domain socket throughput for large inline payloads."""
+import os
+import socket
+import shutil
+import tempfile
+
+from common import *
+import fakeserver
+
+def execute(connect, statements):
+    client = mathmate.TextMateJLinkClient(connect(), "bench")
+    received = []
+    for statement in statements:
+        client.execute(statement, lambda content: received.append(len(content)))
+    client.close()
+    return sum(received)
+
+def bench_transport(payload_sizes = (65536, 1048576, 8388608), inline_count = 4, statement_count = 10):
+    folder = tempfile.mkdtemp()
+    socket_path = os.path.join(folder, "tmjlink.sock")
+    statements = ["Plot[Sin[x], {x, 0, %d}]" % i for i in range(statement_count)]
+    results = []
+    
+    try:
+        for payload_size in payload_sizes:
+            proc, port = fakeserver.spawn(payload_size=payload_size, inline_count=inline_count, 
+                unix_socket=socket_path)
+            
+            def connect_tcp():
+                return socket.create_connection(("localhost", port))
+            
+            def connect_unix():
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                sock.connect(socket_path)
+                return sock
+            
+            try:
+                for name, connect in (("tcp", connect_tcp), ("unix", connect_unix)):
+                    received = []
+                    elapsed = best_of(lambda: received.append(execute(connect, statements)))
+                    results.append((name, payload_size, received[-1] / elapsed))
+            finally:
+                proc.kill()
+                proc.wait()
+    finally:
+        shutil.rmtree(folder)
+    
+    return results
+
+def main():
+    for name, payload_size, throughput in bench_transport():
+        print "%-4s payload %8d bytes: %8.1f MB/s" % (name, payload_size, throughput / 1e6)
+
+if __name__ == '__main__':
+    main()
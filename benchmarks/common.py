@@ -0,0 +1,58 @@
+"""Helpers shared by the benchmark scripts."""
+import os
+import sys
+import time
+import tempfile
+
+SUPPORT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Support"))
+sys.path.insert(0, os.path.join(SUPPORT_PATH, "bin"))
+
+os.environ.setdefault('TM_TAB_SIZE', "2")
+os.environ.setdefault('TM_SOFT_TABS', "YES")
+os.environ.setdefault('TM_LINE_NUMBER', "1")
+os.environ.setdefault('TM_LINE_INDEX', "0")
+os.environ.setdefault('TM_BUNDLE_SUPPORT', SUPPORT_PATH)
+
+import mathmate
+
+SAMPLE_STATEMENTS = [
+    'f%(n)d[x_, y_] := Module[{a = x^2, b = y /. {z -> 1}},\n  If[a > b, a - b, (* smaller *) b - a]\n]',
+    'data%(n)d = Table[{i, Sin[i] E^(-i/4), "label %(n)d"}, {i, 0, 10, 0.5}];',
+    'Plot[{Sin[x] E^(-x/4), Sin[x]}, {x, 0, %(n)d}, Filling -> Axis, PlotRange -> {-1, 1}]',
+    'rules%(n)d = {a -> 1, b :> RandomReal[], c_ /; c > 0 :> Sqrt[c]};',
+    'g%(n)d = Function[{u}, u // N] @@@ {{1}, {2}, {3}}',
+]
+
+def generate_package(lines):
+    """Returns a synthetic Mathematica package with roughly the given number of lines."""
+    result = ['BeginPackage["Synthetic`"]\n\nBegin["`Private`"]\n']
+    count = 3
+    n = 0
+    while count < lines:
+        statement = SAMPLE_STATEMENTS[n % len(SAMPLE_STATEMENTS)] % {"n": n}
+        result.append(statement + "\n\n")
+        count += statement.count("\n") + 2
+        n += 1
+    result.append('End[]\n\nEndPackage[]\n')
+    return "".join(result)
+
+def make_mathmate(doc, **kwargs):
+    """Constructs a MathMate for doc the way a bundle command would."""
+    fd, path = tempfile.mkstemp(suffix=".m")
+    os.write(fd, doc)
+    os.close(fd)
+    try:
+        return mathmate.MathMate(input_file=path, **kwargs)
+    finally:
+        os.remove(path)
+
+def best_of(function, repeat = 3):
+    """Returns the fastest wall time of repeat calls to function, in seconds."""
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
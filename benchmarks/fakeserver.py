@@ -0,0 +1,414 @@
+"""A stand-in for the TextMateJLink server used by the benchmarks.
+
+It speaks the same line protocol as Session.java (sessid, execute, image, 
+header, clear, reset, suggest, intexec and quit), but evaluates nothing: every
+execute/image request is answered with canned HTML payloads. Like the real
+server, connections that send the same session id share one session, whose
+evaluations run one at a time as they would on its kernel.
+
+Evaluation time, the time over which output is produced (sent in chunk 
+frames as it is, or all at the end), kernel launch time and the size of 
+the pool of launched kernels, network latency, payload sizes and the rate
+at which requests fail (an exception reply) or kill the connection are 
+configurable, so clients can be load tested without Mathematica.
+
+Run it as a script to serve from a separate process; the listen port is 
+printed on the first line of stdout, and written to --port-file the way 
+the real server publishes it. With --unix-socket it also listens on a Unix 
+domain socket.
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import socket
+import optparse
+import select
+import threading
+import subprocess
+import SocketServer
+
+class FakeResources(object):
+    """The state the server keeps for one session id."""
+    
+    def __init__(self, sessid):
+        self.sessid = sessid
+        self.size = 0
+        # One kernel per session: evaluations from different connections queue up
+        self.lock = threading.Lock()
+
+class FakeKernelPool(object):
+    """Stands in for KernelPool: a kernel takes launch_time to launch, and 
+    size of them are kept launched, one at a time in the background."""
+    
+    def __init__(self, launch_time, size):
+        self.launch_time = launch_time
+        self.size = size
+        self.idle = 0
+        self.waiting = 0
+        self.condition = threading.Condition()
+        
+        if size > 0:
+            thread = threading.Thread(target=self.refill)
+            thread.daemon = True
+            thread.start()
+    
+    def take(self):
+        if self.size == 0:
+            time.sleep(self.launch_time)
+            return
+        
+        with self.condition:
+            self.waiting += 1
+            self.condition.notify_all()
+            while self.idle == 0:
+                self.condition.wait()
+            self.waiting -= 1
+            self.idle -= 1
+            self.condition.notify_all()
+    
+    def refill(self):
+        while True:
+            with self.condition:
+                while self.idle >= self.size + self.waiting:
+                    self.condition.wait()
+            time.sleep(self.launch_time)
+            with self.condition:
+                self.idle += 1
+                self.condition.notify_all()
+
+class FakeSessionHandler(SocketServer.StreamRequestHandler):
+    def setup(self):
+        SocketServer.StreamRequestHandler.setup(self)
+        if self.connection.family == socket.AF_INET:
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    
+    def finish(self):
+        try:
+            SocketServer.StreamRequestHandler.finish(self)
+        except socket.error:
+            # The client hung up first
+            pass
+    
+    def send(self, reply):
+        self.wfile.write(reply + "\n")
+    
+    def send_inline(self, data):
+        self.send("inline %d" % (len(data) + 1))
+        self.send(data)
+    
+    def send_chunk(self, data):
+        self.wfile.write("chunk %d\n%s" % (len(data), data))
+        self.wfile.flush()
+    
+    def send_output(self, data):
+        """Sends an evaluation's output, produced over output_time. With a 
+        chunk size it is sent in chunk frames as it is produced, like 
+        Session.sendInline does with long payloads; otherwise all at once."""
+        server = self.server
+        if server.chunk_size <= 0:
+            time.sleep(server.output_time)
+            self.send_inline(data)
+            return
+        
+        pieces = [data[start:start + server.chunk_size] for start in range(0, len(data), server.chunk_size)]
+        for piece in pieces[:-1]:
+            time.sleep(server.output_time / len(pieces))
+            self.send_chunk(piece)
+        time.sleep(server.output_time / len(pieces))
+        self.send_inline(pieces[-1])
+    
+    def send_exception(self, message):
+        self.send("exception -- " + message)
+    
+    def evaluate(self, resources):
+        """Simulates a kernel evaluation. Returns False if it failed, having 
+        sent the exception reply."""
+        server = self.server
+        with resources.lock:
+            if server.eval_time > 0:
+                time.sleep(server.eval_time)
+        if server.inject_error():
+            self.send_exception("Simulated kernel failure")
+            return False
+        return True
+    
+    def is_request_waiting(self):
+        # In rfile's buffer (socket._fileobject keeps its write position at 
+        # the end of the unread data) or the socket's
+        return self.rfile._rbuf.tell() > 0 or select.select([self.connection], [], [], 0)[0] != []
+    
+    def read_request(self):
+        """Reads the next request, or returns None at the end of the 
+        connection. Like Session.java, nothing is read until the previous 
+        request has been answered, so a client that writes too far ahead 
+        of the replies blocks."""
+        line = self.rfile.readline()
+        if line == "":
+            return None
+        
+        command, _, args = line.rstrip("\r\n").partition(" ")
+        data = None
+        if command in ("execute", "image", "intexec"):
+            data = self.rfile.read(int(args))
+        return command, args, data
+    
+    def handle(self):
+        server = self.server
+        resources = None
+        self.send("okay")
+        
+        while True:
+            # Simulated one-way network delay. A request that was already 
+            # waiting arrived while the previous one was being answered.
+            waiting = server.latency > 0 and self.is_request_waiting()
+            try:
+                request = self.read_request()
+            except socket.error:
+                break
+            if request is None:
+                break
+            command, args, statement = request
+            
+            if server.latency > 0 and not waiting:
+                time.sleep(server.latency)
+            
+            if command == "quit":
+                self.send("okay -- Good Bye")
+                break
+            
+            # Simulates the server or the kernel dying mid-request
+            if server.inject_disconnect():
+                break
+            
+            if resources is None:
+                if command == "sessid":
+                    resources = server.get_resources(args)
+                    self.send("okay -- Session ID set to: " + resources.sessid)
+                else:
+                    self.send_exception("Invalid command (0): " + command)
+                continue
+            
+            if command in ("execute", "image"):
+                if self.evaluate(resources):
+                    if command == "image" and server.image_folder is not None:
+                        self.send_inline(server.make_image(statement, resources.size))
+                    for i in range(server.inline_count):
+                        self.send_output(server.make_payload(statement))
+                    resources.size += server.inline_count
+                    self.send("okay")
+                continue
+            
+            if command == "intexec":
+                if self.evaluate(resources):
+                    # Session.java sends results through sendInline as well, 
+                    # so a long one comes in chunk frames with --chunk-size
+                    self.send_output(statement)
+                    self.send("okay")
+                continue
+            
+            if command == "header":
+                self.send_inline("<div class='header'>%s</div>" % resources.sessid)
+                self.send("okay")
+                continue
+            
+            if command == "clear":
+                size = resources.size
+                resources.size = 0
+                self.send("okay -- Resources released: %d" % size)
+                continue
+            
+            if command == "reset":
+                if server.inject_error():
+                    self.send_exception("Simulated kernel failure")
+                    continue
+                resources = server.new_resources(resources.sessid)
+                self.send("okay -- All resources reset")
+                continue
+            
+            if command == "suggest":
+                if server.inject_error():
+                    self.send_exception("Simulated kernel failure")
+                    continue
+                if server.legacy_suggestions:
+                    self.send("suggestions [%s]" % "".join('"%s",' % symbol for symbol in server.symbols))
+                else:
+                    data = "\n".join(server.symbols)
+                    self.send("suggestions %d" % (len(data) + 1))
+                    self.send(data)
+                continue
+            
+            self.send_exception("Invalid command (1): " + command)
+
+class FakeServerMixin(object):
+    daemon_threads = True
+    allow_reuse_address = True
+    # Clients wait for the server's "okay" before sending anything, so one 
+    # whose connection overflowed the backlog would never notice
+    request_queue_size = 128
+    
+    def configure(self, payload_size = 1024, inline_count = 1, symbols = (), latency = 0.0, 
+                  legacy_suggestions = False, eval_time = 0.0, payload_jitter = 0.0, 
+                  error_rate = 0.0, disconnect_rate = 0.0, seed = None, image_folder = None, 
+                  chunk_size = 0, output_time = 0.0, launch_time = 0.0, kernel_pool = 0):
+        self.latency = latency
+        self.eval_time = eval_time
+        self.legacy_suggestions = legacy_suggestions
+        self.payload_size = payload_size
+        self.payload_jitter = payload_jitter
+        self.inline_count = inline_count
+        self.symbols = list(symbols)
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.image_folder = image_folder
+        self.chunk_size = chunk_size
+        self.output_time = output_time
+        self.random = random.Random(seed)
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.kernel_pool = FakeKernelPool(launch_time, kernel_pool)
+    
+    def get_resources(self, sessid):
+        with self.sessions_lock:
+            if sessid in self.sessions:
+                return self.sessions[sessid]
+        
+        # A new session id gets a kernel of its own
+        self.kernel_pool.take()
+        with self.sessions_lock:
+            return self.sessions.setdefault(sessid, FakeResources(sessid))
+    
+    def new_resources(self, sessid):
+        self.kernel_pool.take()
+        with self.sessions_lock:
+            self.sessions[sessid] = FakeResources(sessid)
+            return self.sessions[sessid]
+    
+    def inject_error(self):
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+    
+    def inject_disconnect(self):
+        return self.disconnect_rate > 0 and self.random.random() < self.disconnect_rate
+    
+    def make_payload(self, statement):
+        size = self.payload_size
+        if self.payload_jitter > 0:
+            size = max(int(size * (1 + self.random.uniform(-self.payload_jitter, self.payload_jitter))), 1)
+        cell = "<div class='cell return'><div class='content'>%s</div></div>" % statement
+        return (cell * (size // len(cell) + 1))[:size]
+    
+    def make_image(self, statement, count):
+        """Writes an image file for statement, returning the cell group that 
+        shows it, as Resources does for graphics."""
+        path = os.path.join(self.image_folder, "%s.gif" % uuid.uuid4())
+        fp = open(path, 'wb')
+        fp.write(("GIF89a" + statement) * (self.payload_size // (len(statement) + 6) + 1))
+        fp.close()
+        return ("<div id='resource_%d' class='cellgroup'><div class='cell display'><div class='content'>"
+            "<img src='file://%s' onclick='toggle(%d)' /></div></div></div>") % (count, path, count)
+    
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+    
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class FakeServer(FakeServerMixin, SocketServer.ThreadingTCPServer):
+    def __init__(self, **options):
+        SocketServer.ThreadingTCPServer.__init__(self, ("localhost", 0), FakeSessionHandler)
+        self.configure(**options)
+    
+    @property
+    def port(self):
+        return self.server_address[1]
+
+class FakeUnixServer(FakeServerMixin, SocketServer.ThreadingUnixStreamServer):
+    def __init__(self, path, **options):
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.ThreadingUnixStreamServer.__init__(self, path, FakeSessionHandler)
+        self.configure(**options)
+
+def spawn(**options):
+    """Starts a FakeServer in a child process, returning (process, port).
+    
+    Keeps the server from competing with the benchmark for the GIL."""
+    args = [sys.executable, __file__]
+    for name, value in options.items():
+        if value is True:
+            args.append("--%s" % name.replace("_", "-"))
+        elif value is not False and value is not None:
+            args.append("--%s=%s" % (name.replace("_", "-"), value))
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE)
+    port = int(proc.stdout.readline())
+    return proc, port
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option("--payload-size", type="int", default=1024)
+    parser.add_option("--inline-count", type="int", default=1)
+    parser.add_option("--payload-jitter", type="float", default=0.0, 
+        help="vary payload sizes randomly by up to this fraction")
+    parser.add_option("--latency", type="float", default=0.0, help="one-way network delay in seconds")
+    parser.add_option("--eval-time", type="float", default=0.0, help="kernel time per evaluation in seconds")
+    parser.add_option("--error-rate", type="float", default=0.0, 
+        help="fraction of kernel requests answered with an exception")
+    parser.add_option("--disconnect-rate", type="float", default=0.0,
+        help="fraction of requests on which the connection is dropped")
+    parser.add_option("--seed", type="int")
+    parser.add_option("--image-folder", help="answer image requests with image files written here")
+    parser.add_option("--chunk-size", type="int", default=0, 
+        help="send payloads and intexec results in chunk frames of this size")
+    parser.add_option("--output-time", type="float", default=0.0, 
+        help="time over which each payload is produced, in seconds")
+    parser.add_option("--launch-time", type="float", default=0.0, 
+        help="time a kernel takes to launch, for new sessions and resets")
+    parser.add_option("--kernel-pool", type="int", default=0, help="idle kernels kept launched")
+    parser.add_option("--port-file")
+    parser.add_option("--unix-socket")
+    parser.add_option("--startup-delay", type="float", default=0.0)
+    parser.add_option("--symbol-count", type="int", default=0)
+    parser.add_option("--legacy-suggestions", action="store_true", default=False)
+    options, args = parser.parse_args()
+    
+    # Stands in for the time the JVM takes to start
+    time.sleep(options.startup_delay)
+    
+    settings = {"payload_size": options.payload_size, 
+                "inline_count": options.inline_count,
+                "latency": options.latency,
+                "eval_time": options.eval_time,
+                "payload_jitter": options.payload_jitter,
+                "error_rate": options.error_rate,
+                "disconnect_rate": options.disconnect_rate,
+                "seed": options.seed,
+                "image_folder": options.image_folder,
+                "chunk_size": options.chunk_size,
+                "output_time": options.output_time,
+                "launch_time": options.launch_time,
+                "kernel_pool": options.kernel_pool,
+                "symbols": ["Symbol%d" % i for i in range(options.symbol_count)],
+                "legacy_suggestions": options.legacy_suggestions}
+    
+    server = FakeServer(**settings)
+    if options.unix_socket is not None:
+        FakeUnixServer(options.unix_socket, **settings).start()
+    
+    sys.stdout.write("%d\n" % server.port)
+    sys.stdout.flush()
+    
+    if options.port_file is not None:
+        fp = open(options.port_file + ".tmp", 'w')
+        fp.write("%d\n" % server.port)
+        fp.close()
+        os.rename(options.port_file + ".tmp", options.port_file)
+    
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+"""Runs the benchmark suite and stores the results as JSON.
+
+    python benchmarks/run.py                      # everything, saved under benchmarks/results/
+    python benchmarks/run.py parse reformat       # only the named benchmarks
+    python benchmarks/run.py --quick -o new.json  # smaller inputs, for a quick check
+    python benchmarks/run.py --compare old.json   # run, then compare against an earlier run
+
+Each benchmark is one of the bench_* functions. Its rows are stored as
+objects: the key columns identify a row (document size, payload size...)
+and the remaining columns are measurements. Comparing two result files
+matches rows on their keys and reports the change in each measurement.
+Everything runs offline; the client benchmarks use fakeserver.
+"""
+import os
+import sys
+import time
+import json
+import platform
+import optparse
+import subprocess
+import traceback
+
+from common import *
+import bench_ancestry
+import bench_client
+import bench_commands
+import bench_completion
+import bench_image_cache
+import bench_inline
+import bench_kernel_pool
+import bench_connect
+import bench_first_output
+import bench_load
+import bench_memory
+import bench_parse
+import bench_pipeline
+import bench_protocol
+import bench_reformat
+import bench_reparse
+import bench_sessions
+import bench_show
+import bench_startup
+import bench_suggestions
+import bench_transport
+
+RESULTS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Measurements where a larger number is an improvement; everything else is a time
+HIGHER_IS_BETTER = ("throughput", "commands_per_second", "sequential_per_second", "multiplexed_per_second")
+
+# Measurements that are counts rather than times
+COUNTS = ("recv_calls", "received", "exceptions", "disconnects", "buffer_size")
+
+# Changes smaller than this are reported as noise
+THRESHOLD = 0.1
+
+def positions(**kwargs):
+    return [bench_show.bench_positions(**kwargs)]
+
+def ancestry(**kwargs):
+    ancestors, results = bench_ancestry.bench_ancestry(**kwargs)
+    return [(name, ancestors, elapsed) for name, elapsed in results]
+
+def connect():
+    return [bench_connect.bench_connect()]
+
+def image_cache(**kwargs):
+    miss, hit, stats = bench_image_cache.bench_image_cache(**kwargs)
+    return [(miss, hit)]
+
+def memory(**kwargs):
+    size, results = bench_memory.bench_memory(**kwargs)
+    return [(mode, size, peak, elapsed) for mode, peak, elapsed in results]
+
+def startup(**kwargs):
+    timings = bench_startup.time_import(**kwargs)
+    return [(timings[0], timings[len(timings) // 2])]
+
+# (name, function, full arguments, quick arguments, key columns, measurement columns)
+SUITE = [
+    ("parse", bench_parse.bench_parse, {}, {"sizes": [500, 2000]},
+        ("lines", "bytes"), ("time",)),
+    ("reformat", bench_reformat.bench_reformat, {}, {"sizes": [500, 2000]},
+        ("lines", "bytes"), ("command", "stream")),
+    ("reparse", bench_reparse.bench_reparse, {}, {"lines": (2000,)},
+        ("lines", "where", "edit"), ("parse", "reparse")),
+    ("show", bench_show.bench_show, {}, {"sizes": [1000, 5000]},
+        ("lines", "statements"), ("time",)),
+    ("positions", positions, {}, {"lines": 5000, "lookups": 2000},
+        (), ("get_line_col", "get_pos")),
+    ("commands", bench_commands.bench_commands, {}, {"lines": (500,)},
+        ("lines", "command"), ("parse", "cold", "warm")),
+    ("inline", bench_inline.bench_inline, {}, {"repeat": 3},
+        ("mode",), ("first_byte",)),
+    ("first_output", bench_first_output.bench_first_output, {}, {"payload_size": 262144, "output_time": 0.2},
+        ("mode", "payload_size"), ("first_output", "done", "buffer_size")),
+    ("image_cache", image_cache, {}, {"repeat": 2},
+        (), ("miss", "hit")),
+    ("completion", bench_completion.bench_completion, {}, {"symbol_count": 2000},
+        ("prefix", "symbols"), ("kernel", "cached")),
+    ("suggestions", bench_suggestions.bench_suggestions, {}, {"symbol_counts": (5000,)},
+        ("step", "symbols"), ("literal", "payload")),
+    ("client", bench_client.bench_client, {}, {"count": 100},
+        ("mode",), ("latency",)),
+    ("ancestry", ancestry, {}, {"repeat": 3},
+        ("lookup", "ancestors"), ("time",)),
+    ("connect", connect, {}, {},
+        (), ("warm", "cold")),
+    ("pipeline", bench_pipeline.bench_pipeline, {}, {"statement_count": 50, "windows": (1, 16)},
+        ("window",), ("time",)),
+    ("protocol", bench_protocol.bench_protocol, {}, {"payload_sizes": (1024, 65536)},
+        ("reader", "payload_size"), ("recv_calls", "received", "time")),
+    ("transport", bench_transport.bench_transport, {}, {"payload_sizes": (65536,)},
+        ("transport", "payload_size"), ("throughput",)),
+    ("kernel_pool", bench_kernel_pool.bench_kernel_pool, {}, {"repeat": 2},
+        ("pool_size",), ("first_execute", "reset")),
+    ("load", bench_load.bench_load, {}, {"sessions": (1, 4), "command_count": 20},
+        ("sessions",), ("commands_per_second", "p50", "p95", "exceptions", "disconnects")),
+    ("sessions", bench_sessions.bench_sessions, {}, {"sessions": (1, 4), "statement_count": 20},
+        ("sessions",), ("sequential_per_second", "multiplexed_per_second")),
+    ("startup", startup, {}, {"repeat": 5},
+        (), ("min", "median")),
+    ("memory", memory, {"size_mb": 5}, {"size_mb": 1},
+        ("mode", "bytes"), ("peak_rss", "time")),
+]
+
+def get_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.STDOUT).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(names = None, quick = False):
+    """Runs the named benchmarks, or all of them. One that raises or leaves a
+    measurement out is listed as failed instead of storing its rows."""
+    results = {}
+    failed = []
+    for name, function, full_kwargs, quick_kwargs, keys, measurements in SUITE:
+        if names and name not in names:
+            continue
+        
+        sys.stderr.write("%-12s " % name)
+        sys.stderr.flush()
+        start = time.time()
+        try:
+            rows = function(**(quick_kwargs if quick else full_kwargs))
+        except Exception:
+            sys.stderr.write("failed\n")
+            traceback.print_exc()
+            failed.append(name)
+            continue
+        
+        columns = keys + measurements
+        if any(len(row) != len(columns) or None in row[len(keys):] for row in rows):
+            sys.stderr.write("failed: missing measurements in %r\n" % (rows,))
+            failed.append(name)
+            continue
+        sys.stderr.write("%6.1fs\n" % (time.time() - start))
+        
+        results[name] = {
+            "keys": list(keys),
+            "measurements": list(measurements),
+            "rows": [dict(zip(columns, row)) for row in rows],
+        }
+    
+    return {
+        "revision": get_revision(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "benchmarks": results,
+        "failed": failed,
+    }
+
+def get_row_key(benchmark, row):
+    return tuple(row.get(key) for key in benchmark["keys"])
+
+def compare(old, new):
+    """Yields (benchmark, key, measurement, old value, new value, change) for
+    every measurement present in both runs. change is positive for an
+    improvement and negative for a regression."""
+    for name in sorted(new["benchmarks"]):
+        if name not in old["benchmarks"]:
+            continue
+        old_benchmark, new_benchmark = old["benchmarks"][name], new["benchmarks"][name]
+        old_rows = dict((get_row_key(old_benchmark, row), row) for row in old_benchmark["rows"])
+        
+        for row in new_benchmark["rows"]:
+            key = get_row_key(new_benchmark, row)
+            if key not in old_rows:
+                continue
+            for measurement in new_benchmark["measurements"]:
+                old_value, new_value = old_rows[key].get(measurement), row.get(measurement)
+                if not old_value or not new_value:
+                    continue
+                if measurement in HIGHER_IS_BETTER:
+                    change = new_value / float(old_value) - 1
+                else:
+                    change = old_value / float(new_value) - 1
+                yield name, key, measurement, old_value, new_value, change
+
+def format_value(measurement, value):
+    if measurement.endswith("_per_second"):
+        return "%.1f/s" % value
+    if measurement in HIGHER_IS_BETTER:
+        return "%.1f MB/s" % (value / 1e6)
+    if measurement in COUNTS:
+        return "%d" % value
+    if measurement == "peak_rss":
+        return "%.1f MB" % (value / 1e6)
+    return "%.3fms" % (value * 1000)
+
+def print_comparison(old, new, threshold = THRESHOLD):
+    print "%s -> %s" % (old.get("revision"), new.get("revision"))
+    regressions = 0
+    for name, key, measurement, old_value, new_value, change in compare(old, new):
+        if change <= -threshold:
+            verdict = "slower"
+            regressions += 1
+        elif change >= threshold:
+            verdict = "faster"
+        else:
+            verdict = ""
+        print "%-12s %-36s %-12s %14s %14s %+7.1f%% %s" % (name, ", ".join(str(k) for k in key), measurement,
+            format_value(measurement, old_value), format_value(measurement, new_value), change * 100, verdict)
+    return regressions
+
+def main():
+    parser = optparse.OptionParser(usage="%prog [options] [benchmark ...]")
+    parser.add_option("-o", "--output", help="where to write the results (default: results/<revision>.json)")
+    parser.add_option("--quick", action="store_true", default=False, help="use smaller inputs")
+    parser.add_option("--compare", metavar="FILE", help="compare the results with an earlier run")
+    parser.add_option("--threshold", type="float", default=THRESHOLD,
+        help="relative change reported as a regression (default: %default)")
+    parser.add_option("--list", action="store_true", default=False, help="list the benchmarks")
+    options, args = parser.parse_args()
+    
+    if options.list:
+        for entry in SUITE:
+            print entry[0]
+        return 0
+    
+    unknown = set(args) - set(entry[0] for entry in SUITE)
+    if unknown:
+        parser.error("unknown benchmark: %s" % ", ".join(sorted(unknown)))
+    
+    results = run_suite(args, options.quick)
+    
+    output = options.output
+    if output is None:
+        output = os.path.join(RESULTS_FOLDER, "%s.json" % (results["revision"] or time.strftime("%Y%m%d-%H%M%S")))
+    mathmate.write_json(output, results)
+    sys.stderr.write("results written to %s\n" % output)
+    
+    status = 0
+    if options.compare is not None:
+        fp = open(options.compare)
+        old = json.load(fp)
+        fp.close()
+        if print_comparison(old, results, options.threshold):
+            status = 1
+    
+    if len(results["failed"]) != 0:
+        sys.stderr.write("failed: %s\n" % ", ".join(results["failed"]))
+        status = 1
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+"multi
+line"{2.5If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+1.`%%);-@@@[f[x_] := x^2 + 1
+@\[Alpha]"(* not a comment *)"(* unclosed comment
+/.(* "quote" in comment *)(* unclosed comment{If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+(* unclosed comment
\ No newline at end of file
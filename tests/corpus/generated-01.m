@@ -0,0 +1,21 @@
+*/@Plot[Sin[x], {x, -5, 5}]
+
+{Sin(* nested (* comment *) *)If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+list = {1, 2, 3}; list[[2]] = 5;
+/.1"multi
+line"=* #2^f[x_] := x^2 + 1
+(* a comment
+   over lines *)
+x = 1
+(* a comment
+   over lines *)
+x = 1
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+Table[i^2, {i, 1, 10}] // TableForm
+
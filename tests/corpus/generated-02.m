@@ -0,0 +1,17 @@
+(* "quote" in comment *)	x*(* a comment
+   over lines *)
+x = 1
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+list = {1, 2, 3}; list[[2]] = 5;
+"with \"escaped\" quotes"@@@
+^"a string":/g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+(* comment *)If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
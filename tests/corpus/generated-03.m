@@ -0,0 +1,16 @@
+?list = {1, 2, 3}; list[[2]] = 5;
++"unclosed?}(* comment *)(* a comment
+   over lines *)
+x = 1
+||%
+#:>[}->"unclosed=;(* unclosed comment||
+2.52*^5"a string"[10^-3{Plot[Sin[x], {x, -5, 5}]
+
+->__,==__;;#@@@Sin"unclosed( "unclosed_:=g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+||Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
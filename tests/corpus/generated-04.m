@@ -0,0 +1,19 @@
+"(* not a comment *)"g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+f[x_] := x^2 + 1
+Table[i^2, {i, 1, 10}] // TableForm
+
+@@@y1&&SinModule[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+(* nested (* comment *) *))(* "quote" in comment *)&/g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
@@ -0,0 +1,20 @@
+1.`(* comment *)? ]];	Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+[(//f[x_] := x^2 + 1
+$Contextg[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+2.5Plot[Sin[x], {x, -5, 5}]
+
+list = {1, 2, 3}; list[[2]] = 5;
@@ -0,0 +1,15 @@
+  x[[(* "quote" in comment *)Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+(* "quote" in comment *)Table[i^2, {i, 1, 10}] // TableForm
+
+;;"(* not a comment *)"__If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+Table[i^2, {i, 1, 10}] // TableForm
+
+:>%f[x_] := x^2 + 1
+2*^5Table[i^2, {i, 1, 10}] // TableForm
+
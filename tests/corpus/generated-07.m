@@ -0,0 +1,18 @@
+Plot[Sin[x], {x, -5, 5}]
+
+(* a comment
+   over lines *)
+x = 1
+/==//\nTable[i^2, {i, 1, 10}] // TableForm
+
+(* "quote" in comment *)
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+->\n%%f//10^-3{@@[:=
+!f[x_] := x^2 + 1
+"unclosed[[=
+(* "quote" in comment *)Table[i^2, {i, 1, 10}] // TableForm
+
+||	
\ No newline at end of file
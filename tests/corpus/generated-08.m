@@ -0,0 +1,21 @@
+ %g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+\nf[x_] := x^2 + 1
+2.5[]]"a string"###@(* "quote" in comment *)2.5Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+Table[i^2, {i, 1, 10}] // TableForm
+
+"unclosed<>^-Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+;	Table[i^2, {i, 1, 10}] // TableForm
+
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
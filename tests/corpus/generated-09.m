@@ -0,0 +1,21 @@
+-(* a comment
+   over lines *)
+x = 1
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+  Plot_/f[x_] := x^2 + 1
+*list = {1, 2, 3}; list[[2]] = 5;
+(* "quote" in comment *)@10^-3%{^y1x2*^5list = {1, 2, 3}; list[[2]] = 5;
+	Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+(* a comment
+   over lines *)
+x = 1
+@-Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
@@ -0,0 +1,25 @@
+##:>;$Context ==(* a comment
+   over lines *)
+x = 1
+-&&
+^ [2*^5:="multi
+line"
+
+[)Plot[Sin[x], {x, -5, 5}]
+
+$Context@##&/.<>g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+\n==1.`==-@@@^@@/@Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+1.`xg[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
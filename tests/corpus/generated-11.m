@@ -0,0 +1,11 @@
+]]g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Plotlist = {1, 2, 3}; list[[2]] = 5;
+)/@=list = {1, 2, 3}; list[[2]] = 5;
+(* "quote" in comment *)*  [[%%(* nested (* comment *) *)f[x_] := x^2 + 1
+{  #2(* unclosed comment
+x__##	Plot[Sin[x], {x, -5, 5}]
+
+(* unclosed commentlist = {1, 2, 3}; list[[2]] = 5;
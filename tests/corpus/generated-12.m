@@ -0,0 +1,20 @@
+=/@\[Alpha]2*^5\[Alpha]If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+f[x_] := x^2 + 1
+list = {1, 2, 3}; list[[2]] = 5;
+%%Plot[Sin[x], {x, -5, 5}]
+
+-)"with \"escaped\" quotes"g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
@@ -0,0 +1,18 @@
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+(* nested (* comment *) *)+1.`##Table[i^2, {i, 1, 10}] // TableForm
+
+;~~__"with \"escaped\" quotes"@@@@==g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+//.1.`Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+"with \"escaped\" quotes"g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
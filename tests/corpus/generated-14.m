@@ -0,0 +1,16 @@
+%%(* a comment
+   over lines *)
+x = 1
++-3y1f[x_] := x^2 + 1
+f[x_] := x^2 + 1
+"with \"escaped\" quotes" list = {1, 2, 3}; list[[2]] = 5;
+(* a comment
+   over lines *)
+x = 1
+ xg[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+  @@  "(* not a comment *)"10^-3:(* a comment
+   over lines *)
+x = 1
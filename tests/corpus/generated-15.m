@@ -0,0 +1,18 @@
+/./@1f[x_] := x^2 + 1
+//.{(* comment *)Plot[Sin[x], {x, -5, 5}]
+
+/-Plot[Sin[x], {x, -5, 5}]
+
+2*^5
+!=f[x_] := x^2 + 1
+
+#2(* nested (* comment *) *)->(* a comment
+   over lines *)
+x = 1
+Plot[Sin[x], {x, -5, 5}]
+
+(* nested (* comment *) *)]](* a comment
+   over lines *)
+x = 1
+Table[i^2, {i, 1, 10}] // TableForm
+
@@ -0,0 +1,19 @@
+_((* a comment
+   over lines *)
+x = 1
+(* a comment
+   over lines *)
+x = 1
+=1.`"unclosed$Context"multi
+line"SinIf[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+"multi
+line"Table[i^2, {i, 1, 10}] // TableForm
+
+]@@@//.g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+#2+"with \"escaped\" quotes"
\ No newline at end of file
@@ -0,0 +1,21 @@
+,"multi
+line"\n\[Alpha]:1list = {1, 2, 3}; list[[2]] = 5;
+Plot##@@@^!Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+_##(* a comment
+   over lines *)
+x = 1
+=If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+-10^-3_~~Plot[Sin[x], {x, -5, 5}]
+
+,1(* a comment
+   over lines *)
+x = 1
+x<>:&(* a comment
+   over lines *)
+x = 1
@@ -0,0 +1,18 @@
+Plotf[x_] := x^2 + 1
+"multi
+line"g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Plot[Sin[x], {x, -5, 5}]
+
+  :	->
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+f[x_] := x^2 + 1
+f[x_] := x^2 + 1
+list = {1, 2, 3}; list[[2]] = 5;
+@<>"(* not a comment *)"-f[x_] := x^2 + 1
+% $Context
\ No newline at end of file
@@ -0,0 +1,17 @@
+//[[Table[i^2, {i, 1, 10}] // TableForm
+
+"with \"escaped\" quotes"Plot[Sin[x], {x, -5, 5}]
+
+"multi
+line""unclosed/@ If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+ {Table[i^2, {i, 1, 10}] // TableForm
+
+#2Plot[Sin[x], {x, -5, 5}]
+
+<>//  f[x_] := x^2 + 1
+]Table[i^2, {i, 1, 10}] // TableForm
+
+:+[[
\ No newline at end of file
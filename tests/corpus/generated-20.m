@@ -0,0 +1,22 @@
+==g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+- list = {1, 2, 3}; list[[2]] = 5;
+(* a comment
+   over lines *)
+x = 1
+(* unclosed commentIf[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+&&{Table[i^2, {i, 1, 10}] // TableForm
+
+  xModule[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
@@ -0,0 +1,16 @@
+#2Table[i^2, {i, 1, 10}] // TableForm
+
+)2.5  	Sin:g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+-3f[x_] := x^2 + 1
+||^==}/If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+list = {1, 2, 3}; list[[2]] = 5;
+(* comment *)~~(]]"multi
+line"f_#2
+||	1
+]]==	(* nested (* comment *) *)"with \"escaped\" quotes"
\ No newline at end of file
@@ -0,0 +1,25 @@
+Sin
+/\[Alpha]%_"a string"Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+\[Alpha](* a comment
+   over lines *)
+x = 1
+]Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+&&\[Alpha] @@Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+\n]] $Context+(* a comment
+   over lines *)
+x = 1
+[[[
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+"(* not a comment *)"
\ No newline at end of file
@@ -0,0 +1,14 @@
+(* comment *)==Table[i^2, {i, 1, 10}] // TableForm
+
+@@@Table[i^2, {i, 1, 10}] // TableForm
+
+#{list = {1, 2, 3}; list[[2]] = 5;
+10^-32.5"unclosed-3f[x_] := x^2 + 1
+:>]][[g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+#(* a comment
+   over lines *)
+x = 1
+list = {1, 2, 3}; list[[2]] = 5;
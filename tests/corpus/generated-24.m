@@ -0,0 +1,13 @@
+f[x_] := x^2 + 1
+
+list = {1, 2, 3}; list[[2]] = 5;
+"(* not a comment *)"\n]Table[i^2, {i, 1, 10}] // TableForm
+
+"unclosed#2list = {1, 2, 3}; list[[2]] = 5;
+Sin!10^-3Sin][[)(* nested (* comment *) *)Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+%"multi
+line"_f[x_] := x^2 + 1
+$Contextlist = {1, 2, 3}; list[[2]] = 5;
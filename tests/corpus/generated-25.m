@@ -0,0 +1,18 @@
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+//:Table[i^2, {i, 1, 10}] // TableForm
+
+Table[i^2, {i, 1, 10}] // TableForm
+
+ :##f[x_] := x^2 + 1
+:;Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+/"unclosed"with \"escaped\" quotes" (* comment *)"a string"
+"with \"escaped\" quotes"g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
@@ -0,0 +1,21 @@
+(* a comment
+   over lines *)
+x = 1
+]Plot[Sin[x], {x, -5, 5}]
+
+(* a comment
+   over lines *)
+x = 1
+list = {1, 2, 3}; list[[2]] = 5;
+==)g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
++Sing[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
@@ -0,0 +1,17 @@
+ ;2.5&/@"unclosed(* "quote" in comment *)(* "quote" in comment *)(* a comment
+   over lines *)
+x = 1
+,10^-3110^-3Sin
+:>If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+\[Alpha]Table[i^2, {i, 1, 10}] // TableForm
+
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+||f%_/.\[Alpha],;?@@+}(* unclosed comment(* a comment
+   over lines *)
+x = 1
@@ -0,0 +1,25 @@
+f[x_] := x^2 + 1
+:(* a comment
+   over lines *)
+x = 1
+-3Table[i^2, {i, 1, 10}] // TableForm
+
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+
+$Context;Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+=(* a comment
+   over lines *)
+x = 1
+(* a comment
+   over lines *)
+x = 1
+(* comment *)*}Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
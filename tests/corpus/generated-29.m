@@ -0,0 +1,18 @@
+  @@@"multi
+line"1y1list = {1, 2, 3}; list[[2]] = 5;
+list = {1, 2, 3}; list[[2]] = 5;
+list = {1, 2, 3}; list[[2]] = 5;
+Plot[Sin[x], {x, -5, 5}]
+
+(* a comment
+   over lines *)
+x = 1
+:=<>!)Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+f(* nested (* comment *) *)
\ No newline at end of file
@@ -0,0 +1,20 @@
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+Plot[Sin[x], {x, -5, 5}]
+
+list = {1, 2, 3}; list[[2]] = 5;
+"(* not a comment *)"Table[i^2, {i, 1, 10}] // TableForm
+
+Table[i^2, {i, 1, 10}] // TableForm
+
+f[x_] := x^2 + 1
+(* comment *)2*^5%(* a comment
+   over lines *)
+x = 1
+f[x_] := x^2 + 1
+ ]]1g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
@@ -0,0 +1,15 @@
+&(* a comment
+   over lines *)
+x = 1
+fTable[i^2, {i, 1, 10}] // TableForm
+
+10^-3list = {1, 2, 3}; list[[2]] = 5;
+(* unclosed commentg[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Table[i^2, {i, 1, 10}] // TableForm
+
+;Plot[Sin[x], {x, -5, 5}]
+
+(* nested (* comment *) *)"with \"escaped\" quotes"
\ No newline at end of file
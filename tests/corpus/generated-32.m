@@ -0,0 +1,21 @@
+/@;]]%:="unclosed#2/.
+]]]*
+1.`	@-==Plot[Sin[x], {x, -5, 5}]
+
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+"a string"f[x_] := x^2 + 1
+x:=g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Plot[Sin[x], {x, -5, 5}]
+
+;xf[x_] := x^2 + 1
+"a string"
\ No newline at end of file
@@ -0,0 +1,16 @@
+x10^-3list = {1, 2, 3}; list[[2]] = 5;
+Table[i^2, {i, 1, 10}] // TableForm
+
+Plot(* a comment
+   over lines *)
+x = 1
+:>!"a string"+y1f[x_] := x^2 + 1
+Plot	%% (* a comment
+   over lines *)
+x = 1
+#21Table[i^2, {i, 1, 10}] // TableForm
+
+(* comment *)g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
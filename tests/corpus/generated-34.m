@@ -0,0 +1,20 @@
+:>(* a comment
+   over lines *)
+x = 1
+
+/"unclosedlist = {1, 2, 3}; list[[2]] = 5;
+Table[i^2, {i, 1, 10}] // TableForm
+
+
+\n(* unclosed comment}	//.list = {1, 2, 3}; list[[2]] = 5;
+||
+
+Plotf[x_] := x^2 + 1
+
+//.g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+]==@@+(* a comment
+   over lines *)
+x = 1
@@ -0,0 +1,24 @@
+Plot[Sin[x], {x, -5, 5}]
+
+f[x_] := x^2 + 1
+:>/.If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+"a string"Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+Plot[Sin[x], {x, -5, 5}]
+
+f[x_] := x^2 + 1
+_@@@;(* a comment
+   over lines *)
+x = 1
+
+Plot"multi
+line"
\ No newline at end of file
@@ -0,0 +1,24 @@
+/.Plot||?  Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+(* a comment
+   over lines *)
+x = 1
+#xIf[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+&&(* a comment
+   over lines *)
+x = 1
+Plot[Sin[x], {x, -5, 5}]
+
+=If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+f+:=Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
@@ -0,0 +1,19 @@
+;@@f[x_] := x^2 + 1
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+Table[i^2, {i, 1, 10}] // TableForm
+
+"multi
+line"/\[Alpha]Sin+##*:Table[i^2, {i, 1, 10}] // TableForm
+
+##[[Table[i^2, {i, 1, 10}] // TableForm
+
+(* unclosed comment&(* a comment
+   over lines *)
+x = 1
+Plot||2.5g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
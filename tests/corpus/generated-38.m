@@ -0,0 +1,21 @@
+||-Plot[Sin[x], {x, -5, 5}]
+
+!g[x_, y_] :=
+    Block[{z = x + y},
+        z /. z -> 1
+    ]
+/:>#f[x_] := x^2 + 1
+Table[i^2, {i, 1, 10}] // TableForm
+
+If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+y1Plot[Sin[x], {x, -5, 5}]
+
+Table[i^2, {i, 1, 10}] // TableForm
+
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
@@ -0,0 +1,19 @@
+Table[i^2, {i, 1, 10}] // TableForm
+
+%%&"multi
+line";list = {1, 2, 3}; list[[2]] = 5;
+]]If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+Module[{a = 1, b},
+	b = a + 1;
+	b^2
+]
+||If[x > 0,
+  Print["positive"],
+  Print["negative"]
+]
+(* unclosed comment(* unclosed commentPlot[Sin[x], {x, -5, 5}]
+
+*list = {1, 2, 3}; list[[2]] = 5;
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""Writes the parser's golden corpus: generated documents in corpus/ and the
+statements and parse tree levels expected for them, and for mathtest.m, in
+corpus/expected.json.
+
+The expected output comes from a reference parser, by default the one from
+before the parser was rewritten for speed. test_parse_corpus.py compares the
+current parser against it."""
+import os
+import sys
+import json
+import random
+import tempfile
+import subprocess
+import imp
+from optparse import OptionParser
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TESTS)
+CORPUS = os.path.join(TESTS, "corpus")
+EXPECTED = os.path.join(CORPUS, "expected.json")
+MATHTEST = os.path.join(ROOT, "Support", "tools", "mathtest.m")
+
+# The last commit with the original parser
+REFERENCE_REVISION = "a959431^"
+REFERENCE_PATH = "Support/bin/mathmate.py"
+
+# (name, indent_size, soft_tabs)
+INDENTS = [("spaces", 2, True), ("tabs", 4, False)]
+
+DOCUMENTS = 40
+SEED = 1729
+
+FRAGMENTS = [
+    "x", "y1", "f", "Plot", "Sin", "$Context", "#", "#2", "&", "##", "%", "%%",
+    "1", "2.5", "-3", "1.`", "10^-3", "2*^5",
+    " ", " ", "  ", "\t", "\n", "\n", "\n\n", "\r\n", ";", ";", ",",
+    "[", "]", "[[", "]]", "{", "}", "(", ")",
+    "=", ":=", "->", ":>", "/.", "//.", "//", "@", "@@", "@@@", "/@", "==",
+    "+", "-", "*", "/", "^", "<>", "~~", "&&", "||", "!", "?", "_", "__", ":",
+    "\"a string\"", "\"with \\\"escaped\\\" quotes\"", "\"multi\nline\"", "\"(* not a comment *)\"",
+    "\"unclosed", "(* comment *)", "(* nested (* comment *) *)", "(* unclosed comment",
+    "(* \"quote\" in comment *)", "\\[Alpha]", "\\n",
+]
+
+TEMPLATES = [
+    "f[x_] := x^2 + 1\n",
+    "Module[{a = 1, b},\n\tb = a + 1;\n\tb^2\n]\n",
+    "If[x > 0,\n  Print[\"positive\"],\n  Print[\"negative\"]\n]\n",
+    "Table[i^2, {i, 1, 10}] // TableForm\n\n",
+    "list = {1, 2, 3}; list[[2]] = 5;\n",
+    "(* a comment\n   over lines *)\nx = 1\n",
+    "Plot[Sin[x], {x, -5, 5}]\n\n",
+    "g[x_, y_] :=\n    Block[{z = x + y},\n        z /. z -> 1\n    ]\n",
+]
+
+def generate_document(rand):
+    parts = []
+    while sum(len(part) for part in parts) < 300:
+        if rand.random() < 0.3:
+            parts.append(rand.choice(TEMPLATES))
+        else:
+            parts.append(rand.choice(FRAGMENTS))
+    return "".join(parts)
+
+def generate_documents(count = DOCUMENTS, seed = SEED):
+    rand = random.Random(seed)
+    return [generate_document(rand) for i in range(count)]
+
+def get_corpus():
+    """Returns (name, path) for each document in the corpus."""
+    paths = [("mathtest.m", MATHTEST)]
+    if os.path.isdir(CORPUS):
+        for name in sorted(os.listdir(CORPUS)):
+            if name.endswith(".m"):
+                paths.append((name, os.path.join(CORPUS, name)))
+    return paths
+
+def load_reference(path = None):
+    """Loads the reference parser's module, from the repository's history
+    unless a path is given."""
+    if path is None:
+        source = subprocess.check_output(["git", "show", "%s:%s" % (REFERENCE_REVISION, REFERENCE_PATH)], cwd=ROOT)
+        fd, path = tempfile.mkstemp(suffix=".py")
+        os.write(fd, source)
+        os.close(fd)
+        try:
+            return imp.load_source("reference_mathmate", path)
+        finally:
+            os.remove(path)
+            if os.path.exists(path + "c"):
+                os.remove(path + "c")
+    return imp.load_source("reference_mathmate", path)
+
+def get_levels(doc, parse_at):
+    """Returns the parse tree level at each cursor position as a list of
+    [position, level] pairs, one for each position where it changes.
+    parse_at(position) parses with the cursor there and returns the level."""
+    levels = []
+    for position in range(len(doc) + 1):
+        level = parse_at(position)
+        if len(levels) == 0 or levels[-1][1] != level:
+            levels.append([position, level])
+    return levels
+
+def make_reference_parser(module, doc, indent_size, soft_tabs):
+    mm = module.MathMate.__new__(module.MathMate)
+    mm.doc = doc
+    mm.indent_size = indent_size
+    if soft_tabs:
+        mm.indent = " " * indent_size
+    else:
+        mm.indent = "\t"
+    mm.tmcursor = -1
+    mm.parse_tree_level = None
+    
+    def parse_at(position):
+        mm.tmcursor = position
+        mm.parse_tree_level = None
+        mm.parse(doc)
+        return mm.parse_tree_level
+    return mm, parse_at
+
+def get_expected(module, doc):
+    expected = {}
+    for name, indent_size, soft_tabs in INDENTS:
+        mm, parse_at = make_reference_parser(module, doc, indent_size, soft_tabs)
+        expected[name] = {
+            "statements": [list(statement) for statement in mm.parse(doc)],
+            "levels": get_levels(doc, parse_at),
+        }
+    return expected
+
+def main():
+    parser = OptionParser(usage="%prog [options]")
+    parser.add_option("-r", "--reference", dest="reference", default=None,
+        help="the reference mathmate.py (default: %s from %s)" % (REFERENCE_PATH, REFERENCE_REVISION))
+    parser.add_option("-n", "--documents", dest="documents", type="int", default=DOCUMENTS,
+        help="the number of generated documents (default: %default)")
+    parser.add_option("-s", "--seed", dest="seed", type="int", default=SEED,
+        help="the seed for generating documents (default: %default)")
+    options, args = parser.parse_args()
+    
+    module = load_reference(options.reference)
+    
+    if not os.path.isdir(CORPUS):
+        os.makedirs(CORPUS)
+    for name, path in get_corpus():
+        if path.startswith(CORPUS):
+            os.remove(path)
+    for i, doc in enumerate(generate_documents(options.documents, options.seed)):
+        fp = open(os.path.join(CORPUS, "generated-%02d.m" % i), "wb")
+        fp.write(doc)
+        fp.close()
+    
+    expected = {}
+    for name, path in get_corpus():
+        fp = open(path, "rb")
+        expected[name] = get_expected(module, fp.read())
+        fp.close()
+    
+    fp = open(EXPECTED, "w")
+    json.dump(expected, fp, indent=1, sort_keys=True)
+    fp.write("\n")
+    fp.close()
+    print "Wrote the expected output for %d documents to %s" % (len(expected), EXPECTED)
+
+if __name__ == '__main__':
+    main()
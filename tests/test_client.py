@@ -0,0 +1,38 @@
+"""Tests for TextMateJLinkClient against the fake server of the benchmarks."""
+import os
+import sys
+import socket
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Support", "bin"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import mathmate
+import fakeserver
+
+CHUNK_SIZE = 65536
+
+class IntexecTest(unittest.TestCase):
+    def setUp(self):
+        self.server = fakeserver.FakeServer(chunk_size=CHUNK_SIZE).start()
+        self.client = mathmate.TextMateJLinkClient(socket.create_connection(("localhost", self.server.port)), "test")
+    
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+    
+    def test_short_result(self):
+        self.assertEqual(self.client.intexec("1 + 1"), "1 + 1\n")
+    
+    def test_chunked_result(self):
+        # Sent as a chunk frame and a final inline frame with the last bytes
+        command = "".join(chr(ord("a") + i % 26) for i in range(CHUNK_SIZE + 5))
+        self.assertEqual(self.client.intexec(command), command + "\n")
+    
+    def test_result_of_several_chunks(self):
+        command = "x" * (CHUNK_SIZE * 3)
+        self.assertEqual(self.client.intexec(command), command + "\n")
+
+if __name__ == '__main__':
+    unittest.main()
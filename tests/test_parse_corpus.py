@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""Compares the parser against the golden corpus written by
+make_parse_corpus.py: the statements, reformatted, and the parse tree level at
+every cursor position, with spaces and with tabs for indents."""
+import os
+import sys
+import json
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS, "..", "Support", "bin"))
+
+import mathmate
+from make_parse_corpus import EXPECTED, INDENTS, get_corpus, get_levels
+
+def read_expected():
+    fp = open(EXPECTED, "r")
+    expected = json.load(fp)
+    fp.close()
+    return expected
+
+def make_parser(doc, indent_size, soft_tabs):
+    mm = mathmate.MathMate(doc=doc, indent_size=indent_size, soft_tabs=soft_tabs)
+    
+    def parse_at(position):
+        mm.tmcursor = position
+        return mm.get_parse_tree_level()
+    return mm, parse_at
+
+class ParseCorpusTest(unittest.TestCase):
+    def setUp(self):
+        self.expected = read_expected()
+    
+    def test_corpus_is_complete(self):
+        self.assertEqual(sorted(name for name, path in get_corpus()), sorted(self.expected.keys()))
+    
+    def test_statements(self):
+        for name, path in get_corpus():
+            fp = open(path, "rb")
+            doc = fp.read()
+            fp.close()
+            for indent, indent_size, soft_tabs in INDENTS:
+                mm, parse_at = make_parser(doc, indent_size, soft_tabs)
+                statements = [list(statement) for statement in mm.parse(doc)]
+                self.assertEqual(statements, self.expected[name][indent]["statements"],
+                    "statements differ for %s with %s" % (name, indent))
+    
+    def test_parse_tree_levels(self):
+        for name, path in get_corpus():
+            fp = open(path, "rb")
+            doc = fp.read()
+            fp.close()
+            for indent, indent_size, soft_tabs in INDENTS:
+                mm, parse_at = make_parser(doc, indent_size, soft_tabs)
+                self.assertEqual(get_levels(doc, parse_at), self.expected[name][indent]["levels"],
+                    "parse tree levels differ for %s with %s" % (name, indent))
+
+if __name__ == '__main__':
+    unittest.main()
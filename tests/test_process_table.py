@@ -0,0 +1,126 @@
+"""Tests for finding TextMate's pid among the ancestors of a command."""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Support", "bin"))
+
+import mathmate
+
+TEXTMATE = "/Applications/TextMate.app/Contents/MacOS/TextMate"
+
+class FakeProcessTable(object):
+    def __init__(self, processes):
+        self.processes = processes
+        self.lookups = []
+    
+    def get_process(self, pid):
+        self.lookups.append(pid)
+        return self.processes.get(pid)
+
+def is_textmate(command):
+    return "TextMate.app/Contents/MacOS/TextMate" in command
+
+class FindAncestorTest(unittest.TestCase):
+    def test_finds_nearest_match(self):
+        table = FakeProcessTable({
+            40: (30, "python mathmate.py"),
+            30: (20, "/bin/sh -c command"),
+            20: (1, TEXTMATE),
+        })
+        self.assertEqual(mathmate.find_ancestor(40, is_textmate, table), 20)
+        self.assertEqual(table.lookups, [40, 30, 20])
+    
+    def test_matches_pid_itself(self):
+        table = FakeProcessTable({20: (1, TEXTMATE)})
+        self.assertEqual(mathmate.find_ancestor(20, is_textmate, table), 20)
+    
+    def test_no_match_before_init(self):
+        table = FakeProcessTable({40: (30, "python"), 30: (1, "launchd")})
+        self.assertEqual(mathmate.find_ancestor(40, is_textmate, table), None)
+        self.assertEqual(table.lookups, [40, 30])
+    
+    def test_parent_cycle(self):
+        table = FakeProcessTable({40: (30, "python"), 30: (50, "sh"), 50: (40, "sh")})
+        self.assertEqual(mathmate.find_ancestor(40, is_textmate, table), None)
+        self.assertEqual(table.lookups, [40, 30, 50])
+    
+    def test_missing_pid(self):
+        table = FakeProcessTable({40: (30, "python")})
+        self.assertEqual(mathmate.find_ancestor(40, is_textmate, table), None)
+        self.assertEqual(mathmate.find_ancestor(99, is_textmate, table), None)
+
+class ProcfsProcessTableTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.root)
+    
+    def add_process(self, pid, stat, cmdline):
+        os.mkdir(os.path.join(self.root, str(pid)))
+        for name, data in (("stat", stat), ("cmdline", cmdline)):
+            fp = open(os.path.join(self.root, str(pid), name), 'w')
+            fp.write(data)
+            fp.close()
+    
+    def test_reads_parent_and_command_line(self):
+        self.add_process(40, "40 (python) S 30 40 40 0 -1", "python\0mathmate.py\0")
+        table = mathmate.ProcfsProcessTable(self.root)
+        self.assertEqual(table.get_process(40), (30, "python mathmate.py"))
+    
+    def test_comm_with_spaces_and_parentheses(self):
+        self.add_process(20, "20 (Text Mate) (2)) S 1 20 20 0 -1", "")
+        table = mathmate.ProcfsProcessTable(self.root)
+        self.assertEqual(table.get_process(20), (1, "Text Mate) (2)"))
+    
+    def test_missing_pid(self):
+        table = mathmate.ProcfsProcessTable(self.root)
+        self.assertEqual(table.get_process(99), None)
+    
+    def test_finds_ancestor(self):
+        self.add_process(40, "40 (python) S 30 40 40 0 -1", "python\0mathmate.py\0")
+        self.add_process(30, "30 (sh) S 20 30 30 0 -1", "/bin/sh\0-c\0cmd\0")
+        self.add_process(20, "20 (TextMate) S 1 20 20 0 -1", TEXTMATE + "\0")
+        table = mathmate.ProcfsProcessTable(self.root)
+        self.assertEqual(mathmate.find_ancestor(40, is_textmate, table), 20)
+
+class PsProcessTableTest(unittest.TestCase):
+    def setUp(self):
+        self.check_output = mathmate.subprocess.check_output
+        self.calls = []
+        def check_output(args):
+            self.calls.append(args)
+            return ("    1     0 /sbin/launchd\n"
+                    "   20     1 %s -psn_0_12345\n"
+                    "   30    20 /bin/sh -c (cd ~; run)\n"
+                    "   45    30 \n" % TEXTMATE)
+        mathmate.subprocess.check_output = check_output
+    
+    def tearDown(self):
+        mathmate.subprocess.check_output = self.check_output
+    
+    def test_one_listing_for_all_lookups(self):
+        table = mathmate.PsProcessTable()
+        self.assertEqual(table.get_process(30), (20, "/bin/sh -c (cd ~; run)"))
+        self.assertEqual(table.get_process(20), (1, TEXTMATE + " -psn_0_12345"))
+        self.assertEqual(table.get_process(45), (30, ""))
+        self.assertEqual(table.get_process(99), None)
+        self.assertEqual(len(self.calls), 1)
+
+class GetTextMatePidTest(unittest.TestCase):
+    def test_uses_given_table_once(self):
+        pid = os.getpid()
+        table = FakeProcessTable({pid: (20, "python"), 20: (1, TEXTMATE)})
+        mm = mathmate.MathMate(doc="")
+        self.assertEqual(mm.get_textmate_pid(table), 20)
+        self.assertEqual(mm.get_textmate_pid(FakeProcessTable({})), 20)
+    
+    def test_not_run_from_textmate(self):
+        mm = mathmate.MathMate(doc="")
+        self.assertRaises(Exception, mm.get_textmate_pid, FakeProcessTable({os.getpid(): (1, "python")}))
+
+if __name__ == '__main__':
+    unittest.main()
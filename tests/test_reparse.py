@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Checks that reparsing after random edits gives the same statements as
+parsing the edited document from scratch. Each sequence of edits reparses
+from the previous reparse, as the parse cache does, over the documents of the
+golden corpus with spaces and with tabs for indents."""
+import os
+import sys
+import random
+import unittest
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS, "..", "Support", "bin"))
+
+import mathmate
+from make_parse_corpus import INDENTS, FRAGMENTS, get_corpus
+
+SEED = 42
+SEQUENCES = 4
+EDITS = 8
+
+# Edits are biased towards the characters that change how the rest of the
+# document is tokenized
+INSERTIONS = ["[", "]", "{", "}", "(", ")", "\"", "\\\"", "(*", "*)", "\n", "\n\n", "\t", " ", ";", ",", "x"] + FRAGMENTS
+
+def edit(rand, doc):
+    pos = rand.randint(0, len(doc))
+    kind = rand.random()
+    if kind < 0.4 or len(doc) == 0:
+        return doc[:pos] + rand.choice(INSERTIONS) + doc[pos:]
+    length = rand.randint(1, 8)
+    if kind < 0.7:
+        return doc[:pos] + doc[pos + length:]
+    return doc[:pos] + rand.choice(INSERTIONS) + doc[pos + length:]
+
+def read_corpus():
+    docs = []
+    for name, path in get_corpus():
+        fp = open(path, "rb")
+        docs.append((name, fp.read()))
+        fp.close()
+    return docs
+
+def parse(mm, doc, **options):
+    new_lines = []
+    statements = mm.parse(doc, new_lines=new_lines, **options)
+    return statements, new_lines
+
+def with_new_lines(statements, new_lines):
+    return [(ssp, esp, reformatted_statement, new_line) for (ssp, esp, reformatted_statement, current_statement),
+        new_line in zip(statements, new_lines)]
+
+class ReparseTest(unittest.TestCase):
+    def setUp(self):
+        self.docs = read_corpus()
+        self.chunk = mathmate.PARSE_CHUNK
+    
+    def tearDown(self):
+        mathmate.PARSE_CHUNK = self.chunk
+    
+    def check_edits(self, seed):
+        rand = random.Random(seed)
+        for name, original in self.docs:
+            for indent, indent_size, soft_tabs in INDENTS:
+                mm = mathmate.MathMate(doc=original, indent_size=indent_size, soft_tabs=soft_tabs)
+                for sequence in range(SEQUENCES):
+                    doc = original
+                    statements, new_lines = parse(mm, doc)
+                    for i in range(EDITS):
+                        new_doc = edit(rand, doc)
+                        old_statements = with_new_lines(statements, new_lines)
+                        new_lines = []
+                        statements = mm.reparse(new_doc, doc, old_statements, new_lines)
+                        self.assertEqual((statements, new_lines), parse(mm, new_doc),
+                            "reparse differs for %s with %s after editing %r into %r" % (name, indent, doc, new_doc))
+                        doc = new_doc
+    
+    def test_reparse(self):
+        self.check_edits(SEED)
+    
+    def test_reparse_in_single_characters(self):
+        # Tokenizing a character at a time puts every token on a chunk boundary
+        mathmate.PARSE_CHUNK = 1
+        self.check_edits(SEED + 1)
+    
+    def test_parse_in_chunks(self):
+        for name, doc in self.docs:
+            for indent, indent_size, soft_tabs in INDENTS:
+                mm = mathmate.MathMate(doc=doc, indent_size=indent_size, soft_tabs=soft_tabs)
+                expected = parse(mm, doc)
+                for chunk in (1, 2, 3, 7, 64):
+                    self.assertEqual(parse(mm, doc, chunk=chunk), expected,
+                        "parsing %s with %s in chunks of %d differs" % (name, indent, chunk))
+
+if __name__ == '__main__':
+    unittest.main()